@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Provider, Category, Product, Client, Sale, SaleDetail, PaymentMethod, CashCount
+from .models import Provider, Category, Product, Client, Sale, SaleDetail, PaymentMethod, CashCount, StockMovement
 
 admin.site.register(Provider)
 admin.site.register(Category)
@@ -8,4 +8,5 @@ admin.site.register(Client)
 admin.site.register(Sale)
 admin.site.register(SaleDetail)
 admin.site.register(PaymentMethod)
-admin.site.register(CashCount)
\ No newline at end of file
+admin.site.register(CashCount)
+admin.site.register(StockMovement)
\ No newline at end of file
@@ -0,0 +1,260 @@
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import connection
+from django.db.models import BigIntegerField, CharField, F
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from .models import Category, PaymentMethod, Product, ProductSalesRollup, SalesRollup
+from .reports import best_selling_product, dormant_products, low_stock_products, most_profitable_sold_product
+
+NO_KEY = -1
+TOP_LIMIT = 10
+
+
+def _cents(expression):
+    # Los importes se cargan como enteros en centavos: las sumas son exactas y
+    # se vuelven a convertir a Decimal sólo al armar la respuesta.
+    return Cast(Round(expression * 100), BigIntegerField())
+
+
+def _iso_date(field):
+    # Las fechas se leen como texto ISO: NumPy las convierte a datetime64 mucho
+    # más rápido que a partir de objetos date.
+    return Cast(field, CharField())
+
+
+def _money(cents):
+    return Decimal(int(round(cents))).scaleb(-2)
+
+
+def _columns(queryset, fields, dtypes):
+    """
+    Ejecuta `queryset.values_list(*fields)` y devuelve un dict de arrays de
+    NumPy, una columna por campo. Las filas se leen directamente del cursor,
+    sin los conversores del ORM: NumPy interpreta las fechas y los números.
+    Los NULL de las claves se cargan como NO_KEY.
+    """
+    sql, params = queryset.values_list(*fields).query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        names = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+    columns = dict(zip(names, zip(*rows))) if rows else {}
+    arrays = {}
+    for field, dtype in zip(fields, dtypes):
+        column = columns.get(field, ())
+        if dtype == 'int64':
+            column = [NO_KEY if value is None else value for value in column]
+        arrays[field] = np.array(column, dtype=dtype)
+    return arrays
+
+
+def _group_sum(keys, values):
+    """ Claves únicas (ordenadas) y la suma de `values` para cada una. """
+    uniques, inverse = np.unique(keys, return_inverse=True)
+    return uniques, np.bincount(inverse, weights=values, minlength=len(uniques))
+
+
+def _top(totals, limit=TOP_LIMIT):
+    """ Índices de los `limit` totales más altos, de mayor a menor (estable ante empates). """
+    return np.argsort(-totals, kind='stable')[:limit]
+
+
+def _week_start(days):
+    # 1970-01-01 fue jueves: (ordinal + 3) % 7 es el día de la semana con lunes = 0.
+    ordinals = days.astype('int64')
+    return (ordinals - (ordinals + 3) % 7).astype('datetime64[D]')
+
+
+class DashboardAnalytics:
+    """
+    Motor columnar del dashboard. Carga las columnas de los rollups (una
+    consulta por el índice de día para las ventas del último año y otra para
+    las líneas de los últimos 30 días) en arrays de NumPy, y calcula KPIs,
+    gráficos y rankings con group-by vectorizados sobre esos arrays, sin
+    volver a consultar la base por cada gráfico.
+
+    Cada conjunto de columnas se carga recién cuando una sección lo necesita
+    y una sola vez, aunque varias secciones lo pidan desde hilos distintos.
+    """
+    MONTHLY_DAYS = 365
+    RECENT_DAYS = 29
+
+    def __init__(self, today=None):
+        self.today = today or timezone.localdate()
+        self.today64 = np.datetime64(self.today, 'D')
+        self._frames = {}
+        self._locks = {'sales': threading.Lock(), 'lines': threading.Lock()}
+
+    def _frame(self, name, load):
+        with self._locks[name]:
+            if name not in self._frames:
+                self._frames[name] = load()
+            return self._frames[name]
+
+    @property
+    def sales(self):
+        return self._frame('sales', lambda: _columns(
+            SalesRollup.objects.filter(day__gte=self.today - timedelta(days=self.MONTHLY_DAYS))
+            .annotate(date=_iso_date('day'), amount=_cents(F('total_amount'))),
+            ('date', 'hour', 'payment_method_id', 'sales_count', 'amount'),
+            ('datetime64[D]', 'int64', 'int64', 'int64', 'int64'),
+        ))
+
+    @property
+    def lines(self):
+        return self._frame('lines', lambda: _columns(
+            ProductSalesRollup.objects.filter(day__gte=self.today - timedelta(days=self.RECENT_DAYS))
+            .annotate(date=_iso_date('day'), revenue_cents=_cents(F('revenue')), cost_cents=_cents(F('cost'))),
+            ('date', 'category_id', 'product_id', 'quantity', 'revenue_cents', 'cost_cents'),
+            ('datetime64[D]', 'int64', 'int64', 'int64', 'int64', 'int64'),
+        ))
+
+    def _since(self, columns, days):
+        return columns['date'] >= self.today64 - np.timedelta64(days, 'D')
+
+    def _recent_sales(self):
+        sales = self.sales
+        recent = self._since(sales, self.RECENT_DAYS)
+        return {field: column[recent] for field, column in sales.items()}
+
+    def _recent_lines(self):
+        lines = self.lines
+        recent = self._since(lines, self.RECENT_DAYS)
+        return {field: column[recent] for field, column in lines.items()}
+
+    @staticmethod
+    def _series(days, totals, label):
+        return [
+            {'name': day.astype(object).strftime(label), 'Ventas': _money(total)}
+            for day, total in zip(days, totals)
+        ]
+
+    def kpis(self):
+        sales, lines = self.sales, self.lines
+        sales_today = sales['date'] == self.today64
+        lines_today = lines['date'] == self.today64
+        total = int(sales['amount'][sales_today].sum())
+        count = int(sales['sales_count'][sales_today].sum())
+        profit = lines['revenue_cents'][lines_today] - lines['cost_cents'][lines_today]
+        return {
+            'ventas_del_dia': _money(total),
+            'ganancia_bruta_del_dia': _money(profit.sum()),
+            'ticket_promedio': _money(total) / count if count > 0 else 0,
+            'productos_vendidos': int(lines['quantity'][lines_today].sum()),
+        }
+
+    def payment_method_chart(self):
+        sales = self._recent_sales()
+        method_ids, method_totals = _group_sum(sales['payment_method_id'], sales['amount'])
+        method_names = dict(PaymentMethod.objects.filter(id__in=method_ids.tolist()).values_list('id', 'name'))
+        return [
+            {'name': method_names.get(int(method_ids[i])) or 'No especificado', 'value': _money(method_totals[i])}
+            for i in _top(method_totals, limit=None)
+        ]
+
+    def daily_chart(self):
+        sales = self._recent_sales()
+        return self._series(*_group_sum(sales['date'], sales['amount']), '%d/%m')
+
+    def weekly_chart(self):
+        last_12_weeks = self._since(self.sales, 7 * 12)
+        weeks = _week_start(self.sales['date'][last_12_weeks])
+        return self._series(*_group_sum(weeks, self.sales['amount'][last_12_weeks]), '%d/%m')
+
+    def monthly_chart(self):
+        months, totals = _group_sum(self.sales['date'].astype('datetime64[M]'), self.sales['amount'])
+        return self._series(months.astype('datetime64[D]'), totals, '%b %Y')
+
+    def hourly_chart(self):
+        sales = self._recent_sales()
+        hourly = np.bincount(sales['hour'], weights=sales['amount'], minlength=24)
+        return [{'name': f"{h:02d}h", 'Ventas': _money(hourly[h])} for h in range(24)]
+
+    def category_chart(self):
+        lines = self._recent_lines()
+        category_ids, category_totals = _group_sum(lines['category_id'], lines['revenue_cents'])
+        category_names = dict(Category.objects.values_list('id', 'name'))
+        return [
+            {'name': category_names.get(int(category_ids[i])), 'Ventas': _money(category_totals[i])}
+            for i in _top(category_totals, limit=None)
+        ]
+
+    def charts(self):
+        return {
+            'ventas_por_metodo_pago': self.payment_method_chart(),
+            'ventas_diarias': self.daily_chart(),
+            'ventas_semanales': self.weekly_chart(),
+            'ventas_mensuales': self.monthly_chart(),
+            'ventas_por_hora': self.hourly_chart(),
+            'ventas_por_categoria': self.category_chart(),
+        }
+
+    def _product_ranking(self, values, as_value):
+        lines = self._recent_lines()
+        products, totals = _group_sum(lines['product_id'], values(lines))
+        top = _top(totals)
+        names = dict(Product.objects.filter(id__in=products[top].tolist()).values_list('id', 'name'))
+        return [{'product__name': names[int(products[i])], 'value': as_value(totals[i])} for i in top]
+
+    def most_sold(self):
+        return self._product_ranking(lambda lines: lines['quantity'], int)
+
+    def most_profitable(self):
+        return self._product_ranking(lambda lines: lines['revenue_cents'] - lines['cost_cents'], _money)
+
+    def rankings(self):
+        return {
+            'mas_vendidos': self.most_sold(),
+            'mas_rentables': self.most_profitable(),
+        }
+
+    def report(self):
+        return {
+            'kpis': self.kpis(),
+            'low_stock_products': low_stock_products(),
+            'charts': self.charts(),
+            'rankings': self.rankings(),
+            'other_reports': {
+                'productos_dormidos': dormant_products(self.today),
+            },
+        }
+
+
+def summary_report():
+    """
+    Resumen histórico de ReportsView. El producto más vendido y el más
+    rentable salen de ProductSalesStats sin recorrer las ventas; la hora pico
+    se calcula con un group-by de NumPy sobre las columnas del rollup de ventas.
+    """
+    sales = _columns(
+        SalesRollup.objects.annotate(date=_iso_date('day')),
+        ('date', 'hour', 'sales_count'), ('datetime64[D]', 'int64', 'int64'),
+    )
+    most_sold = best_selling_product()
+    most_profitable = most_profitable_sold_product()
+    peak_hour = None
+    if len(sales['date']):
+        slots = sales['date'].astype('int64') * 24 + sales['hour']
+        slot_keys, counts = _group_sum(slots, sales['sales_count'])
+        top = int(_top(counts, limit=1)[0])
+        peak_hour = {'hour': int(slot_keys[top] % 24), 'c': int(counts[top])}
+
+    return {
+        'most_sold_product': {
+            'name': most_sold[0] if most_sold else 'N/A',
+            'total_sold': most_sold[1] if most_sold else 0
+        },
+        'most_profitable_product': {
+            'name': most_profitable[0] if most_profitable else 'N/A',
+            'profit_margin': round(most_profitable[1], 2) if most_profitable else 0
+        },
+        'peak_hour': {
+            'hour': peak_hour['hour'] if peak_hour else 'N/A',
+            'count': peak_hour['c'] if peak_hour else 0
+        }
+    }
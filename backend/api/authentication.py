@@ -0,0 +1,24 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+
+
+class StatelessAuthenticationMixin:
+    """
+    Autentica las acciones listadas en `stateless_actions` con un usuario
+    armado a partir de los claims del JWT (username, groups), sin consultar la
+    tabla de usuarios. Pensado para endpoints de sólo lectura muy frecuentes;
+    el resto de las acciones sigue usando el usuario de la base.
+
+    Las acciones que guardan request.user en un modelo, cambian contraseñas o
+    administran usuarios no deben agregarse: un usuario desactivado o con roles
+    modificados conserva su acceso hasta que vence el token.
+    """
+    stateless_actions = ()
+
+    def get_authenticators(self):
+        # ViewSetMixin asigna self.request y self.action_map antes de dispatch,
+        # pero self.action todavía no está resuelto en este punto.
+        action_map = getattr(self, 'action_map', None) or {}
+        action = action_map.get(self.request.method.lower())
+        if action in self.stateless_actions:
+            return [JWTStatelessUserAuthentication()]
+        return [JWTAuthentication()]
@@ -0,0 +1,47 @@
+from django.core.cache import cache
+
+from .models import CatalogVersion, Product, ProductTombstone
+from .serializers import PosProductSerializer
+
+SNAPSHOT_CACHE_TIMEOUT = 60 * 60
+
+
+def pos_products():
+    return Product.objects.only(*PosProductSerializer.Meta.fields).order_by('name')
+
+
+def catalog_snapshot():
+    """
+    Catálogo activo completo para el POS. Se serializa una sola vez por
+    versión y se sirve desde la caché hasta que el catálogo vuelva a cambiar.
+    """
+    version = CatalogVersion.current()
+    key = f'pos-catalog:{version}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = {
+            'version': version,
+            'products': PosProductSerializer(pos_products().filter(estado='activo'), many=True).data,
+        }
+        cache.set(key, snapshot, SNAPSHOT_CACHE_TIMEOUT)
+    return snapshot
+
+
+def catalog_delta(since):
+    """
+    Cambios del catálogo posteriores a `since`: productos activos modificados,
+    ids de productos desactivados y de productos eliminados.
+    """
+    # La versión se lee antes que los productos: un cambio concurrente puede
+    # aparecer ahora y otra vez en el próximo delta, pero nunca se pierde.
+    version = CatalogVersion.current()
+    changed = list(pos_products().filter(catalog_version__gt=since))
+    return {
+        'version': version,
+        'since': since,
+        'products': PosProductSerializer([p for p in changed if p.estado == 'activo'], many=True).data,
+        'deactivated': [p.id for p in changed if p.estado != 'activo'],
+        'deleted': list(
+            ProductTombstone.objects.filter(catalog_version__gt=since).values_list('product_id', flat=True)
+        ),
+    }
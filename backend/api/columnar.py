@@ -0,0 +1,243 @@
+import json
+import os
+import shutil
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.ipc
+from django.contrib.auth.models import User
+from django.db.models import CharField, Count, Max, Q, Sum
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+from .exports import batches, local_day_range
+from .models import Category, PaymentMethod, Product, Sale, SaleDetail
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow compilado sin Parquet: se exporta en Arrow IPC.
+    pq = None
+
+ROW_GROUP_SIZE = 50_000
+MANIFEST = '_manifest.json'
+FILE_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+DEFAULT_FORMAT = 'parquet' if pq is not None else 'arrow'
+
+MONEY = pa.decimal128(12, 2)
+
+# Tablas de hechos, particionadas por día local: tabla -> (esquema, filas del rango [desde, hasta)).
+FACT_TABLES = {
+    'sales': (
+        pa.schema([
+            ('id', pa.int64()), ('date_time', pa.timestamp('us', tz='UTC')), ('status', pa.string()),
+            ('seller_id', pa.int64()), ('client_id', pa.int64()), ('payment_method_id', pa.int64()),
+            ('total_amount', MONEY), ('final_amount', MONEY),
+        ]),
+        lambda start, end: Sale.objects.filter(date_time__gte=start, date_time__lt=end).order_by('id').values_list(
+            'id', 'date_time', 'status', 'user_id', 'client_id', 'payment_method_id', 'total_amount', 'final_amount',
+        ),
+    ),
+    'sale_lines': (
+        pa.schema([
+            ('id', pa.int64()), ('sale_id', pa.int64()), ('product_id', pa.int64()), ('quantity', pa.int64()),
+            ('unit_price', MONEY), ('unit_cost', MONEY), ('profit', MONEY),
+        ]),
+        lambda start, end: SaleDetail.objects.filter(
+            sale__date_time__gte=start, sale__date_time__lt=end
+        ).order_by('id').values_list('id', 'sale_id', 'product_id', 'quantity', 'unit_price', 'unit_cost', 'profit'),
+    ),
+}
+
+# Dimensiones: se reescriben enteras en cada exportación (son chicas).
+DIMENSIONS = {
+    'products': (
+        pa.schema([
+            ('id', pa.int64()), ('sku', pa.string()), ('name', pa.string()), ('category_id', pa.int64()),
+            ('provider_id', pa.int64()), ('cost_price', MONEY), ('sale_price', MONEY), ('estado', pa.string()),
+        ]),
+        lambda: Product.objects.order_by('id').values_list(
+            'id', 'sku', 'name', 'category_id', 'provider_id', 'cost_price', 'sale_price', 'estado',
+        ),
+    ),
+    'categories': (
+        pa.schema([('id', pa.int64()), ('name', pa.string())]),
+        lambda: Category.objects.order_by('id').values_list('id', 'name'),
+    ),
+    'payment_methods': (
+        pa.schema([('id', pa.int64()), ('name', pa.string()), ('adjustment_percentage', pa.decimal128(5, 2))]),
+        lambda: PaymentMethod.objects.order_by('id').values_list('id', 'name', 'adjustment_percentage'),
+    ),
+    'sellers': (
+        pa.schema([('id', pa.int64()), ('username', pa.string()), ('first_name', pa.string()), ('last_name', pa.string())]),
+        lambda: User.objects.order_by('id').values_list('id', 'username', 'first_name', 'last_name'),
+    ),
+}
+
+
+def write_table(path, schema, rows, file_format, row_group_size=ROW_GROUP_SIZE):
+    """
+    Escribe `rows` en `path` de a `row_group_size` filas: cada lote leído de
+    la base se convierte en un RecordBatch (un row group en Parquet), así la
+    memoria depende del lote y no de la tabla. Devuelve las filas escritas.
+    """
+    partial = path.with_name(path.name + '.tmp')
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(partial, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(partial, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+    written = 0
+    with writer:
+        for batch in batches(rows, row_group_size):
+            columns = zip(*batch)
+            writer.write_batch(pa.record_batch(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            written += len(batch)
+    os.replace(partial, path)
+    return written
+
+
+# Claves de agrupación: el comienzo de date_time en UTC hasta la hora y, si
+# alguna hora cruza una medianoche local (zonas con desfasaje de media hora),
+# hasta el minuto.
+UTC_BUCKETS = ((13, '%Y-%m-%d %H', timedelta(hours=1)), (16, '%Y-%m-%d %H:%M', timedelta(minutes=1)))
+CENT = Decimal('0.01')
+
+
+def _sum(a, b):
+    return b if a is None else a if b is None else a + b
+
+
+def _by_local_day(queryset, field, bucket, measures):
+    """
+    Agrega `measures` del queryset por día local con una sola consulta
+    agrupada por `bucket` (prefijo de la fecha UTC como texto, que la base
+    evalúa sin funciones de Python) y junta los buckets de cada día en
+    Python. Devuelve None si algún bucket cruza una medianoche local.
+    """
+    length, pattern, step = bucket
+    rows = queryset.annotate(bucket=Substr(Cast(field, CharField()), 1, length)).values('bucket').annotate(**measures)
+    days = {}
+    for row in rows:
+        start = datetime.strptime(row.pop('bucket'), pattern).replace(tzinfo=dt_timezone.utc)
+        day = timezone.localtime(start).date()
+        if timezone.localtime(start + step - timedelta(microseconds=1)).date() != day:
+            return None
+        if day not in days:
+            days[day] = row
+            continue
+        totals = days[day]
+        for name, value in row.items():
+            totals[name] = max(totals[name], value) if name == 'max_id' else _sum(totals[name], value)
+    return days
+
+
+def _money(value):
+    return None if value is None else value.quantize(CENT)
+
+
+def day_fingerprints(start_date, end_date):
+    """
+    Huella de cada día con ventas del rango: cantidad, id máximo e importes de
+    ventas y líneas. Si no cambió desde la última exportación, la partición
+    del día se reutiliza sin volver a leer sus filas.
+    """
+    # Dos consultas para todo el rango, filtradas por date_time con el índice
+    # (-date_time, -id) de Sale y agrupadas por hora UTC: ni TruncDate (en
+    # SQLite llama a una función de Python por fila) ni una expresión que
+    # crezca con la cantidad de días.
+    start, end = local_day_range(start_date, end_date)
+    sales = Sale.objects.filter(date_time__gte=start, date_time__lt=end)
+    lines = SaleDetail.objects.filter(sale__date_time__gte=start, sale__date_time__lt=end)
+    for bucket in UTC_BUCKETS:
+        sale_days = _by_local_day(sales, 'date_time', bucket, {
+            'count': Count('id'), 'max_id': Max('id'), 'total': Sum('final_amount'),
+            'cancelled': Count('id', filter=Q(status='Cancelada')),
+        })
+        line_days = sale_days and _by_local_day(lines, 'sale__date_time', bucket, {
+            'count': Count('id'), 'max_id': Max('id'), 'quantity': Sum('quantity'), 'profit': Sum('profit'),
+        })
+        if line_days is not None:
+            break
+    no_lines = {'count': 0, 'max_id': None, 'quantity': None, 'profit': None}
+    fingerprints = {}
+    for day, day_sales in sale_days.items():
+        day_lines = line_days.get(day, no_lines)
+        fingerprints[day.isoformat()] = (
+            f"{day_sales['count']}:{day_sales['max_id']}:{_money(day_sales['total'])}:{day_sales['cancelled']}|"
+            f"{day_lines['count']}:{day_lines['max_id']}:{day_lines['quantity']}:{_money(day_lines['profit'])}"
+        )
+    return fingerprints
+
+
+def _partition(root, table, day, file_format):
+    return root / table / f'day={day}' / f'part{FILE_FORMATS[file_format]}'
+
+
+def export_sales_history(root, start_date=None, end_date=None, file_format=DEFAULT_FORMAT, full=False):
+    """
+    Exporta el historial de ventas a `root` en formato columnar: ventas y
+    líneas particionadas por día (`sales/day=AAAA-MM-DD/part.parquet`, al
+    estilo Hive) y las dimensiones en un archivo por tabla.
+
+    Es incremental: `_manifest.json` guarda la huella de cada día y sólo se
+    reescriben los días del rango que cambiaron (o todos con `full=True`).
+    Los días del rango que ya no tienen ventas se borran. Devuelve un
+    resumen con los días escritos, reutilizados y borrados.
+    """
+    if file_format == 'parquet' and pq is None:
+        raise ValueError("Esta instalación de pyarrow no incluye Parquet; usar el formato arrow.")
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    manifest_path = root / MANIFEST
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+    if manifest.get('format') != file_format:
+        manifest = {'format': file_format, 'partitions': {}}
+    partitions = manifest['partitions']
+
+    if start_date is None:
+        # Desde la primera venta o el primer día ya exportado: así también se
+        # borran los días que se quedaron sin ventas.
+        first = Sale.objects.order_by('date_time').values_list('date_time', flat=True).first()
+        candidates = [date.fromisoformat(day) for day in partitions]
+        candidates.append(timezone.localtime(first).date() if first else timezone.localdate())
+        start_date = min(candidates)
+    end_date = end_date or timezone.localdate()
+
+    summary = {'written': [], 'reused': 0, 'removed': [], 'rows': dict.fromkeys(FACT_TABLES, 0)}
+    fingerprints = day_fingerprints(start_date, end_date)
+    for day, fingerprint in sorted(fingerprints.items()):
+        paths = {table: _partition(root, table, day, file_format) for table in FACT_TABLES}
+        if not full and partitions.get(day) == fingerprint and all(path.exists() for path in paths.values()):
+            summary['reused'] += 1
+            continue
+        day_start, day_end = local_day_range(date.fromisoformat(day), date.fromisoformat(day))
+        for table, (schema, rows) in FACT_TABLES.items():
+            paths[table].parent.mkdir(parents=True, exist_ok=True)
+            summary['rows'][table] += write_table(
+                paths[table], schema, rows(day_start, day_end).iterator(chunk_size=ROW_GROUP_SIZE), file_format
+            )
+        partitions[day] = fingerprint
+        summary['written'].append(day)
+
+    stale = [
+        day for day in partitions
+        if start_date.isoformat() <= day <= end_date.isoformat() and day not in fingerprints
+    ]
+    for day in stale:
+        for table in FACT_TABLES:
+            shutil.rmtree(root / table / f'day={day}', ignore_errors=True)
+        del partitions[day]
+        summary['removed'].append(day)
+
+    for name, (schema, rows) in DIMENSIONS.items():
+        write_table(root / f'{name}{FILE_FORMATS[file_format]}', schema, rows().iterator(), file_format)
+
+    # El manifiesto se escribe al final: si la exportación se corta, los días
+    # a medio escribir se vuelven a exportar en la próxima corrida.
+    partial = root / f'{MANIFEST}.tmp'
+    partial.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(partial, manifest_path)
+    return summary
@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections
+
+from .analytics import DashboardAnalytics
+from .report_cache import cached_report, report_data_version
+from .reports import dormant_products, low_stock_products
+
+# Conexiones simultáneas que puede abrir una petición del dashboard.
+SECTION_WORKERS = 4
+
+# Sección -> (ruta dentro de la respuesta del dashboard, cálculo).
+SECTIONS = {
+    'kpis': (('kpis',), DashboardAnalytics.kpis),
+    'low_stock': (('low_stock_products',), lambda analytics: low_stock_products()),
+    'charts.payment_methods': (('charts', 'ventas_por_metodo_pago'), DashboardAnalytics.payment_method_chart),
+    'charts.daily': (('charts', 'ventas_diarias'), DashboardAnalytics.daily_chart),
+    'charts.weekly': (('charts', 'ventas_semanales'), DashboardAnalytics.weekly_chart),
+    'charts.monthly': (('charts', 'ventas_mensuales'), DashboardAnalytics.monthly_chart),
+    'charts.hourly': (('charts', 'ventas_por_hora'), DashboardAnalytics.hourly_chart),
+    'charts.categories': (('charts', 'ventas_por_categoria'), DashboardAnalytics.category_chart),
+    'rankings.most_sold': (('rankings', 'mas_vendidos'), DashboardAnalytics.most_sold),
+    'rankings.most_profitable': (('rankings', 'mas_rentables'), DashboardAnalytics.most_profitable),
+    'dormant': (('other_reports', 'productos_dormidos'), lambda analytics: dormant_products(analytics.today)),
+}
+
+
+def parse_sections(value):
+    """
+    Convierte `?sections=kpis,charts` en la lista de secciones pedidas. Un
+    prefijo como `charts` incluye todas sus secciones. Lanza ValueError con
+    los nombres desconocidos.
+    """
+    requested = []
+    unknown = []
+    for name in filter(None, (part.strip() for part in value.split(','))):
+        matches = [section for section in SECTIONS if section == name or section.startswith(f'{name}.')]
+        if not matches:
+            unknown.append(name)
+        requested.extend(section for section in matches if section not in requested)
+    if unknown:
+        raise ValueError(unknown)
+    return requested
+
+
+def _compute_section(name, analytics, version, in_worker):
+    start = time.perf_counter()
+    try:
+        _, compute = SECTIONS[name]
+        data, hit = cached_report(f'dashboard.{name}', lambda: compute(analytics), version=version)
+    finally:
+        if in_worker:
+            # Cada hilo abre su propia conexión; se cierra al terminar la sección.
+            connections.close_all()
+    return data, hit, (time.perf_counter() - start) * 1000
+
+
+def dashboard_sections(names, workers=SECTION_WORKERS):
+    """
+    Calcula sólo las secciones pedidas del dashboard y devuelve
+    `(datos, tiempos)`. Los datos tienen la misma forma que la respuesta
+    completa, restringida a esas secciones; los tiempos informan, por
+    sección, los milisegundos y si vino de la caché.
+
+    Las secciones se reparten en un pool acotado de hilos, cada uno con su
+    propia conexión a la base; comparten un DashboardAnalytics, así cada
+    conjunto de columnas se lee una sola vez. Dentro de una transacción
+    (los otros hilos no verían sus datos) se calculan en el hilo actual.
+    """
+    analytics = DashboardAnalytics()
+    version = report_data_version()
+    parallel = workers > 1 and len(names) > 1 and not connection.in_atomic_block
+    if parallel:
+        with ThreadPoolExecutor(max_workers=min(workers, len(names))) as pool:
+            results = list(pool.map(lambda name: _compute_section(name, analytics, version, True), names))
+    else:
+        results = [_compute_section(name, analytics, version, False) for name in names]
+
+    data = {}
+    timings = {}
+    for name, (section_data, hit, elapsed) in zip(names, results):
+        path, _ = SECTIONS[name]
+        target = data
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = section_data
+        timings[name] = {'ms': round(elapsed, 3), 'cache': 'HIT' if hit else 'MISS'}
+    return data, timings
@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from .exports import EXPORT_CHUNK_SIZE, EXPORT_LEVELS, local_day_range, write_export
+from .models import CatalogVersion, ExportJob, Sale, SaleDetail, SalesDataVersion
+
+logger = logging.getLogger(__name__)
+
+# Exportaciones simultáneas del proceso; el resto espera en la cola del pool.
+EXPORT_WORKERS = 2
+# Cada cuántas filas se guarda el avance del trabajo.
+PROGRESS_EVERY = EXPORT_CHUNK_SIZE
+# Un trabajo en proceso desde hace más que esto se da por interrumpido (por
+# ejemplo, por un reinicio del servidor) y deja de reutilizarse.
+EXPORT_JOB_TIMEOUT = timedelta(hours=1)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def job_path(job):
+    return Path(settings.EXPORT_JOBS_ROOT) / job.file_name
+
+
+def request_export(user, export_format, level, start_date, end_date):
+    """
+    Devuelve `(trabajo, reutilizado)` para la exportación pedida. Si ya hay
+    un trabajo idéntico con la versión actual de los datos de ventas (en
+    cola, en proceso o terminado con su archivo), se devuelve ese; si no, se
+    crea uno nuevo que se encola al confirmar la transacción. Las
+    exportaciones por línea incluyen sku, nombre, categoría y costo del
+    producto, así que además deben coincidir en la versión del catálogo.
+
+    El pool vive en el proceso y se pierde al reiniciar el servidor: un
+    trabajo pendiente que se reutiliza se vuelve a encolar (run_export_job
+    lo toma con un UPDATE condicional, así que nunca corre dos veces) y uno
+    en proceso desde hace más de EXPORT_JOB_TIMEOUT no se reutiliza.
+    """
+    params = {
+        'export_format': export_format, 'level': level,
+        'start_date': start_date, 'end_date': end_date,
+        'data_version': SalesDataVersion.current(),
+        'catalog_version': CatalogVersion.current() if level == 'lines' else None,
+    }
+    stale = timezone.now() - EXPORT_JOB_TIMEOUT
+    for job in ExportJob.objects.filter(**params).exclude(status='error').order_by('-id'):
+        if job.status == 'pendiente':
+            transaction.on_commit(lambda job_id=job.id: submit(job_id))
+            return job, True
+        if job.status == 'en_proceso' and job.started_at >= stale:
+            return job, True
+        if job.status == 'terminado' and job_path(job).exists():
+            return job, True
+
+    job = ExportJob.objects.create(user=user, **params)
+    transaction.on_commit(lambda: submit(job.id))
+    return job, False
+
+
+def submit(job_id):
+    """
+    Encola el trabajo en el pool del proceso. Dentro de una transacción
+    (los hilos no verían el trabajo ni sus datos) se ejecuta en el hilo actual.
+    """
+    if connection.in_atomic_block:
+        run_export_job(job_id)
+        return
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+    _executor.submit(_run_in_worker, job_id)
+
+
+def _run_in_worker(job_id):
+    try:
+        run_export_job(job_id)
+    finally:
+        # Cada hilo abre su propia conexión; se cierra al terminar el trabajo.
+        connections.close_all()
+
+
+def _count_rows(job):
+    start, end = local_day_range(job.start_date, job.end_date)
+    if job.level == 'lines':
+        return SaleDetail.objects.filter(sale__date_time__gte=start, sale__date_time__lt=end).count()
+    return Sale.objects.filter(date_time__gte=start, date_time__lt=end).count()
+
+
+def _with_progress(job_id, rows, progress):
+    for row in rows:
+        yield row
+        progress['rows'] += 1
+        if progress['rows'] % PROGRESS_EVERY == 0:
+            ExportJob.objects.filter(pk=job_id).update(rows_processed=progress['rows'])
+
+
+def run_export_job(job_id):
+    """
+    Genera el archivo de un trabajo pendiente. El trabajo se toma con un
+    UPDATE condicional, así un pool y run_export_jobs nunca procesan el mismo
+    dos veces. El archivo se escribe con otro nombre y se renombra al
+    terminar: nunca se descarga uno a medias.
+    """
+    claimed = ExportJob.objects.filter(pk=job_id, status='pendiente').update(
+        status='en_proceso', started_at=timezone.now()
+    )
+    if not claimed:
+        return
+    job = ExportJob.objects.get(pk=job_id)
+    root = Path(settings.EXPORT_JOBS_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    file_name = f'export_{job.id}.{job.export_format}'
+    partial = root / f'{file_name}.tmp'
+    progress = {'rows': 0}
+    try:
+        ExportJob.objects.filter(pk=job_id).update(total_rows=_count_rows(job))
+        _, fields, rows = EXPORT_LEVELS[job.level]
+        write_export(
+            job.export_format, fields,
+            _with_progress(job_id, rows(job.start_date, job.end_date), progress), partial,
+        )
+        os.replace(partial, root / file_name)
+    except Exception as exc:
+        logger.exception("Falló la exportación #%s", job_id)
+        partial.unlink(missing_ok=True)
+        ExportJob.objects.filter(pk=job_id).update(
+            status='error', error=str(exc), rows_processed=progress['rows'], finished_at=timezone.now()
+        )
+        return
+    ExportJob.objects.filter(pk=job_id).update(
+        status='terminado', file_name=file_name, rows_processed=progress['rows'], finished_at=timezone.now()
+    )
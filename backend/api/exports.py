@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from .models import Sale, SaleDetail
+
+EXPORT_CHUNK_SIZE = 2000
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+IVA_RATE = Decimal('1.21')
+CENT = Decimal('0.01')
+
+SALES_COLUMNS = [
+    # (título, ancho, formato numérico, centrado)
+    ('Fecha', 20, 'DD/MM/YYYY HH:MM', False),
+    ('ID Venta', 15, None, True),
+    ('Estado', 15, None, True),
+    ('Monto Total', 18, '"$"#,##0.00', False),
+    ('Neto Gravado (21%)', 18, '"$"#,##0.00', False),
+    ('IVA (21%)', 18, '"$"#,##0.00', False),
+]
+
+# Columnas de los formatos planos (CSV y NDJSON), en el orden de las filas.
+SALES_FIELDS = ('fecha', 'venta_id', 'estado', 'monto_total', 'neto_gravado', 'iva')
+SALE_LINE_FIELDS = (
+    'fecha', 'venta_id', 'estado', 'sku', 'producto', 'categoria',
+    'cantidad', 'precio_unitario', 'costo_unitario', 'ganancia',
+)
+
+HEADER_FONT = Font(bold=True, color="FFFFFF")
+HEADER_FILL = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+CENTER = Alignment(horizontal='center')
+
+
+def local_day_range(start_date, end_date):
+    """
+    Límites [desde, hasta) en hora local para filtrar `date_time` por rango,
+    equivalente a `date_time__date__gte/lte` pero comparando la columna
+    directamente, así la consulta usa el índice (-date_time, -id) de Sale.
+    """
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start, end
+
+
+def sales_export_rows(start_date, end_date, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Filas del reporte de ventas (fecha, id, estado, total, neto, IVA), leídas
+    de a `chunk_size` con un cursor del servidor: nunca se cargan todas las
+    ventas del rango en memoria.
+    """
+    start, end = local_day_range(start_date, end_date)
+    sales = (
+        Sale.objects.filter(date_time__gte=start, date_time__lt=end)
+        .order_by('date_time', 'id')
+        .values_list('date_time', 'id', 'status', 'final_amount')
+        .iterator(chunk_size=chunk_size)
+    )
+    for date_time, sale_id, sale_status, final_amount in sales:
+        total = final_amount or Decimal('0.00')
+        neto = Decimal('0.00')
+        iva = Decimal('0.00')
+        if total > 0:
+            neto = total / IVA_RATE
+            iva = total - neto
+        yield date_time, sale_id, sale_status, total, neto, iva
+
+
+def sale_line_export_rows(start_date, end_date, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Filas por línea de venta del rango, con producto, categoría y el costo
+    capturado al vender (o el costo actual en líneas anteriores a
+    backfill_sale_costs). Se leen de a `chunk_size`, como las ventas.
+    """
+    start, end = local_day_range(start_date, end_date)
+    money = DecimalField(max_digits=12, decimal_places=2)
+    return (
+        SaleDetail.objects.filter(sale__date_time__gte=start, sale__date_time__lt=end)
+        .annotate(
+            cost=Coalesce('unit_cost', 'product__cost_price'),
+            line_profit=Coalesce(
+                'profit',
+                ExpressionWrapper(F('quantity') * (F('unit_price') - F('product__cost_price')), output_field=money),
+                output_field=money,
+            ),
+        )
+        .order_by('sale__date_time', 'sale_id', 'id')
+        .values_list(
+            'sale__date_time', 'sale_id', 'sale__status', 'product__sku', 'product__name',
+            'product__category__name', 'quantity', 'unit_price', 'cost', 'line_profit',
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _flat_rows(rows):
+    """
+    Filas con fechas en hora local con su offset e importes como texto con
+    dos decimales, igual que en la API.
+    """
+    # La zona se resuelve una vez: timezone.localtime() la busca en cada llamada.
+    tz = timezone.get_current_timezone()
+    for row in rows:
+        yield [
+            value.astimezone(tz).isoformat() if isinstance(value, datetime)
+            else str(value.quantize(CENT)) if isinstance(value, Decimal)
+            else value
+            for value in row
+        ]
+
+
+def batches(rows, size):
+    """ Agrupa un iterable de filas en listas de hasta `size` filas. """
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def csv_chunks(fields, rows, batch_size=EXPORT_CHUNK_SIZE):
+    """
+    Genera el CSV de `rows` en bloques de texto de `batch_size` filas, para
+    StreamingHttpResponse: un bloque por lote y no uno por fila.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in batches(_flat_rows(rows), batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Rango vacío: sólo el encabezado.
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(fields, rows, batch_size=EXPORT_CHUNK_SIZE):
+    """ Igual que csv_chunks, pero con un objeto JSON por línea (NDJSON). """
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    for batch in batches(_flat_rows(rows), batch_size):
+        yield ''.join(encode(dict(zip(fields, row))) + '\n' for row in batch)
+
+
+# Formatos planos: formato -> (generador de bloques, content type).
+FLAT_FORMATS = {
+    'csv': (csv_chunks, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+}
+
+# Nivel de detalle -> (prefijo del archivo, columnas, filas del rango).
+EXPORT_LEVELS = {
+    'sales': ('ventas', SALES_FIELDS, sales_export_rows),
+    'lines': ('lineas_venta', SALE_LINE_FIELDS, sale_line_export_rows),
+}
+
+
+def export_filename(export_format, level, start_date, end_date):
+    prefix, _, _ = EXPORT_LEVELS[level]
+    return f"reporte_{prefix}_{start_date.isoformat()}_a_{end_date.isoformat()}.{export_format}"
+
+
+def write_export(export_format, fields, rows, path):
+    """ Escribe `rows` en el archivo `path`, en XLSX (sólo por venta) o en un formato plano. """
+    if export_format == 'xlsx':
+        write_sales_xlsx(rows, path)
+        return
+    chunks, _ = FLAT_FORMATS[export_format]
+    with open(path, 'w', encoding='utf-8', newline='') as target:
+        for chunk in chunks(fields, rows):
+            target.write(chunk)
+
+
+def write_sales_xlsx(rows, target):
+    """
+    Escribe el reporte de ventas en `target` con el modo write-only de
+    openpyxl: cada fila se vuelca a disco a medida que llega, con sus
+    estilos ya aplicados, así la memoria no crece con la cantidad de filas.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Reporte de Ventas")
+    for index, (_, width, _, _) in enumerate(SALES_COLUMNS):
+        ws.column_dimensions[chr(ord('A') + index)].width = width
+
+    header = []
+    for title, _, _, _ in SALES_COLUMNS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        cell.alignment = CENTER
+        header.append(cell)
+    ws.append(header)
+
+    for date_time, *values in rows:
+        cells = []
+        # Excel no admite zona horaria: se escribe la fecha sin tzinfo.
+        for value, (_, _, number_format, centered) in zip([date_time.replace(tzinfo=None), *values], SALES_COLUMNS):
+            cell = WriteOnlyCell(ws, value=value)
+            if number_format:
+                cell.number_format = number_format
+            if centered:
+                cell.alignment = CENTER
+            cells.append(cell)
+        ws.append(cells)
+    wb.save(target)
+
+
+def sales_xlsx_file(start_date, end_date):
+    """
+    Genera el XLSX del rango en un archivo temporal y lo devuelve posicionado
+    al inicio, listo para enviarse por bloques con FileResponse. El archivo
+    se borra solo al cerrarse.
+    """
+    # Un XLSX es un zip cuyo índice va al final: no se puede enviar antes de
+    # terminarlo, pero sí armarlo en disco en lugar de en memoria.
+    target = tempfile.TemporaryFile()
+    write_sales_xlsx(sales_export_rows(start_date, end_date), target)
+    target.seek(0)
+    return target
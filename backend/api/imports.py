@@ -0,0 +1,299 @@
+import csv
+import io
+import unicodedata
+import zipfile
+from decimal import Decimal
+from itertools import chain
+from pathlib import Path
+
+from django.db import IntegrityError, transaction
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .exports import batches
+from .models import CatalogVersion, Category, Product, Provider, StockMovement
+
+IMPORT_CHUNK_SIZE = 1000
+# Errores por fila que se devuelven en el resumen; el total se informa siempre.
+IMPORT_MAX_ERRORS = 500
+
+# Encabezados aceptados (sin tildes ni mayúsculas) -> campo del producto.
+COLUMN_ALIASES = {
+    'sku': 'sku', 'codigo': 'sku', 'sku / codigo': 'sku',
+    'name': 'name', 'nombre': 'name', 'producto': 'name',
+    'description': 'description', 'descripcion': 'description',
+    'cost_price': 'cost_price', 'costo': 'cost_price', 'precio de costo': 'cost_price',
+    'sale_price': 'sale_price', 'precio': 'sale_price', 'precio de venta': 'sale_price',
+    'stock': 'stock', 'stock actual': 'stock',
+    'category': 'category', 'categoria': 'category',
+    'provider': 'provider', 'proveedor': 'provider',
+    'estado': 'estado',
+}
+REQUIRED_FOR_NEW = ('name', 'cost_price', 'sale_price')
+UPSERT_FIELDS = ['name', 'description', 'cost_price', 'sale_price', 'category', 'provider', 'estado', 'catalog_version']
+MAX_PRICE = Decimal('99999999.99')
+CENT = Decimal('0.01')
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode()
+    return ' '.join(text.lower().split())
+
+
+def csv_rows(file):
+    """ Filas de un CSV en UTF-8 (con o sin BOM), separado por comas, punto y coma o tabulaciones. """
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    first = text.readline()
+    try:
+        dialect = csv.Sniffer().sniff(first, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(chain([first], text), dialect)
+
+
+def xlsx_rows(file):
+    """ Filas de la primera hoja de un XLSX, leído en modo read-only sin cargar el libro en memoria. """
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile):
+        raise ValueError("El archivo no es un XLSX válido.")
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+READERS = {'.csv': csv_rows, '.xlsx': xlsx_rows}
+
+
+def read_rows(file, name):
+    """ Filas del archivo según su extensión; ValueError si no es CSV ni XLSX. """
+    reader = READERS.get(Path(name).suffix.lower())
+    if reader is None:
+        raise ValueError("Formato no soportado: el archivo debe ser .csv o .xlsx.")
+    return reader(file)
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # Códigos numéricos en Excel: 7790001000012.0 -> "7790001000012".
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _price(value):
+    if isinstance(value, str) and ',' in value:
+        if value.rfind(',') > value.rfind('.'):
+            # Formato local: "1.234,50".
+            value = value.replace('.', '').replace(',', '.')
+        else:
+            value = value.replace(',', '')
+    try:
+        price = Decimal(str(value))
+        # NaN e infinito (celdas "nan" o "inf" de una planilla) no son precios.
+        if not price.is_finite():
+            raise ValueError
+        price = price.quantize(CENT)
+    except (ArithmeticError, ValueError):
+        raise ValueError("Debe ser un número válido.")
+    if not 0 <= price <= MAX_PRICE:
+        raise ValueError("Debe estar entre 0 y 99.999.999,99.")
+    return price
+
+
+def _stock(value):
+    try:
+        stock = Decimal(str(value))
+    except ArithmeticError:
+        raise ValueError("Debe ser un número entero.")
+    if not stock.is_finite() or stock != stock.to_integral_value() or stock < 0:
+        raise ValueError("Debe ser un número entero no negativo.")
+    return int(stock)
+
+
+class _RowCleaner:
+    """ Valida y convierte las celdas de una fila; las celdas vacías quedan como None (sin dato). """
+
+    def __init__(self, categories, providers):
+        self.categories = categories
+        self.providers = providers
+        self.new_categories = {}
+
+    def __call__(self, raw):
+        values, errors = {}, {}
+        for field, value in raw.items():
+            value = _text(value) if field not in ('cost_price', 'sale_price', 'stock') else value
+            if value is None or value == '':
+                continue
+            try:
+                values[field] = getattr(self, f'_clean_{field}', self._clean_text)(field, value)
+            except ValueError as e:
+                errors[field] = str(e)
+        return values, errors
+
+    def _clean_text(self, field, value):
+        max_length = Product._meta.get_field(field).max_length
+        if max_length and len(value) > max_length:
+            raise ValueError(f"Supera los {max_length} caracteres.")
+        return value
+
+    def _clean_cost_price(self, field, value):
+        return _price(value)
+
+    _clean_sale_price = _clean_cost_price
+
+    def _clean_stock(self, field, value):
+        return _stock(value)
+
+    def _clean_estado(self, field, value):
+        value = value.lower()
+        if value not in dict(Product.STATUS_CHOICES):
+            raise ValueError("Debe ser activo o inactivo.")
+        return value
+
+    def _clean_category(self, field, value):
+        key = _normalize(value)
+        if key not in self.categories:
+            # Las categorías nuevas se crean al importar; sólo necesitan nombre.
+            self.new_categories.setdefault(key, value[:Category._meta.get_field('name').max_length])
+        return key
+
+    def _clean_provider(self, field, value):
+        provider_id = self.providers.get(_normalize(value))
+        if provider_id is None:
+            raise ValueError(f'No existe el proveedor "{value}".')
+        return provider_id
+
+
+def import_products(rows, user=None, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Importa productos desde `rows` (la primera fila es el encabezado) con
+    semántica de upsert por sku: los sku existentes se actualizan y los demás
+    se crean. Las celdas vacías no modifican el producto existente.
+
+    Las categorías y los proveedores se resuelven por nombre con mapas en
+    memoria cargados una sola vez; las categorías que no existen se crean y
+    los proveedores desconocidos son un error de la fila. Las filas se
+    validan y escriben de a `chunk_size`: un SELECT por sku y nombre y un
+    INSERT ... ON CONFLICT DO UPDATE por tanda. El stock sólo se toma para los
+    productos nuevos (con su movimiento inicial); el de los existentes se
+    corrige con un ajuste de inventario.
+
+    Las filas con errores se saltean y se informan con su número de fila.
+    Todo ocurre en una transacción, que con `dry_run` se revierte al final.
+    """
+    numbered = (
+        (number, row) for number, row in enumerate(rows, start=1)
+        if any(cell not in (None, '') for cell in row)
+    )
+    _, header = next(numbered, (None, None))
+    if header is None:
+        raise ValueError("El archivo está vacío.")
+    columns = {index: COLUMN_ALIASES.get(_normalize(title)) for index, title in enumerate(header) if title is not None}
+    if 'sku' not in columns.values():
+        raise ValueError("Falta la columna sku (o código).")
+    columns = {index: field for index, field in columns.items() if field}
+
+    summary = {'created': 0, 'updated': 0, 'categories_created': 0, 'error_count': 0, 'errors': []}
+    cleaner = _RowCleaner(
+        {_normalize(name): pk for pk, name in Category.objects.values_list('id', 'name')},
+        {_normalize(name): pk for pk, name in Provider.objects.values_list('id', 'name')},
+    )
+    seen_skus, seen_names = {}, {}
+
+    def add_error(row_number, errors):
+        summary['error_count'] += 1
+        if len(summary['errors']) < IMPORT_MAX_ERRORS:
+            summary['errors'].append({'row': row_number, 'errors': errors})
+
+    with transaction.atomic():
+        version = None
+        for batch in batches(numbered, chunk_size):
+            cleaned = []
+            for number, row in batch:
+                values, errors = cleaner({field: row[i] for i, field in columns.items() if i < len(row)})
+                if 'sku' not in values and 'sku' not in errors:
+                    errors['sku'] = "Es obligatorio."
+                if 'sku' in values and values['sku'] in seen_skus:
+                    errors['sku'] = f"Repetido: ya aparece en la fila {seen_skus[values['sku']]}."
+                if errors:
+                    add_error(number, errors)
+                    continue
+                seen_skus[values['sku']] = number
+                cleaned.append((number, values))
+
+            existing = {
+                row['sku']: row for row in Product.objects.filter(sku__in=[v['sku'] for _, v in cleaned]).values(
+                    'sku', 'name', 'description', 'cost_price', 'sale_price', 'category_id', 'provider_id', 'estado',
+                )
+            }
+            name_owners = dict(
+                Product.objects.filter(name__in=[v['name'] for _, v in cleaned if 'name' in v]).values_list('name', 'sku')
+            )
+            if cleaner.new_categories:
+                created = Category.objects.bulk_create([Category(name=name) for name in cleaner.new_categories.values()])
+                summary['categories_created'] += len(created)
+                cleaner.categories.update(
+                    (_normalize(name), pk)
+                    for pk, name in Category.objects.filter(name__in=cleaner.new_categories.values()).values_list('id', 'name')
+                )
+                cleaner.new_categories.clear()
+
+            products, numbers, new_stock = [], {}, {}
+            for number, values in cleaned:
+                sku, current = values['sku'], existing.get(values['sku'])
+                if current is None:
+                    missing = {field: "Es obligatorio para un producto nuevo." for field in REQUIRED_FOR_NEW if field not in values}
+                    if missing:
+                        add_error(number, missing)
+                        continue
+                    current = {'description': None, 'category_id': None, 'provider_id': None, 'estado': 'activo'}
+                name = values.get('name', current.get('name'))
+                owner = seen_names.get(name, name_owners.get(name, sku))
+                if owner != sku:
+                    add_error(number, {'name': f'Ya lo usa otro producto{f" (sku {owner})" if owner else ""}.'})
+                    continue
+                seen_names[name] = sku
+                numbers[sku] = number
+                products.append(Product(
+                    sku=sku, name=name,
+                    description=values.get('description', current['description']),
+                    cost_price=values.get('cost_price', current.get('cost_price')),
+                    sale_price=values.get('sale_price', current.get('sale_price')),
+                    category_id=cleaner.categories[values['category']] if 'category' in values else current['category_id'],
+                    provider_id=values.get('provider', current['provider_id']),
+                    estado=values.get('estado', current['estado']),
+                    stock=0 if sku in existing else values.get('stock', 0),
+                ))
+                if sku not in existing and products[-1].stock:
+                    new_stock[sku] = products[-1].stock
+            if not products:
+                continue
+
+            version = version or CatalogVersion.bump()
+            for product in products:
+                product.catalog_version = version
+            try:
+                with transaction.atomic():
+                    Product.objects.bulk_create(
+                        products, update_conflicts=True, unique_fields=['sku'], update_fields=UPSERT_FIELDS,
+                    )
+            except IntegrityError as e:
+                # Conflictos que la validación no ve, por ejemplo dos productos que intercambian nombres.
+                for number in numbers.values():
+                    add_error(number, {'non_field_errors': f"No se pudo guardar la tanda: {e}"})
+                continue
+            if new_stock:
+                StockMovement.objects.bulk_create([
+                    StockMovement(product_id=pid, kind='inicial', quantity=new_stock[sku], user=user, note='Importación')
+                    for sku, pid in Product.objects.filter(sku__in=new_stock).values_list('sku', 'id')
+                ])
+            updated = sum(1 for product in products if product.sku in existing)
+            summary['updated'] += updated
+            summary['created'] += len(products) - updated
+        if dry_run:
+            transaction.set_rollback(True)
+    return summary
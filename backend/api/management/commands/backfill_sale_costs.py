@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+
+from api.models import Product, SaleDetail, SalesDataVersion
+
+
+class Command(BaseCommand):
+    help = (
+        'Completa el costo unitario y la ganancia de las líneas de venta anteriores a la captura de costos, '
+        'por tandas de ids. Usa el costo actual de cada producto, la mejor aproximación disponible.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        cost = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('cost_price')[:1])
+        pending = SaleDetail.objects.filter(unit_cost__isnull=True).order_by('id')
+        updated = 0
+        last_id = 0
+        while True:
+            ids = list(pending.filter(id__gt=last_id).values_list('id', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            # Cada tanda es una transacción corta: el comando puede interrumpirse y volver a correrse.
+            with transaction.atomic():
+                updated += SaleDetail.objects.filter(
+                    id__gte=ids[0], id__lte=ids[-1], unit_cost__isnull=True
+                ).update(unit_cost=cost, profit=F('quantity') * (F('unit_price') - cost))
+            last_id = ids[-1]
+            self.stdout.write(f"  {updated} líneas completadas (hasta id {last_id})")
+        if updated:
+            # Las exportaciones generadas antes del backfill dejan de reutilizarse.
+            SalesDataVersion.bump()
+        self.stdout.write(self.style.SUCCESS(f"{updated} líneas de venta con costo y ganancia completados."))
@@ -0,0 +1,54 @@
+import statistics
+import time
+
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+
+from api.permissions import CanViewPanel
+from api.serializers import MyTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el costo por petición de autenticar y autorizar con JWTAuthentication '
+        '(usuario de la base) frente a JWTStatelessUserAuthentication (usuario del token). '
+        'El usuario de prueba se crea dentro de una transacción que se revierte al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench-auth', password='bench-auth-123')
+            user.groups.add(Group.objects.get_or_create(name='Vendedor')[0])
+            token = str(MyTokenObtainPairSerializer.get_token(user).access_token)
+            factory = APIRequestFactory()
+
+            for label, authenticator in [
+                ('JWTAuthentication', JWTAuthentication()),
+                ('JWTStatelessUserAuthentication', JWTStatelessUserAuthentication()),
+            ]:
+                samples, queries = [], 0
+                for _ in range(options['requests']):
+                    request = Request(
+                        factory.get('/api/products/scan/', HTTP_AUTHORIZATION=f'Bearer {token}'),
+                        authenticators=[authenticator],
+                    )
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        request.user
+                        CanViewPanel().has_permission(request, None)
+                        samples.append((time.perf_counter() - start) * 1_000_000)
+                    queries += len(ctx)
+                self.stdout.write(
+                    f"{label:32} mediana {statistics.median(samples):8.1f} µs   "
+                    f"p95 {sorted(samples)[int(len(samples) * 0.95)]:8.1f} µs   "
+                    f"consultas/petición {queries / options['requests']:.1f}"
+                )
+            transaction.set_rollback(True)
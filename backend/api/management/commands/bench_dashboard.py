@@ -0,0 +1,144 @@
+import statistics
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.analytics import DashboardAnalytics, summary_report
+from api.models import Category, PaymentMethod, Product, ProductSalesRollup, SalesRollup
+from api.reports import orm_dashboard_report, orm_summary_report
+
+PRODUCTS = 500
+CATEGORIES = 12
+SELLERS = 3
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el dashboard calculado con el ORM (una consulta por gráfico) contra el motor '
+        'columnar de NumPy. Genera rollups sintéticos equivalentes a N ventas del último año '
+        'dentro de una transacción que se revierte al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(42)
+        with transaction.atomic():
+            catalog = self._create_catalog(rng)
+            for size in sorted(options['sizes']):
+                sales_rows, line_rows = self._generate_rollups(rng, catalog, size)
+                self.stdout.write(f"\n{size} ventas ({sales_rows} filas de ventas, {line_rows} filas de líneas)")
+                for label, orm, columnar in [
+                    ('dashboard', orm_dashboard_report, lambda: DashboardAnalytics().report()),
+                    ('reportes', orm_summary_report, summary_report),
+                ]:
+                    orm_ms, orm_queries = self._time(orm, options['repeat'])
+                    np_ms, np_queries = self._time(columnar, options['repeat'])
+                    self.stdout.write(
+                        f"  {label:10} ORM {orm_ms:9.1f} ms ({orm_queries} consultas)   "
+                        f"NumPy {np_ms:9.1f} ms ({np_queries} consultas)   x{orm_ms / max(np_ms, 0.001):.1f}"
+                    )
+            transaction.set_rollback(True)
+
+    def _create_catalog(self, rng):
+        methods = PaymentMethod.objects.bulk_create([
+            PaymentMethod(name=f'Bench método {i}', adjustment_percentage=0) for i in range(3)
+        ])
+        sellers = User.objects.bulk_create([User(username=f'bench-vendedor-{i}') for i in range(SELLERS)])
+        categories = Category.objects.bulk_create([Category(name=f'Bench categoría {i}') for i in range(CATEGORIES)])
+        products = Product.objects.bulk_create([
+            Product(
+                sku=f'BENCH-{i:05d}', name=f'Bench producto {i}', cost_price=60, sale_price=100,
+                stock=10, category=categories[i % CATEGORIES],
+            )
+            for i in range(PRODUCTS)
+        ])
+        return {
+            'methods': np.array([m.id for m in methods]),
+            'sellers': np.array([u.id for u in sellers]),
+            'products': np.array([p.id for p in products]),
+            'categories': np.array([p.category_id for p in products]),
+            'prices': rng.integers(100, 5000, PRODUCTS) * 100,
+        }
+
+    def _generate_rollups(self, rng, catalog, size):
+        """ Agrega `size` ventas aleatorias del último año directamente en filas de rollup. """
+        SalesRollup.objects.all().delete()
+        ProductSalesRollup.objects.all().delete()
+        today = timezone.localdate()
+
+        day = rng.integers(0, 365, size)
+        hour = rng.integers(8, 22, size)
+        method = rng.integers(0, len(catalog['methods']), size)
+        seller = rng.integers(0, SELLERS, size)
+
+        lines_per_sale = rng.integers(1, 6, size)
+        sale_index = np.repeat(np.arange(size), lines_per_sale)
+        product = rng.integers(0, PRODUCTS, len(sale_index))
+        quantity = rng.integers(1, 4, len(sale_index))
+        revenue = quantity * catalog['prices'][product]
+        amount = np.bincount(sale_index, weights=revenue, minlength=size)
+
+        slot = ((day * 24 + hour) * len(catalog['methods']) + method) * SELLERS + seller
+        sales_keys, sales_inverse = np.unique(slot, return_inverse=True)
+        sales_count = np.bincount(sales_inverse)
+        sales_amount = np.bincount(sales_inverse, weights=amount)
+        sales_rows = self._bulk_create(SalesRollup, (
+            SalesRollup(
+                day=today - timedelta(days=int(key // (24 * len(catalog['methods']) * SELLERS))),
+                hour=int(key // (len(catalog['methods']) * SELLERS) % 24),
+                payment_method_id=int(catalog['methods'][key // SELLERS % len(catalog['methods'])]),
+                seller_id=int(catalog['sellers'][key % SELLERS]),
+                sales_count=int(count), total_amount=total / 100,
+            )
+            for key, count, total in zip(sales_keys, sales_count, sales_amount)
+        ))
+
+        line_slot = slot[sale_index] * PRODUCTS + product
+        line_keys, line_inverse = np.unique(line_slot, return_inverse=True)
+        line_quantity = np.bincount(line_inverse, weights=quantity)
+        line_revenue = np.bincount(line_inverse, weights=revenue)
+        line_rows = self._bulk_create(ProductSalesRollup, (
+            ProductSalesRollup(
+                day=today - timedelta(days=int(key // PRODUCTS // (24 * len(catalog['methods']) * SELLERS))),
+                hour=int(key // PRODUCTS // (len(catalog['methods']) * SELLERS) % 24),
+                payment_method_id=int(catalog['methods'][key // PRODUCTS // SELLERS % len(catalog['methods'])]),
+                seller_id=int(catalog['sellers'][key // PRODUCTS % SELLERS]),
+                category_id=int(catalog['categories'][key % PRODUCTS]),
+                product_id=int(catalog['products'][key % PRODUCTS]),
+                quantity=int(units), revenue=total / 100, cost=total * 0.6 / 100,
+            )
+            for key, units, total in zip(line_keys, line_quantity, line_revenue)
+        ))
+        return sales_rows, line_rows
+
+    def _bulk_create(self, model, rows):
+        created = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                created += len(model.objects.bulk_create(batch))
+                batch = []
+        created += len(model.objects.bulk_create(batch))
+        return created
+
+    def _time(self, func, repeat):
+        samples = []
+        for _ in range(repeat):
+            # La carga de datos llena el registro de consultas; se vacía para contar sólo las del reporte.
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                func()
+                samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples), len(ctx)
@@ -0,0 +1,182 @@
+import io
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from api.columnar import export_sales_history, pq
+from api.exports import EXPORT_LEVELS, FLAT_FORMATS, sales_xlsx_file
+from api.models import Category, Product, Sale, SaleDetail
+
+BATCH_SIZE = 5000
+LINES_PER_SALE = 3
+
+
+def legacy_sales_xlsx(start_date, end_date, target):
+    """ Exportación anterior: todas las ventas y el libro completo en memoria. Sólo como referencia. """
+    sales = Sale.objects.filter(date_time__date__gte=start_date, date_time__date__lte=end_date).order_by('date_time')
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Reporte de Ventas"
+    headers = ['Fecha', 'ID Venta', 'Estado', 'Monto Total', 'Neto Gravado (21%)', 'IVA (21%)']
+    ws.append(headers)
+    for cell in ws[1]:
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+        cell.alignment = Alignment(horizontal='center')
+    for sale in sales:
+        total = sale.final_amount or Decimal('0.00')
+        neto = total / Decimal('1.21') if total > 0 else Decimal('0.00')
+        ws.append([sale.date_time.replace(tzinfo=None), sale.id, sale.status, total, neto, total - neto])
+    for col_num, header_title in enumerate(headers, 1):
+        col_letter = get_column_letter(col_num)
+        if header_title in ['Monto Total', 'Neto Gravado (21%)', 'IVA (21%)']:
+            ws.column_dimensions[col_letter].width = 18
+            for cell in ws[col_letter]:
+                if cell.row > 1: cell.number_format = '"$"#,##0.00'
+        elif header_title == 'Fecha':
+            ws.column_dimensions[col_letter].width = 20
+            for cell in ws[col_letter]:
+                if cell.row > 1: cell.number_format = 'DD/MM/YYYY HH:MM'
+        else:
+            ws.column_dimensions[col_letter].width = 15
+            for cell in ws[col_letter]:
+                if cell.row > 1: cell.alignment = Alignment(horizontal='center')
+    wb.save(target)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide tiempo y pico de memoria de la exportación de ventas: XLSX anterior (libro completo '
+        'en memoria) contra write-only, los formatos planos CSV/NDJSON por venta y por línea y el '
+        'historial en Parquet (escritura, reuso incremental y carga). '
+        'Genera N ventas de tres líneas, repartidas en los últimos --days días, dentro de una transacción '
+        'que se revierte al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument(
+            '--legacy-max', type=int, default=100_000,
+            help='Tamaño máximo con el que se corre la versión anterior (a 1M usa varios GB).',
+        )
+        formats = ['xlsx', *FLAT_FORMATS, 'parquet']
+        parser.add_argument('--formats', nargs='+', choices=formats, default=formats)
+        parser.add_argument(
+            '--days', type=int, default=1,
+            help='Días en los que se reparten las ventas; las exportaciones cubren todo el período.',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        first_day = today - timedelta(days=options['days'] - 1)
+        formats = options['formats']
+        with transaction.atomic():
+            product = Product.objects.create(
+                sku='BENCH-EXPORT', name='Bench producto', cost_price=Decimal('300.00'),
+                sale_price=Decimal('411.50'), stock=0, category=Category.objects.create(name='Bench categoría'),
+            )
+            created = 0
+            for size in sorted(options['sizes']):
+                created += self._create_sales(product, size - created, created, options['days'])
+                self.stdout.write(
+                    f"\n{size} ventas ({size * LINES_PER_SALE} líneas) en {options['days']} días"
+                )
+                if 'xlsx' in formats:
+                    if size <= options['legacy_max']:
+                        self._report('xlsx anterior', lambda: self._legacy_size(first_day, today))
+                    self._report('xlsx write-only', lambda: self._xlsx_size(first_day, today))
+                for export_format in formats:
+                    if export_format not in FLAT_FORMATS:
+                        continue
+                    chunks, _ = FLAT_FORMATS[export_format]
+                    for level, (_, fields, rows) in EXPORT_LEVELS.items():
+                        self._report(
+                            f'{export_format} {level}',
+                            lambda: self._drain(chunks(fields, rows(first_day, today))),
+                        )
+                if 'parquet' in formats and pq is not None:
+                    self._report_parquet(first_day, today)
+            transaction.set_rollback(True)
+
+    def _create_sales(self, product, count, offset, days):
+        # date_time es auto_now_add: cada tanda se mueve después a su día, de
+        # forma que la venta número i cae i % days días antes de hoy.
+        now = timezone.now()
+        created = 0
+        while created < count:
+            batch = min(BATCH_SIZE, count - created)
+            sales = Sale.objects.bulk_create([
+                Sale(total_amount=Decimal('1234.50'), final_amount=Decimal('1234.50')) for _ in range(batch)
+            ])
+            SaleDetail.objects.bulk_create([
+                SaleDetail(
+                    sale=sale, product=product, quantity=1, unit_price=Decimal('411.50'),
+                    unit_cost=Decimal('300.00'), profit=Decimal('111.50'),
+                )
+                for sale in sales for _ in range(LINES_PER_SALE)
+            ])
+            if days > 1:
+                by_day = defaultdict(list)
+                for number, sale in enumerate(sales, start=offset + created):
+                    by_day[number % days].append(sale.id)
+                for days_ago, ids in by_day.items():
+                    Sale.objects.filter(id__in=ids).update(date_time=now - timedelta(days=days_ago))
+            created += batch
+        return created
+
+    @staticmethod
+    def _legacy_size(start_date, end_date):
+        target = io.BytesIO()
+        legacy_sales_xlsx(start_date, end_date, target)
+        return target.tell()
+
+    @staticmethod
+    def _xlsx_size(start_date, end_date):
+        with sales_xlsx_file(start_date, end_date) as target:
+            return target.seek(0, io.SEEK_END)
+
+    def _report_parquet(self, start_date, end_date):
+        with tempfile.TemporaryDirectory() as root:
+            root = Path(root)
+            self._report('parquet', lambda: self._parquet_size(root, start_date, end_date))
+            start = time.perf_counter()
+            export_sales_history(root, start_date, end_date)
+            self.stdout.write(f"  {'parquet reuso':16} {time.perf_counter() - start:8.2f} s")
+            start = time.perf_counter()
+            rows = pq.read_table(root / 'sales').num_rows + pq.read_table(root / 'sale_lines').num_rows
+            self.stdout.write(f"  {'parquet carga':16} {time.perf_counter() - start:8.2f} s   {rows} filas")
+
+    @staticmethod
+    def _parquet_size(root, start_date, end_date):
+        export_sales_history(root, start_date, end_date, full=True)
+        return sum(path.stat().st_size for path in root.rglob('*') if path.is_file())
+
+    @staticmethod
+    def _drain(chunks):
+        # Lo mismo que hace StreamingHttpResponse con cada bloque antes de enviarlo.
+        return sum(len(chunk.encode()) for chunk in chunks)
+
+    def _report(self, label, export):
+        # El tiempo se mide sin tracemalloc (lo hace varias veces más lento); la memoria en otra pasada.
+        start = time.perf_counter()
+        size = export()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        try:
+            export()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        throughput = f"   archivo {size / 2**20:7.1f} MiB ({size / 2**20 / elapsed:5.1f} MiB/s)" if size else ''
+        self.stdout.write(f"  {label:16} {elapsed:8.2f} s   pico {peak / 2**20:9.1f} MiB{throughput}")
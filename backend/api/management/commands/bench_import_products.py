@@ -0,0 +1,62 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from openpyxl import Workbook
+
+from api.imports import csv_rows, import_products, xlsx_rows
+
+HEADER = ['sku', 'nombre', 'descripcion', 'costo', 'precio', 'stock', 'categoria', 'proveedor']
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la importación de catálogo desde CSV y XLSX: alta de N productos y reimportación del mismo '
+        'archivo (todo actualizaciones). Todo ocurre dentro de una transacción que se revierte al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50_000)
+        parser.add_argument('--categories', type=int, default=50)
+
+    def handle(self, *args, **options):
+        rows = [
+            [
+                f'BENCH-IMP-{i}', f'Bench importado {i}', f'Descripción del producto {i}',
+                f'{100 + i % 900}.50', f'{150 + i % 900}.75', i % 20,
+                f'Bench categoría {i % options["categories"]}', '',
+            ]
+            for i in range(options['rows'])
+        ]
+        files = {'csv': self._csv(rows), 'xlsx': self._xlsx(rows)}
+        readers = {'csv': csv_rows, 'xlsx': xlsx_rows}
+        self.stdout.write(f"{options['rows']} filas")
+        for file_format, content in files.items():
+            self.stdout.write(f"  {file_format}: {len(content) / 2**20:.1f} MiB")
+            with transaction.atomic():
+                for label in ('alta', 'reimportación'):
+                    start = time.perf_counter()
+                    summary = import_products(readers[file_format](io.BytesIO(content)))
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f"    {label:14} {elapsed:7.2f} s   {summary['created']} creados, "
+                        f"{summary['updated']} actualizados, {summary['error_count']} errores"
+                    )
+                transaction.set_rollback(True)
+
+    @staticmethod
+    def _csv(rows):
+        lines = [','.join(HEADER)] + [','.join(map(str, row)) for row in rows]
+        return '\n'.join(lines).encode()
+
+    @staticmethod
+    def _xlsx(rows):
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(HEADER)
+        for row in rows:
+            sheet.append(row)
+        target = io.BytesIO()
+        workbook.save(target)
+        return target.getvalue()
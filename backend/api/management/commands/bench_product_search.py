@@ -0,0 +1,82 @@
+import random
+import statistics
+import time
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from api.models import Product
+from api.search import fts_search, product_fts_available
+
+WORDS = [
+    'arroz', 'yerba', 'azucar', 'leche', 'cafe', 'galletitas', 'fideos', 'aceite', 'harina', 'jabon',
+    'detergente', 'lavandina', 'cuaderno', 'lapicera', 'auriculares', 'cargador', 'cable', 'remera',
+    'pantalon', 'media', 'pelota', 'muñeca', 'vino', 'cerveza', 'gaseosa', 'agua', 'jugo', 'queso',
+    'manteca', 'dulce', 'mermelada', 'atun', 'tomate', 'arvejas', 'lentejas', 'sal', 'pimienta',
+]
+QUERIES = ['yerba', 'cab', 'leche entera', 'SKU-0004', 'inexistente']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la búsqueda de productos con FTS5 contra el LIKE de SearchFilter. '
+        'Los productos de prueba se crean dentro de una transacción que se revierte al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if not product_fts_available():
+            raise CommandError('El índice FTS5 no está disponible (requiere SQLite y la migración 0020).')
+        random.seed(42)
+        with transaction.atomic():
+            created = 0
+            for size in sorted(options['sizes']):
+                created = self._grow_catalog(created, size)
+                self.stdout.write(f"\n{size} productos")
+                for query in QUERIES:
+                    like_ms = self._time(lambda: self._like(query), options['repeat'])
+                    fts_ms = self._time(lambda: self._fts(query), options['repeat'])
+                    self.stdout.write(
+                        f"  {query!r:16} LIKE {like_ms:9.2f} ms   FTS5 {fts_ms:8.2f} ms   x{like_ms / max(fts_ms, 0.001):.0f}"
+                    )
+            transaction.set_rollback(True)
+
+    def _grow_catalog(self, created, size):
+        batch = []
+        for i in range(created, size):
+            words = random.sample(WORDS, 3)
+            batch.append(Product(
+                sku=f'SKU-{i:07d}',
+                name=f'{" ".join(words).title()} {i}',
+                description=' '.join(random.choices(WORDS, k=12)),
+                cost_price=100, sale_price=150, stock=10,
+            ))
+            if len(batch) == 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        Product.objects.bulk_create(batch)
+        return size
+
+    def _like(self, query):
+        qs = Product.objects.order_by('name')
+        for term in query.split():
+            qs = qs.filter(reduce(or_, [Q(**{f'{field}__icontains': term}) for field in ('name', 'sku', 'description')]))
+        return qs.count(), list(qs[:10])
+
+    def _fts(self, query):
+        qs = fts_search(Product.objects.all(), query.split())
+        return qs.count(), list(qs[:10])
+
+    def _time(self, func, repeat):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import IMPORT_CHUNK_SIZE, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa un catálogo de productos o una lista de precios de proveedor desde un CSV o XLSX. '
+        'Los sku existentes se actualizan y los demás se crean; las filas con errores se informan y se saltean.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path, help='Archivo .csv o .xlsx con encabezado en la primera fila.')
+        parser.add_argument('--dry-run', action='store_true', help='Valida e informa sin guardar cambios.')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            with path.open('rb') as file:
+                summary = import_products(
+                    read_rows(file, path.name), dry_run=options['dry_run'], chunk_size=options['chunk_size'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        for error in summary['errors']:
+            details = '; '.join(f'{field}: {message}' for field, message in error['errors'].items())
+            self.stderr.write(f"  fila {error['row']}: {details}")
+        if summary['error_count'] > len(summary['errors']):
+            self.stderr.write(f"  ... y {summary['error_count'] - len(summary['errors'])} filas más con errores")
+        self.stdout.write(
+            f"  {summary['created']} creados, {summary['updated']} actualizados, "
+            f"{summary['categories_created']} categorías nuevas, {summary['error_count']} filas con errores"
+        )
+        message = "Validación terminada (sin guardar cambios)." if options['dry_run'] else "Importación terminada."
+        self.stdout.write(self.style.SUCCESS(message))
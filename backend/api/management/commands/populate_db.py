@@ -2,6 +2,7 @@
 
 import random
 from datetime import timedelta
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from faker import Faker
@@ -9,8 +10,10 @@ from faker import Faker
 # --- INICIO DEL CAMBIO ---
 # Se cambia el import relativo por uno absoluto desde la raíz del proyecto
 from api.models import (
-    PaymentMethod, Provider, Category, Product, Client, Sale, SaleDetail, User
+    PaymentMethod, Provider, Category, Product, Client, Sale, SaleDetail, User,
+    StockMovement,
 )
+from api.services import record_stock_movements
 # --- FIN DEL CAMBIO ---
 
 class Command(BaseCommand):
@@ -19,6 +22,7 @@ class Command(BaseCommand):
     def handle(self, *args, **kwargs):
         self.stdout.write("Limpiando la base de datos...")
         # Borra en orden para evitar problemas de claves foráneas
+        StockMovement.objects.all().delete()
         SaleDetail.objects.all().delete()
         Sale.objects.all().delete()
         Client.objects.all().delete()
@@ -84,6 +88,10 @@ class Command(BaseCommand):
                 category=random.choice(categorias),
                 provider=random.choice(proveedores),
             )
+            StockMovement.objects.create(
+                product=producto, kind='inicial', quantity=producto.stock,
+                created_at=timezone.now() - timedelta(days=61)
+            )
             productos.append(producto)
 
         self.stdout.write("Generando historial de ventas de los últimos 60 días...")
@@ -101,6 +109,7 @@ class Command(BaseCommand):
             )
             
             subtotal = 0
+            movimientos = []
             num_detalles = random.randint(1, 5)
 
             productos_en_venta = random.sample(productos, num_detalles)
@@ -119,13 +128,21 @@ class Command(BaseCommand):
                         unit_price=precio_unitario
                     )
                     subtotal += precio_unitario * cantidad
-                    
+                    movimientos.append(StockMovement(
+                        product=producto_en_venta, kind='venta', quantity=-cantidad,
+                        sale=sale, user=sale.user, created_at=sale_datetime
+                    ))
                     producto_en_venta.stock -= cantidad
-                    producto_en_venta.save()
+
+            record_stock_movements(movimientos)
 
             sale.total_amount = subtotal
             sale.save()
             
             Sale.objects.filter(pk=sale.pk).update(date_time=sale_datetime)
 
+        call_command('rebuild_popularity', stdout=self.stdout)
+        call_command('rebuild_sales_rollups', stdout=self.stdout)
+        call_command('rebuild_product_stats', stdout=self.stdout)
+
         self.stdout.write(self.style.SUCCESS('¡Base de datos poblada con éxito!'))
\ No newline at end of file
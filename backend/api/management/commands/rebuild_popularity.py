@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api.models import ProductPopularity, SaleDetail
+from api.popularity import WINDOW_DAYS, prune_popularity
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los buckets diarios de popularidad de productos a partir de las ventas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-only', action='store_true', help='Sólo elimina los buckets vencidos.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['prune_only']:
+            deleted = prune_popularity()
+            self.stdout.write(self.style.SUCCESS(f"{deleted} buckets vencidos eliminados."))
+            return
+
+        since = timezone.localdate() - timedelta(days=WINDOW_DAYS - 1)
+        buckets = (
+            SaleDetail.objects.filter(sale__status='Completada', sale__date_time__date__gte=since)
+            .annotate(day=TruncDate('sale__date_time'))
+            .values('product_id', 'day').annotate(total=Sum('quantity')).order_by()
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        created = 0
+        with transaction.atomic():
+            ProductPopularity.objects.all().delete()
+            batch = []
+            for bucket in buckets:
+                batch.append(ProductPopularity(product_id=bucket['product_id'], day=bucket['day'], quantity=bucket['total']))
+                if len(batch) >= options['chunk_size']:
+                    created += len(ProductPopularity.objects.bulk_create(batch))
+                    batch = []
+            created += len(ProductPopularity.objects.bulk_create(batch))
+        self.stdout.write(self.style.SUCCESS(f"{created} buckets de popularidad reconstruidos."))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, Max, Sum
+from django.db.models.functions import Coalesce
+
+from api.models import ProductSalesStats, SaleDetail
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la última venta, las unidades, la facturación y la ganancia acumuladas de cada producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        money = DecimalField(max_digits=14, decimal_places=2)
+        stats = (
+            SaleDetail.objects.filter(sale__status='Completada')
+            .values('product_id')
+            .annotate(
+                last_sold_at=Max('sale__date_time'),
+                units=Sum('quantity'),
+                total=Sum(F('quantity') * F('unit_price'), output_field=money),
+                total_profit=Sum(F('quantity') * (F('unit_price') - Coalesce('unit_cost', 'product__cost_price')), output_field=money),
+            )
+            .order_by()
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        created = 0
+        with transaction.atomic():
+            ProductSalesStats.objects.all().delete()
+            batch = []
+            for row in stats:
+                batch.append(ProductSalesStats(
+                    product_id=row['product_id'], last_sold_at=row['last_sold_at'],
+                    units_sold=row['units'], revenue=row['total'] or 0, profit=row['total_profit'] or 0,
+                ))
+                if len(batch) >= options['chunk_size']:
+                    created += len(ProductSalesStats.objects.bulk_create(batch))
+                    batch = []
+            created += len(ProductSalesStats.objects.bulk_create(batch))
+        self.stdout.write(self.style.SUCCESS(f"Estadísticas de {created} productos reconstruidas."))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce, ExtractHour, TruncDate
+
+from api.models import ProductSalesRollup, Sale, SaleDetail, SalesRollup
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los rollups de ventas del dashboard a partir del historial de ventas completadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        money = DecimalField(max_digits=14, decimal_places=2)
+        sale_rows = (
+            Sale.objects.filter(status='Completada')
+            .annotate(day=TruncDate('date_time'), hour=ExtractHour('date_time'))
+            .values('day', 'hour', 'payment_method_id', 'user_id')
+            .annotate(sales_count=Count('id'), total_amount=Sum('final_amount'))
+            .order_by()
+        )
+        line_rows = (
+            SaleDetail.objects.filter(sale__status='Completada')
+            .annotate(day=TruncDate('sale__date_time'), hour=ExtractHour('sale__date_time'))
+            .values('day', 'hour', 'sale__payment_method_id', 'sale__user_id', 'category_id', 'product_id')
+            .annotate(
+                total_quantity=Sum('quantity'),
+                revenue=Sum(F('quantity') * F('unit_price'), output_field=money),
+                cost=Sum(F('quantity') * Coalesce('unit_cost', 'product__cost_price'), output_field=money),
+            )
+            .order_by()
+        )
+        with transaction.atomic():
+            SalesRollup.objects.all().delete()
+            ProductSalesRollup.objects.all().delete()
+            sales_created = self._write(SalesRollup, (
+                SalesRollup(
+                    day=row['day'], hour=row['hour'], payment_method_id=row['payment_method_id'],
+                    seller_id=row['user_id'], sales_count=row['sales_count'],
+                    total_amount=row['total_amount'] or 0,
+                )
+                for row in sale_rows.iterator(chunk_size=options['chunk_size'])
+            ), options['chunk_size'])
+            lines_created = self._write(ProductSalesRollup, (
+                ProductSalesRollup(
+                    day=row['day'], hour=row['hour'], payment_method_id=row['sale__payment_method_id'],
+                    seller_id=row['sale__user_id'], category_id=row['category_id'],
+                    product_id=row['product_id'], quantity=row['total_quantity'],
+                    revenue=row['revenue'] or 0, cost=row['cost'] or 0,
+                )
+                for row in line_rows.iterator(chunk_size=options['chunk_size'])
+            ), options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{sales_created} rollups de ventas y {lines_created} rollups de productos reconstruidos."
+        ))
+
+    @staticmethod
+    def _write(model, rows, chunk_size):
+        created = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                created += len(model.objects.bulk_create(batch))
+                batch = []
+        created += len(model.objects.bulk_create(batch))
+        return created
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from api.models import CatalogVersion, Product, StockMovement
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Product.stock a partir del libro de movimientos de stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Sólo informa las diferencias, sin corregirlas.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        # Ambos flujos vienen ordenados por producto, así se cruzan en una sola pasada
+        # sin cargar el catálogo ni el libro completos en memoria.
+        balances = iter(
+            StockMovement.objects.values('product_id').annotate(balance=Sum('quantity'))
+            .order_by('product_id').values_list('product_id', 'balance').iterator(chunk_size=chunk_size)
+        )
+        products = Product.objects.order_by('id').values_list('id', 'stock').iterator(chunk_size=chunk_size)
+
+        # Una sola versión de catálogo por corrida, para que la sincronización del POS
+        # reciba los saldos corregidos (bulk_update no pasa por Product.save).
+        self.version = None
+        checked = corrected = negative = 0
+        pending = []
+        next_balance = next(balances, None)
+        for product_id, stock in products:
+            while next_balance is not None and next_balance[0] < product_id:
+                next_balance = next(balances, None)
+            balance = next_balance[1] if next_balance is not None and next_balance[0] == product_id else 0
+            checked += 1
+            if balance == stock:
+                continue
+            if balance < 0:
+                negative += 1
+                self.stdout.write(self.style.WARNING(f"Producto #{product_id}: el libro da saldo negativo ({balance})."))
+                continue
+            self.stdout.write(f"Producto #{product_id}: stock {stock} -> {balance}")
+            corrected += 1
+            pending.append(Product(id=product_id, stock=balance))
+            if len(pending) >= chunk_size and not options['dry_run']:
+                self._flush(pending)
+                pending = []
+
+        if not options['dry_run']:
+            self._flush(pending)
+
+        verb = 'a corregir' if options['dry_run'] else 'corregidos'
+        self.stdout.write(self.style.SUCCESS(
+            f"{checked} productos revisados, {corrected} {verb}, {negative} con saldo negativo."
+        ))
+
+    def _flush(self, products):
+        if not products:
+            return
+        with transaction.atomic():
+            self.version = self.version or CatalogVersion.bump()
+            for product in products:
+                product.catalog_version = self.version
+            Product.objects.bulk_update(products, ['stock', 'catalog_version'])
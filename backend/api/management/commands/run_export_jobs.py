@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.export_jobs import job_path, run_export_job
+from api.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Procesa las exportaciones pendientes fuera del servidor web, por ejemplo las que quedaron en cola '
+        'al reiniciarlo. Opcionalmente reencola las que quedaron a medias y borra las viejas con sus archivos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requeue', action='store_true',
+            help='Vuelve a encolar los trabajos en proceso. Usar sólo con el servidor detenido.',
+        )
+        parser.add_argument('--purge-days', type=int, help='Borra los trabajos terminados hace más de N días.')
+
+    def handle(self, *args, **options):
+        if options['requeue']:
+            requeued = ExportJob.objects.filter(status='en_proceso').update(status='pendiente', started_at=None)
+            self.stdout.write(f"  {requeued} trabajos reencolados")
+
+        processed = 0
+        for job_id in ExportJob.objects.filter(status='pendiente').order_by('id').values_list('id', flat=True):
+            run_export_job(job_id)
+            job = ExportJob.objects.get(pk=job_id)
+            self.stdout.write(f"  #{job.id} {job.export_format} {job.start_date} a {job.end_date}: {job.status}")
+            processed += 1
+
+        if options['purge_days'] is not None:
+            old = ExportJob.objects.filter(
+                status__in=['terminado', 'error'], finished_at__lt=timezone.now() - timedelta(days=options['purge_days'])
+            )
+            for job in old:
+                if job.file_name:
+                    job_path(job).unlink(missing_ok=True)
+            purged, _ = old.delete()
+            self.stdout.write(f"  {purged} trabajos viejos borrados")
+
+        self.stdout.write(self.style.SUCCESS(f"{processed} exportaciones procesadas."))
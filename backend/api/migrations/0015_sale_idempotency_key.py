@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-17 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_alter_client_name_alter_provider_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Generada por la terminal para evitar ventas duplicadas al reintentar.', max_length=64, null=True, unique=True, verbose_name='Clave de idempotencia'),
+        ),
+    ]
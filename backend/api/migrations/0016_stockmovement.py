@@ -0,0 +1,33 @@
+# Generated by Django 5.2.2 on 2026-10-17 07:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_sale_idempotency_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('inicial', 'Stock inicial'), ('venta', 'Venta'), ('cancelacion', 'Cancelación'), ('reposicion', 'Reposición'), ('ajuste', 'Ajuste')], max_length=20, verbose_name='Tipo')),
+                ('quantity', models.IntegerField(help_text='Positiva para ingresos, negativa para egresos.', verbose_name='Cantidad')),
+                ('note', models.CharField(blank=True, default='', max_length=255, verbose_name='Nota')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='api.product', verbose_name='Producto')),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to='api.sale', verbose_name='Venta')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='api_stockmo_product_594dde_idx')],
+            },
+        ),
+    ]
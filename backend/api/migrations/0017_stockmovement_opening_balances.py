@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def create_opening_balances(apps, schema_editor):
+    # El stock existente pasa a ser el saldo inicial del libro de movimientos.
+    Product = apps.get_model('api', 'Product')
+    StockMovement = apps.get_model('api', 'StockMovement')
+    batch = []
+    for product_id, stock in Product.objects.filter(stock__gt=0).values_list('id', 'stock').iterator(chunk_size=2000):
+        batch.append(StockMovement(product_id=product_id, kind='inicial', quantity=stock, note='Saldo de apertura'))
+        if len(batch) >= 2000:
+            StockMovement.objects.bulk_create(batch)
+            batch = []
+    StockMovement.objects.bulk_create(batch)
+
+
+def delete_opening_balances(apps, schema_editor):
+    StockMovement = apps.get_model('api', 'StockMovement')
+    StockMovement.objects.filter(kind='inicial').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_stockmovement'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_opening_balances, delete_opening_balances),
+    ]
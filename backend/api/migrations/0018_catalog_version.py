@@ -0,0 +1,39 @@
+# Generated by Django 5.2.2 on 2026-10-17 07:41
+
+from django.db import migrations, models
+
+
+def create_catalog_version(apps, schema_editor):
+    CatalogVersion = apps.get_model('api', 'CatalogVersion')
+    CatalogVersion.objects.get_or_create(pk=1, defaults={'value': 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_stockmovement_opening_balances'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Versión')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.BigIntegerField(verbose_name='Producto')),
+                ('catalog_version', models.BigIntegerField(db_index=True, verbose_name='Versión de catálogo')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='catalog_version',
+            field=models.BigIntegerField(db_index=True, default=0, verbose_name='Versión de catálogo'),
+        ),
+        migrations.RunPython(create_catalog_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.2 on 2026-10-17 07:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_catalog_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='Día')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Unidades vendidas')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='api.product', verbose_name='Producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'product'], name='api_product_day_1fa072_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='unique_product_popularity_day')],
+            },
+        ),
+    ]
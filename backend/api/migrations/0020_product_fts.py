@@ -0,0 +1,75 @@
+from django.db import migrations
+
+# Índice FTS5 de contenido externo sobre api_product. Los triggers lo mantienen
+# sincronizado en cualquier escritura: save(), bulk_create(), update() y delete().
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS api_product_fts USING fts5(
+        name, sku, description,
+        content='api_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_product_fts_ai AFTER INSERT ON api_product BEGIN
+        INSERT INTO api_product_fts(rowid, name, sku, description)
+        VALUES (new.id, new.name, new.sku, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_product_fts_ad AFTER DELETE ON api_product BEGIN
+        INSERT INTO api_product_fts(api_product_fts, rowid, name, sku, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_product_fts_au AFTER UPDATE OF name, sku, description ON api_product BEGIN
+        INSERT INTO api_product_fts(api_product_fts, rowid, name, sku, description)
+        VALUES ('delete', old.id, old.name, old.sku, old.description);
+        INSERT INTO api_product_fts(rowid, name, sku, description)
+        VALUES (new.id, new.name, new.sku, new.description);
+    END
+    """,
+    "INSERT INTO api_product_fts(api_product_fts) VALUES ('rebuild')",
+]
+
+BACKWARD_SQL = [
+    "DROP TRIGGER IF EXISTS api_product_fts_au",
+    "DROP TRIGGER IF EXISTS api_product_fts_ad",
+    "DROP TRIGGER IF EXISTS api_product_fts_ai",
+    "DROP TABLE IF EXISTS api_product_fts",
+]
+
+
+def _sqlite_with_fts5(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_product_fts(apps, schema_editor):
+    # En otros motores la búsqueda sigue usando SearchFilter (LIKE).
+    if not _sqlite_with_fts5(schema_editor):
+        return
+    for statement in FORWARD_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_product_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in BACKWARD_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_productpopularity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_product_fts, drop_product_fts),
+    ]
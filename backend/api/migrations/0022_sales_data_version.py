@@ -0,0 +1,29 @@
+# Generated by Django 5.2.2 on 2026-10-17 07:52
+
+from django.db import migrations, models
+
+
+def create_sales_data_version(apps, schema_editor):
+    SalesDataVersion = apps.get_model('api', 'SalesDataVersion')
+    SalesDataVersion.objects.get_or_create(pk=1, defaults={'value': 0})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField(default=0, verbose_name='Versión')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(create_sales_data_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.2 on 2026-10-17 08:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_sales_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales_stats', serialize=False, to='api.product', verbose_name='Producto')),
+                ('last_sold_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Última venta')),
+                ('units_sold', models.IntegerField(db_index=True, default=0, verbose_name='Unidades vendidas')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Facturación')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.2 on 2026-10-17 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_product_sales_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productsalesstats',
+            name='profit',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Ganancia bruta'),
+        ),
+        migrations.AddField(
+            model_name='saledetail',
+            name='profit',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Ganancia'),
+        ),
+        migrations.AddField(
+            model_name='saledetail',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Costo Unitario'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.2 on 2026-10-17 09:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_saledetail_cost_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_format', models.CharField(choices=[('xlsx', 'XLSX'), ('csv', 'CSV'), ('ndjson', 'NDJSON')], max_length=10, verbose_name='Formato')),
+                ('level', models.CharField(choices=[('sales', 'Por venta'), ('lines', 'Por línea de venta')], default='sales', max_length=10, verbose_name='Nivel de detalle')),
+                ('start_date', models.DateField(verbose_name='Desde')),
+                ('end_date', models.DateField(verbose_name='Hasta')),
+                ('data_version', models.BigIntegerField(verbose_name='Versión de los datos de ventas')),
+                ('status', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('terminado', 'Terminado'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('rows_processed', models.BigIntegerField(default=0, verbose_name='Filas procesadas')),
+                ('total_rows', models.BigIntegerField(blank=True, null=True, verbose_name='Filas totales')),
+                ('file_name', models.CharField(blank=True, default='', max_length=255, verbose_name='Archivo')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Error')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Creado')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Iniciado')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Terminado')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start_date', 'end_date', 'export_format', 'level', 'data_version'], name='api_exportj_start_d_fffe74_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-17 10:27
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_export_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_cost_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Costo anterior')),
+                ('new_cost_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Costo nuevo')),
+                ('old_sale_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Precio anterior')),
+                ('new_sale_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Precio nuevo')),
+                ('percentage', models.DecimalField(decimal_places=2, max_digits=7, verbose_name='Porcentaje aplicado')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_changes', to='api.product', verbose_name='Producto')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='api_pricech_product_dc1b01_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.2 on 2026-10-17 10:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_price_change'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['-date_time', '-id'], name='api_sale_date_ti_1b98f9_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-17 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_sale_date_time_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='catalog_version',
+            field=models.BigIntegerField(blank=True, help_text='Sólo en exportaciones por línea, que incluyen datos del producto.', null=True, verbose_name='Versión del catálogo'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.2 on 2026-10-17 11:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_export_job_catalog_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='date_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha y Hora'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_product_categories(apps, schema_editor):
+    # La categoría de las líneas existentes no se conoce: se toma la actual del
+    # producto, la misma que usaban hasta ahora los rollups al cancelar.
+    Product = apps.get_model('api', 'Product')
+    SaleDetail = apps.get_model('api', 'SaleDetail')
+    SaleDetail.objects.update(
+        category_id=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('category_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_sale_date_time_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saledetail',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.category', verbose_name='Categoría'),
+        ),
+        migrations.RunPython(copy_product_categories, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class PaymentMethod(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name='Nombre del Método')
@@ -29,6 +30,41 @@ class Category(models.Model):
     is_active = models.BooleanField(default=True, verbose_name='Activa')
     def __str__(self): return self.name
 
+class VersionCounter(models.Model):
+    """ Contador global y monótono guardado en una única fila (pk=1), creada por la migración. """
+    value = models.BigIntegerField(default=0, verbose_name='Versión')
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('value', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        # La fila única se crea en la migración; el UPDATE toma el bloqueo de escritura
+        # y la lectura dentro de la misma transacción ve el valor propio.
+        with transaction.atomic():
+            cls.objects.filter(pk=1).update(value=models.F('value') + 1)
+            return cls.objects.values_list('value', flat=True).get(pk=1)
+
+class CatalogVersion(VersionCounter):
+    """
+    Contador global y monótono del catálogo. Cada cambio de producto, precio o
+    stock se marca con el siguiente valor, así las terminales del POS piden
+    sólo lo que cambió desde la última versión que conocen.
+    """
+    def __str__(self): return f"Catálogo v{self.value}"
+
+class SalesDataVersion(VersionCounter):
+    """
+    Versión de los datos de ventas: cambia cada vez que se crea, cancela o
+    elimina una venta completada. Junto con CatalogVersion identifica el
+    estado de los reportes cacheados.
+    """
+    def __str__(self): return f"Ventas v{self.value}"
+
 class Product(models.Model):
     STATUS_CHOICES = [
         ('activo', 'Activo'),
@@ -49,8 +85,23 @@ class Product(models.Model):
         default='activo', 
         verbose_name='Estado'
     )
+    catalog_version = models.BigIntegerField(default=0, db_index=True, verbose_name='Versión de catálogo')
+
+    def save(self, *args, **kwargs):
+        self.catalog_version = CatalogVersion.bump()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'catalog_version'}
+        super().save(*args, **kwargs)
+
     def __str__(self): return self.name
 
+class ProductTombstone(models.Model):
+    """ Registro de productos eliminados, para informarlos en la sincronización del POS. """
+    product_id = models.BigIntegerField(verbose_name='Producto')
+    catalog_version = models.BigIntegerField(db_index=True, verbose_name='Versión de catálogo')
+    def __str__(self): return f"Producto #{self.product_id} eliminado (v{self.catalog_version})"
+
 class Client(models.Model):
     name = models.CharField(max_length=200, unique=True, verbose_name='Nombre')
     email = models.EmailField(unique=True, blank=True, null=True, verbose_name='Email')
@@ -65,7 +116,8 @@ class Sale(models.Model):
         ('Cancelada', 'Cancelada'),
     ]
 
-    date_time = models.DateTimeField(auto_now_add=True, verbose_name='Fecha y Hora')
+    # Las ventas sincronizadas desde una terminal offline traen la hora en que se hicieron.
+    date_time = models.DateTimeField(default=timezone.now, verbose_name='Fecha y Hora')
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name='Vendedor')
     client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Cliente')
     
@@ -79,13 +131,29 @@ class Sale(models.Model):
         default='Completada', 
         verbose_name='Estado'
     )
+    idempotency_key = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name='Clave de idempotencia',
+        help_text='Generada por la terminal para evitar ventas duplicadas al reintentar.'
+    )
+
+    class Meta:
+        # Orden del listado (SaleKeysetPagination) y rangos por fecha de reportes y exportaciones.
+        indexes = [models.Index(fields=['-date_time', '-id'])]
     
-    def save(self, *args, **kwargs):
+    def calculate_final_amount(self):
         if self.payment_method:
             adjustment = 1 + (self.payment_method.adjustment_percentage / 100)
             self.final_amount = self.total_amount * adjustment
         else:
             self.final_amount = self.total_amount
+        return self.final_amount
+
+    def save(self, *args, **kwargs):
+        self.calculate_final_amount()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -96,8 +164,121 @@ class SaleDetail(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT, verbose_name='Producto')
     quantity = models.PositiveIntegerField(verbose_name='Cantidad')
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Precio Unitario')
+    # Costo y ganancia del momento de la venta; NULL sólo en líneas anteriores a backfill_sale_costs.
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Costo Unitario')
+    profit = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name='Ganancia')
+    # Categoría del producto al momento de la venta: la usan los rollups al registrar y al cancelar.
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='Categoría'
+    )
+
+    def calculate_profit(self):
+        """ Toma el costo actual del producto si la línea todavía no lo tiene y calcula la ganancia. """
+        if self.unit_cost is None:
+            self.unit_cost = self.product.cost_price
+        self.profit = self.quantity * (self.unit_price - self.unit_cost)
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.category_id = self.product.category_id
+        self.calculate_profit()
+        super().save(*args, **kwargs)
+
     def __str__(self): return f"{self.quantity} x {self.product.name} en Venta #{self.sale.id}"
 
+class ProductPopularity(models.Model):
+    """
+    Unidades vendidas por producto y día (fecha local). Se actualiza al crear
+    y cancelar ventas, y alimenta el ranking de productos populares del POS.
+    """
+    product = models.ForeignKey(Product, related_name='popularity', on_delete=models.CASCADE, verbose_name='Producto')
+    day = models.DateField(verbose_name='Día')
+    quantity = models.IntegerField(default=0, verbose_name='Unidades vendidas')
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['product', 'day'], name='unique_product_popularity_day')]
+        indexes = [models.Index(fields=['day', 'product'])]
+
+    def __str__(self): return f"{self.product.name} - {self.day}: {self.quantity}"
+
+class ProductSalesStats(models.Model):
+    """
+    Estadísticas históricas de ventas completadas de un producto: última
+    venta, unidades, facturación y ganancia bruta acumuladas. Se mantienen junto con los
+    rollups y pueden reconstruirse con rebuild_product_stats.
+    """
+    product = models.OneToOneField(Product, related_name='sales_stats', on_delete=models.CASCADE, primary_key=True, verbose_name='Producto')
+    last_sold_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name='Última venta')
+    units_sold = models.IntegerField(default=0, db_index=True, verbose_name='Unidades vendidas')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Facturación')
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Ganancia bruta')
+
+    def __str__(self): return f"{self.product.name}: {self.units_sold} unidades"
+
+class SalesRollup(models.Model):
+    """
+    Ventas completadas agregadas por día, hora local, método de pago y vendedor.
+    Se mantiene en la misma transacción que crea, cancela o elimina la venta.
+    """
+    day = models.DateField(verbose_name='Día')
+    hour = models.PositiveSmallIntegerField(verbose_name='Hora')
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Método de Pago')
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Vendedor')
+    sales_count = models.IntegerField(default=0, verbose_name='Cantidad de ventas')
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Monto Final')
+
+    class Meta:
+        indexes = [models.Index(fields=['day', 'hour'])]
+
+    def __str__(self): return f"{self.day} {self.hour:02d}h: {self.sales_count} ventas"
+
+class ProductSalesRollup(models.Model):
+    """
+    Líneas de ventas completadas agregadas por día, hora local, método de pago,
+    vendedor, categoría y producto. El costo y la categoría son los del
+    momento de la venta.
+    """
+    day = models.DateField(verbose_name='Día')
+    hour = models.PositiveSmallIntegerField(verbose_name='Hora')
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Método de Pago')
+    seller = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Vendedor')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Categoría')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='Producto')
+    quantity = models.IntegerField(default=0, verbose_name='Unidades')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Ingresos')
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Costo')
+
+    class Meta:
+        indexes = [models.Index(fields=['day', 'product'])]
+
+    def __str__(self): return f"{self.day} {self.hour:02d}h {self.product.name}: {self.quantity}"
+
+class StockMovement(models.Model):
+    """
+    Libro de movimientos de stock, sólo de inserción. Product.stock es el saldo
+    materializado de estos movimientos y puede reconstruirse con reconcile_stock.
+    """
+    KIND_CHOICES = [
+        ('inicial', 'Stock inicial'),
+        ('venta', 'Venta'),
+        ('cancelacion', 'Cancelación'),
+        ('reposicion', 'Reposición'),
+        ('ajuste', 'Ajuste'),
+    ]
+
+    product = models.ForeignKey(Product, related_name='stock_movements', on_delete=models.CASCADE, verbose_name='Producto')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='Tipo')
+    quantity = models.IntegerField(verbose_name='Cantidad', help_text='Positiva para ingresos, negativa para egresos.')
+    sale = models.ForeignKey(Sale, related_name='stock_movements', on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Venta')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Usuario')
+    note = models.CharField(max_length=255, blank=True, default='', verbose_name='Nota')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Fecha')
+
+    class Meta:
+        indexes = [models.Index(fields=['product', 'created_at'])]
+
+    def __str__(self): return f"{self.quantity:+d} {self.product.name} ({self.get_kind_display()})"
+
 class CashCount(models.Model):
     date = models.DateField(unique=True, verbose_name='Fecha')
     expected_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Monto Esperado')
@@ -105,4 +286,67 @@ class CashCount(models.Model):
     difference = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Diferencia')
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, verbose_name='Usuario')
     created_at = models.DateTimeField(auto_now_add=True)
-    def __str__(self): return f"Cierre de caja del {self.date}"
\ No newline at end of file
+    def __str__(self): return f"Cierre de caja del {self.date}"
+
+class ExportJob(models.Model):
+    """
+    Exportación de ventas que se genera en segundo plano (ver
+    api/export_jobs.py). El archivo queda en EXPORT_JOBS_ROOT y se reutiliza
+    para pedidos idénticos mientras no cambie la versión de los datos de
+    ventas (y la del catálogo, en las exportaciones por línea).
+    """
+    STATUS_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('terminado', 'Terminado'),
+        ('error', 'Error'),
+    ]
+    FORMAT_CHOICES = [
+        ('xlsx', 'XLSX'),
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+    ]
+    LEVEL_CHOICES = [
+        ('sales', 'Por venta'),
+        ('lines', 'Por línea de venta'),
+    ]
+
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, verbose_name='Formato')
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES, default='sales', verbose_name='Nivel de detalle')
+    start_date = models.DateField(verbose_name='Desde')
+    end_date = models.DateField(verbose_name='Hasta')
+    data_version = models.BigIntegerField(verbose_name='Versión de los datos de ventas')
+    catalog_version = models.BigIntegerField(
+        null=True, blank=True, verbose_name='Versión del catálogo',
+        help_text='Sólo en exportaciones por línea, que incluyen datos del producto.'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendiente', verbose_name='Estado')
+    rows_processed = models.BigIntegerField(default=0, verbose_name='Filas procesadas')
+    total_rows = models.BigIntegerField(null=True, blank=True, verbose_name='Filas totales')
+    file_name = models.CharField(max_length=255, blank=True, default='', verbose_name='Archivo')
+    error = models.TextField(blank=True, default='', verbose_name='Error')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Usuario')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Creado')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='Iniciado')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Terminado')
+
+    class Meta:
+        indexes = [models.Index(fields=['start_date', 'end_date', 'export_format', 'level', 'data_version'])]
+
+    def __str__(self): return f"Exportación {self.export_format} {self.start_date} a {self.end_date} ({self.status})"
+
+class PriceChange(models.Model):
+    """ Historial de precios: una fila por producto en cada actualización masiva. """
+    product = models.ForeignKey(Product, related_name='price_changes', on_delete=models.CASCADE, verbose_name='Producto')
+    old_cost_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Costo anterior')
+    new_cost_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Costo nuevo')
+    old_sale_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Precio anterior')
+    new_sale_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Precio nuevo')
+    percentage = models.DecimalField(max_digits=7, decimal_places=2, verbose_name='Porcentaje aplicado')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Usuario')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Fecha')
+
+    class Meta:
+        indexes = [models.Index(fields=['product', 'created_at'])]
+
+    def __str__(self): return f"{self.product.name}: {self.old_sale_price} -> {self.new_sale_price} ({self.percentage:+}%)"
@@ -0,0 +1,84 @@
+import hashlib
+
+from django.core.cache import cache
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+MAX_PAGE_SIZE = 500
+
+
+class PageSizePagination(PageNumberPagination):
+    """ Paginación por número de página, con tamaño elegible por el cliente. """
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginación por cursor: cada página filtra por el primer campo de
+    `ordering` a partir del valor de la última fila vista (más un offset
+    chico para los empates de ese valor) en lugar de usar un OFFSET que
+    crece, y no ejecuta COUNT(*). Con un índice que cubra `ordering`, las
+    páginas profundas cuestan lo mismo que la primera.
+
+    Si la petición trae alguno de `page_number_params` (por defecto `page`),
+    se usa la paginación por número de página de siempre, con `count` exacto,
+    para no romper a los clientes existentes.
+    Con `?count=approx` la respuesta incluye `approximate_count`, un conteo
+    cacheado por unos segundos en lugar de recalculado en cada página.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+    approximate_count_timeout = 60
+    page_number_params = ('page',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number_paginator = None
+        if any(param in request.query_params for param in self.page_number_params):
+            self.page_number_paginator = PageSizePagination()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+        self.queryset = queryset
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+        }
+        if self.request.query_params.get('count') == 'approx':
+            payload['approximate_count'] = self.get_approximate_count()
+        payload['results'] = data
+        return Response(payload)
+
+    def get_approximate_count(self):
+        sql = str(self.queryset.order_by().query)
+        key = 'approx-count:' + hashlib.md5(sql.encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.count()
+            cache.set(key, count, self.approximate_count_timeout)
+        return count
+
+
+class SaleKeysetPagination(KeysetPagination):
+    # El cursor de DRF guarda el date_time de la última fila más un offset para
+    # los empates, no el par (date_time, id); el id sólo desempata el orden.
+    # El índice (-date_time, -id) de Sale resuelve el filtro y el orden sin
+    # ordenar la tabla.
+    ordering = ('-date_time', '-id')
+
+
+class ProductKeysetPagination(KeysetPagination):
+    ordering = ('name', 'id')
+    # Los resultados de búsqueda vienen ordenados por relevancia, que no sirve como cursor.
+    page_number_params = ('page', 'search')
+
+
+class CashCountKeysetPagination(KeysetPagination):
+    ordering = ('-date',)
+
+
+class StockMovementKeysetPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
@@ -1,45 +1,61 @@
 from rest_framework import permissions
+from rest_framework_simplejwt.models import TokenUser
 
-def _is_in_group(user, group_name):
+def _group_names(request):
     """
-    Verifica si un usuario pertenece a un grupo específico.
+    Devuelve los grupos del usuario, resueltos una sola vez por petición.
+    Los usuarios de la base hacen una única consulta y el resultado queda
+    guardado en la petición, así un cambio de roles rige en la petición
+    siguiente. Sólo el TokenUser de las acciones sin estado (ver
+    StatelessAuthenticationMixin) usa el claim 'groups' del JWT, que se
+    vuelve a leer de la base cada vez que se renueva el token.
     """
-    if user.is_authenticated:
-        return user.groups.filter(name=group_name).exists()
-    return False
+    user = request.user
+    if not user or not user.is_authenticated:
+        return frozenset()
+    cached = getattr(request, '_api_group_names', None)
+    if cached is None:
+        if isinstance(user, TokenUser):
+            groups = user.token.get('groups', ())
+        else:
+            groups = user.groups.values_list('name', flat=True)
+        cached = request._api_group_names = frozenset(groups)
+    return cached
+
+def _is_in_group(request, *group_names):
+    """
+    Verifica si el usuario de la petición pertenece a alguno de los grupos.
+    """
+    return not _group_names(request).isdisjoint(group_names)
 
 # --- NUEVOS NOMBRES DE CLASES Y GRUPOS ---
 
 class IsSuperAdminUser(permissions.BasePermission):
     """ Permiso para el rol SuperAdmin. """
     def has_permission(self, request, view):
-        return _is_in_group(request.user, 'SuperAdmin')
+        return _is_in_group(request, 'SuperAdmin')
 
 class IsAdminUser(permissions.BasePermission):
     """ Permiso para el rol Admin. """
     def has_permission(self, request, view):
-        return _is_in_group(request.user, 'Admin')
+        return _is_in_group(request, 'Admin')
 
 class IsVendedorUser(permissions.BasePermission):
     """ Permiso para el rol Vendedor. """
     def has_permission(self, request, view):
-        return _is_in_group(request.user, 'Vendedor')
+        return _is_in_group(request, 'Vendedor')
 
 class IsSuperAdminOrAdmin(permissions.BasePermission):
     """ Permiso para SuperAdmin o Admin. """
     def has_permission(self, request, view):
-        return _is_in_group(request.user, 'SuperAdmin') or _is_in_group(request.user, 'Admin')
+        return _is_in_group(request, 'SuperAdmin', 'Admin')
 
 class CanViewPanel(permissions.BasePermission):
     """ Permiso para ver el panel (Todos los roles). """
     def has_permission(self, request, view):
-        return _is_in_group(request.user, 'SuperAdmin') or \
-               _is_in_group(request.user, 'Admin') or \
-               _is_in_group(request.user, 'Vendedor')
+        return _is_in_group(request, 'SuperAdmin', 'Admin', 'Vendedor')
 
 class CanCreateSales(permissions.BasePermission):
     """ Permiso para crear ventas (Todos los roles). """
     def has_permission(self, request, view):
-        return _is_in_group(request.user, 'SuperAdmin') or \
-               _is_in_group(request.user, 'Admin') or \
-               _is_in_group(request.user, 'Vendedor')
\ No newline at end of file
+        return _is_in_group(request, 'SuperAdmin', 'Admin', 'Vendedor')
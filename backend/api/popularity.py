@@ -0,0 +1,74 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Case, F, IntegerField, Q, Sum, When
+from django.utils import timezone
+
+from .exports import batches
+from .models import ProductPopularity
+from .report_cache import report_data_version
+
+WINDOW_DAYS = 90
+RANKING_CACHE_TIMEOUT = 5 * 60
+POPULARITY_CHUNK = 300
+
+
+def record_popularity(entries):
+    """
+    Suma unidades vendidas a los buckets diarios. `entries` es un iterable de
+    (product_id, día, cantidad); la cantidad es negativa al cancelar. Los
+    buckets que faltan se crean con un bulk_create y se incrementan con un
+    UPDATE por tanda de POPULARITY_CHUNK: el filtro es un OR por bucket y
+    SQLite no admite expresiones de más de 1000 niveles.
+    """
+    totals = defaultdict(int)
+    for product_id, day, quantity in entries:
+        totals[(product_id, day)] += quantity
+    totals = {key: quantity for key, quantity in totals.items() if quantity}
+    if not totals:
+        return
+
+    ProductPopularity.objects.bulk_create(
+        [ProductPopularity(product_id=pid, day=day, quantity=0) for pid, day in totals],
+        ignore_conflicts=True,
+    )
+    for chunk in batches(totals.items(), POPULARITY_CHUNK):
+        condition = Q()
+        whens = []
+        for (pid, day), quantity in chunk:
+            condition |= Q(product_id=pid, day=day)
+            whens.append(When(product_id=pid, day=day, then=F('quantity') + quantity))
+        ProductPopularity.objects.filter(condition).update(
+            quantity=Case(*whens, default=F('quantity'), output_field=IntegerField())
+        )
+
+
+def top_product_ids(days=WINDOW_DAYS, category_id=None, limit=10):
+    """
+    Ids de los productos activos más vendidos en los últimos `days` días,
+    ordenados de mayor a menor. El ranking se guarda en la caché unos minutos,
+    así la carga del POS no recalcula la agregación en cada apertura. La clave
+    incluye las versiones de ventas y catálogo: una venta, una cancelación o
+    un producto desactivado generan un ranking nuevo en la próxima consulta.
+    """
+    today = timezone.localdate()
+    key = f'popularity:{report_data_version()}:{today}:{days}:{category_id}:{limit}'
+    ranking = cache.get(key)
+    if ranking is None:
+        buckets = ProductPopularity.objects.filter(
+            day__gt=today - timedelta(days=days), product__estado='activo'
+        )
+        if category_id is not None:
+            buckets = buckets.filter(product__category_id=category_id)
+        ranking = list(
+            buckets.values('product_id').annotate(total=Sum('quantity')).filter(total__gt=0)
+            .order_by('-total', 'product_id').values_list('product_id', flat=True)[:limit]
+        )
+        cache.set(key, ranking, RANKING_CACHE_TIMEOUT)
+    return ranking
+
+
+def prune_popularity(days=WINDOW_DAYS):
+    """ Elimina los buckets que quedaron fuera de la ventana. """
+    return ProductPopularity.objects.filter(day__lte=timezone.localdate() - timedelta(days=days)).delete()[0]
@@ -0,0 +1,76 @@
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import CatalogVersion, SalesDataVersion
+
+REPORT_CACHE_TIMEOUT = 10 * 60
+# Tiempo máximo que una petición espera a que otra termine de calcular el mismo reporte.
+COMPUTE_LOCK_TIMEOUT = 30
+COMPUTE_WAIT_INTERVAL = 0.05
+STATS_KEYS = ('hits', 'misses')
+
+
+def report_data_version():
+    """
+    Versión de los datos que alimentan los reportes: cambia con cada venta
+    creada, cancelada o eliminada y con cada cambio de producto o stock.
+    """
+    return f'{SalesDataVersion.current()}.{CatalogVersion.current()}'
+
+
+def _count(stat):
+    key = f'report-cache-stats:{stat}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # La clave expiró o fue desalojada entre add e incr.
+        cache.set(key, 1, timeout=None)
+
+
+def report_cache_stats():
+    """ Aciertos y fallos acumulados de la caché de reportes. """
+    values = cache.get_many([f'report-cache-stats:{stat}' for stat in STATS_KEYS])
+    return {stat: values.get(f'report-cache-stats:{stat}', 0) for stat in STATS_KEYS}
+
+
+def reset_report_cache_stats():
+    cache.delete_many([f'report-cache-stats:{stat}' for stat in STATS_KEYS])
+
+
+def cached_report(name, compute, version=None):
+    """
+    Devuelve `(datos, hit)` del reporte `name`, cacheado por día local y
+    versión de datos. Ante un fallo, sólo una petición calcula el reporte
+    (con un lock en la misma caché); las demás esperan el resultado en lugar
+    de repetir el cálculo. Funciona con los backends locmem y de archivos,
+    sin servicios externos. `version` evita releer la versión de datos
+    cuando se cachean varios reportes en la misma petición.
+    """
+    key = f'report:{name}:{timezone.localdate()}:{version or report_data_version()}'
+    data = cache.get(key)
+    if data is not None:
+        _count('hits')
+        return data, True
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, COMPUTE_LOCK_TIMEOUT):
+        deadline = time.monotonic() + COMPUTE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(COMPUTE_WAIT_INTERVAL)
+            data = cache.get(key)
+            if data is not None:
+                _count('hits')
+                return data, True
+            if cache.get(lock_key) is None:
+                break
+
+    _count('misses')
+    try:
+        data = compute()
+        cache.set(key, data, REPORT_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    return data, False
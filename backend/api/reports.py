@@ -0,0 +1,136 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import Product, ProductSalesRollup, ProductSalesStats, SalesRollup
+
+LOW_STOCK_LIMIT = 5
+DORMANT_PERIOD_DAYS = 60
+
+
+def low_stock_products():
+    return list(
+        Product.objects.filter(stock__lte=LOW_STOCK_LIMIT, estado='activo')
+        .order_by('stock').values('id', 'name', 'stock')[:10]
+    )
+
+
+def dormant_products(today):
+    """ Productos activos con stock que no se vendieron en los últimos DORMANT_PERIOD_DAYS días. """
+    dormant_since = timezone.make_aware(datetime.combine(today - timedelta(days=DORMANT_PERIOD_DAYS), time.min))
+    return list(
+        Product.objects.filter(stock__gt=0, estado='activo')
+        .filter(Q(sales_stats__isnull=True) | Q(sales_stats__last_sold_at__lt=dormant_since))
+        .values('name', 'sku', 'stock')[:10]
+    )
+
+
+def best_selling_product():
+    """ (nombre, unidades) del producto con más unidades vendidas en la historia, o None. """
+    return (
+        ProductSalesStats.objects.filter(units_sold__gt=0).order_by('-units_sold', 'product_id')
+        .values_list('product__name', 'units_sold').first()
+    )
+
+
+def most_profitable_sold_product():
+    """
+    (nombre, ganancia por unidad) del producto con mayor ganancia realizada
+    por unidad vendida, según los precios cobrados y los costos capturados
+    en cada venta; o None si todavía no hay ventas.
+    """
+    return (
+        ProductSalesStats.objects.filter(units_sold__gt=0)
+        .annotate(margin=ExpressionWrapper(Cast('profit', FloatField()) / F('units_sold'), output_field=FloatField()))
+        .order_by('-margin', 'product_id').values_list('product__name', 'margin').first()
+    )
+
+
+def orm_dashboard_report(today=None):
+    """
+    Dashboard calculado con una consulta agregada del ORM por gráfico sobre los
+    rollups. Es la implementación de referencia del motor columnar
+    (api/analytics.py): los tests y bench_dashboard comparan ambos resultados.
+    Los empates se ordenan por id, igual que en el motor columnar.
+    """
+    today = today or timezone.localdate()
+    last_30_days_start = today - timedelta(days=29)
+    last_12_weeks_start = today - timedelta(weeks=12)
+    profit = F('revenue') - F('cost')
+
+    today_totals = SalesRollup.objects.filter(day=today).aggregate(
+        total=Sum('total_amount'), count=Sum('sales_count')
+    )
+    today_lines = ProductSalesRollup.objects.filter(day=today).aggregate(
+        profit=Sum(profit), quantity=Sum('quantity')
+    )
+    total_sales_today = today_totals['total'] or 0
+    sales_count_today = today_totals['count'] or 0
+
+    kpis = {
+        'ventas_del_dia': total_sales_today,
+        'ganancia_bruta_del_dia': today_lines['profit'] or 0,
+        'ticket_promedio': total_sales_today / sales_count_today if sales_count_today > 0 else 0,
+        'productos_vendidos': today_lines['quantity'] or 0
+    }
+
+    last_30_days = SalesRollup.objects.filter(day__gte=last_30_days_start)
+    sales_by_payment_method = last_30_days.values('payment_method__name').annotate(total=Sum('total_amount')).order_by('-total', 'payment_method_id')
+    daily_sales = last_30_days.values('day').annotate(total_sales=Sum('total_amount')).order_by('day')
+    weekly_sales = SalesRollup.objects.filter(day__gte=last_12_weeks_start).annotate(week=TruncWeek('day')).values('week').annotate(total_sales=Sum('total_amount')).order_by('week')
+    monthly_sales = SalesRollup.objects.filter(day__gte=today - timedelta(days=365)).annotate(month=TruncMonth('day')).values('month').annotate(total_sales=Sum('total_amount')).order_by('month')
+
+    peak_hours_query = last_30_days.values('hour').annotate(total=Sum('total_amount')).order_by('hour')
+    sales_by_hour_dict = {item['hour']: item['total'] for item in peak_hours_query}
+    peak_hours_data = [{'name': f"{h:02d}h", 'Ventas': sales_by_hour_dict.get(h, 0)} for h in range(24)]
+
+    last_30_days_lines = ProductSalesRollup.objects.filter(day__gte=last_30_days_start)
+    sales_by_category_query = last_30_days_lines.values('category__name').annotate(value=Sum('revenue')).order_by('-value', 'category_id')
+    most_sold_products_query = last_30_days_lines.values('product__name').annotate(value=Sum('quantity')).order_by('-value', 'product_id')[:10]
+    most_profitable_products_query = last_30_days_lines.values('product__name').annotate(value=Sum(profit)).order_by('-value', 'product_id')[:10]
+
+    chart_data = {
+        'ventas_por_metodo_pago': [{'name': item['payment_method__name'] or 'No especificado', 'value': item['total']} for item in sales_by_payment_method],
+        'ventas_diarias': [{'name': item['day'].strftime('%d/%m'), 'Ventas': item['total_sales']} for item in daily_sales],
+        'ventas_semanales': [{'name': item['week'].strftime('%d/%m'), 'Ventas': item['total_sales']} for item in weekly_sales],
+        'ventas_mensuales': [{'name': item['month'].strftime('%b %Y'), 'Ventas': item['total_sales']} for item in monthly_sales],
+        'ventas_por_hora': peak_hours_data,
+        'ventas_por_categoria': [{'name': item['category__name'], 'Ventas': item['value']} for item in sales_by_category_query]
+    }
+
+    return {
+        'kpis': kpis,
+        'low_stock_products': low_stock_products(),
+        'charts': chart_data,
+        'rankings': {
+            'mas_vendidos': list(most_sold_products_query),
+            'mas_rentables': list(most_profitable_products_query)
+        },
+        'other_reports': {
+            'productos_dormidos': dormant_products(today)
+        }
+    }
+
+
+def orm_summary_report():
+    """ Resumen histórico de ReportsView con el ORM; referencia de analytics.summary_report. """
+    most_sold=best_selling_product()
+    most_profitable=most_profitable_sold_product()
+    peak_hour=SalesRollup.objects.values('day','hour').annotate(c=Sum('sales_count')).order_by('-c', 'day', 'hour').first()
+
+    return {
+        'most_sold_product': {
+            'name': most_sold[0] if most_sold else 'N/A',
+            'total_sold': most_sold[1] if most_sold else 0
+        },
+        'most_profitable_product': {
+            'name': most_profitable[0] if most_profitable else 'N/A',
+            'profit_margin': round(most_profitable[1], 2) if most_profitable else 0
+        },
+        'peak_hour': {
+            'hour': peak_hour['hour'] if peak_hour else 'N/A',
+            'count': peak_hour['c'] if peak_hour else 0
+        }
+    }
@@ -0,0 +1,157 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, DateTimeField, F, Q, Value, When
+from django.utils import timezone
+
+from .exports import batches
+from .models import ProductSalesRollup, ProductSalesStats, SalesDataVersion, SalesRollup
+
+SALE_KEY = ('day', 'hour', 'payment_method_id', 'seller_id')
+LINE_KEY = SALE_KEY + ('category_id', 'product_id')
+SALE_MEASURES = ('sales_count', 'total_amount')
+LINE_MEASURES = ('quantity', 'revenue', 'cost')
+ROLLUP_CHUNK = 300
+
+
+def _time_key(date_time):
+    local = timezone.localtime(date_time)
+    return local.date(), local.hour
+
+
+def _increment(model, key_fields, measures, totals):
+    """
+    Suma `totals` ({clave: {medida: valor}}) a las filas del rollup en tres
+    consultas como máximo por tanda de ROLLUP_CHUNK claves: lectura de las
+    claves existentes, un UPDATE con CASE para incrementarlas y un
+    bulk_create para las nuevas. La lectura filtra con un OR por clave y
+    SQLite no admite expresiones de más de 1000 niveles.
+
+    No hay restricción de unicidad (las claves admiten NULL), así que dos
+    escrituras concurrentes pueden crear filas gemelas; los reportes siempre
+    suman, por lo que el resultado sigue siendo correcto.
+    """
+    totals = {key: values for key, values in totals.items() if any(values.values())}
+    for chunk in batches(totals.items(), ROLLUP_CHUNK):
+        condition = Q()
+        for key, _ in chunk:
+            condition |= Q(**dict(zip(key_fields, key)))
+        existing = {}
+        for row in model.objects.filter(condition).values('id', *key_fields):
+            existing.setdefault(tuple(row[field] for field in key_fields), row['id'])
+
+        updates = {existing[key]: values for key, values in chunk if key in existing}
+        if updates:
+            model.objects.filter(id__in=updates).update(**{
+                measure: Case(
+                    *[When(id=row_id, then=F(measure) + values[measure]) for row_id, values in updates.items()],
+                    default=F(measure),
+                )
+                for measure in measures
+            })
+        model.objects.bulk_create([
+            model(**dict(zip(key_fields, key)), **values)
+            for key, values in chunk if key not in existing
+        ])
+
+
+def record_sales_rollups(sales, lines, sign=1):
+    """
+    Agrega ventas y líneas a los rollups y a las estadísticas por producto
+    (sign=-1 para descontarlas al cancelar o eliminar) y cambia la versión
+    de los datos de ventas. `sales` son dicts con date_time,
+    payment_method_id, user_id y final_amount; `lines` además llevan
+    category_id, product_id, quantity, unit_price y unit_cost.
+    """
+    sale_totals = defaultdict(lambda: {'sales_count': 0, 'total_amount': Decimal('0')})
+    for sale in sales:
+        key = _time_key(sale['date_time']) + (sale['payment_method_id'], sale['user_id'])
+        sale_totals[key]['sales_count'] += sign
+        sale_totals[key]['total_amount'] += sign * (sale['final_amount'] or 0)
+
+    line_totals = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0'), 'cost': Decimal('0')})
+    for line in lines:
+        key = _time_key(line['date_time']) + (
+            line['payment_method_id'], line['user_id'], line['category_id'], line['product_id']
+        )
+        line_totals[key]['quantity'] += sign * line['quantity']
+        line_totals[key]['revenue'] += sign * line['quantity'] * line['unit_price']
+        line_totals[key]['cost'] += sign * line['quantity'] * line['unit_cost']
+
+    _increment(SalesRollup, SALE_KEY, SALE_MEASURES, sale_totals)
+    _increment(ProductSalesRollup, LINE_KEY, LINE_MEASURES, line_totals)
+    record_product_stats(lines, sign)
+    if sale_totals or line_totals:
+        # Invalida los reportes cacheados (ver api/report_cache.py).
+        SalesDataVersion.bump()
+
+
+def record_product_stats(lines, sign=1):
+    """
+    Actualiza ProductSalesStats con dos consultas: crea las filas que falten
+    y aplica un UPDATE con CASE por producto. Al cancelar (sign=-1) se
+    descuentan unidades, facturación y ganancia, pero last_sold_at no retrocede: la
+    fecha anterior sólo se recupera con rebuild_product_stats.
+    """
+    totals = defaultdict(lambda: {'units': 0, 'revenue': Decimal('0'), 'profit': Decimal('0'), 'last_sold_at': None})
+    for line in lines:
+        stats = totals[line['product_id']]
+        stats['units'] += sign * line['quantity']
+        stats['revenue'] += sign * line['quantity'] * line['unit_price']
+        stats['profit'] += sign * line['quantity'] * (line['unit_price'] - line['unit_cost'])
+        if sign > 0 and (stats['last_sold_at'] is None or line['date_time'] > stats['last_sold_at']):
+            stats['last_sold_at'] = line['date_time']
+    if not totals:
+        return
+
+    ProductSalesStats.objects.bulk_create(
+        [ProductSalesStats(product_id=product_id) for product_id in totals], ignore_conflicts=True
+    )
+    sold = {product_id: stats for product_id, stats in totals.items() if stats['last_sold_at'] is not None}
+    ProductSalesStats.objects.filter(product_id__in=totals).update(
+        units_sold=Case(
+            *[When(product_id=pid, then=F('units_sold') + stats['units']) for pid, stats in totals.items()],
+            default=F('units_sold'),
+        ),
+        revenue=Case(
+            *[When(product_id=pid, then=F('revenue') + stats['revenue']) for pid, stats in totals.items()],
+            default=F('revenue'),
+        ),
+        profit=Case(
+            *[When(product_id=pid, then=F('profit') + stats['profit']) for pid, stats in totals.items()],
+            default=F('profit'),
+        ),
+        last_sold_at=Case(
+            *[
+                When(
+                    Q(product_id=pid) & (Q(last_sold_at__isnull=True) | Q(last_sold_at__lt=stats['last_sold_at'])),
+                    then=Value(stats['last_sold_at']),
+                )
+                for pid, stats in sold.items()
+            ],
+            default=F('last_sold_at'),
+            output_field=DateTimeField(),
+        ),
+    )
+
+
+def sale_rollup_rows(sale, details, products):
+    """ Filas de venta y de líneas para record_sales_rollups a partir de una venta recién creada. """
+    sale_row = {
+        'date_time': sale.date_time,
+        'payment_method_id': sale.payment_method_id,
+        'user_id': sale.user_id,
+        'final_amount': sale.final_amount,
+    }
+    line_rows = [
+        dict(
+            sale_row,
+            category_id=products[detail['product_id']].category_id,
+            product_id=detail['product_id'],
+            quantity=detail['quantity'],
+            unit_price=detail['unit_price'],
+            unit_cost=products[detail['product_id']].cost_price,
+        )
+        for detail in details
+    ]
+    return sale_row, line_rows
@@ -0,0 +1,71 @@
+from django.db import connection
+from django.db.models import Q
+from rest_framework import filters
+
+FTS_TABLE = 'api_product_fts'
+# Pesos de bm25 por columna del índice: name, sku, description.
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+_fts_available = None
+
+
+def product_fts_available():
+    """ True si la base es SQLite y la migración creó el índice FTS5. """
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+def fts_match_expression(terms):
+    """
+    Convierte los términos de búsqueda en una consulta FTS5: cada término se
+    busca como prefijo y todos deben aparecer. Las comillas se escapan, así
+    el texto del usuario nunca se interpreta como sintaxis de FTS5.
+    """
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def fts_search(queryset, terms):
+    """ Filtra y ordena por relevancia un queryset de productos usando el índice FTS5. """
+    weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[fts_match_expression(terms)],
+        select={'search_rank': f'bm25({FTS_TABLE}, {weights})'},
+        order_by=['search_rank', 'name'],
+    )
+
+
+def search_products(queryset, text):
+    """
+    Filtra productos por texto libre igual que la búsqueda del listado, para
+    usarla fuera de una vista: FTS5 si está disponible y, si no, cada término
+    con LIKE sobre nombre, sku o descripción.
+    """
+    terms = [term for term in text.split() if term.strip('"')]
+    if not terms:
+        return queryset
+    if product_fts_available():
+        return fts_search(queryset, terms)
+    for term in terms:
+        queryset = queryset.filter(Q(name__icontains=term) | Q(sku__icontains=term) | Q(description__icontains=term))
+    return queryset
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Búsqueda de productos sobre el índice FTS5, con resultados ordenados por
+    relevancia (bm25) y coincidencia por prefijo. En motores distintos de
+    SQLite, o si el índice no existe, se comporta como SearchFilter (LIKE).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = [term for term in self.get_search_terms(request) if term.strip('"')]
+        if not terms or not product_fts_available():
+            return super().filter_queryset(request, queryset, view)
+        return fts_search(queryset, terms)
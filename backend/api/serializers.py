@@ -1,10 +1,16 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.contrib.auth.models import User, Group
+from django.utils import timezone
 from .models import (
     Product, Category, Provider, Client, Sale, SaleDetail, PaymentMethod,
-    CashCount,
+    CashCount, StockMovement, ExportJob,
 )
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
@@ -14,6 +20,18 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         token['groups'] = list(user.groups.values_list('name', flat=True))
         return token
 
+class GroupsRefreshToken(RefreshToken):
+    """ Al renovar, el token de acceso lleva los grupos actuales del usuario y no los copiados del refresh. """
+    @property
+    def access_token(self):
+        access = super().access_token
+        user_id = self.payload.get(jwt_settings.USER_ID_CLAIM)
+        access['groups'] = list(Group.objects.filter(user__id=user_id).values_list('name', flat=True))
+        return access
+
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = GroupsRefreshToken
+
 class ProviderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Provider
@@ -40,6 +58,13 @@ class CashCountSerializer(serializers.ModelSerializer):
         model = CashCount
         fields = '__all__'
 
+class StockMovementSerializer(serializers.ModelSerializer):
+    user = serializers.StringRelatedField()
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    class Meta:
+        model = StockMovement
+        fields = ['id', 'product', 'kind', 'kind_display', 'quantity', 'sale', 'user', 'note', 'created_at']
+
 class PaymentMethodSerializer(serializers.ModelSerializer):
     class Meta:
         model = PaymentMethod
@@ -57,6 +82,12 @@ class ProductSerializer(serializers.ModelSerializer):
         model = Product
         fields = ['id', 'sku', 'name', 'description', 'cost_price', 'sale_price', 'stock', 'category', 'provider', 'category_name', 'provider_name', 'estado']
 
+class PosProductSerializer(serializers.ModelSerializer):
+    """ Representación mínima de un producto para las terminales del POS. """
+    class Meta:
+        model = Product
+        fields = ['id', 'sku', 'name', 'sale_price', 'stock', 'estado', 'category']
+
 class SaleDetailWriteSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
     class Meta:
@@ -68,7 +99,84 @@ class SaleWriteSerializer(serializers.ModelSerializer):
     payment_method_id = serializers.IntegerField(write_only=True)
     class Meta:
         model = Sale
-        fields = ['total_amount', 'details', 'user', 'client', 'payment_method_id']
+        fields = ['total_amount', 'details', 'user', 'client', 'payment_method_id', 'idempotency_key']
+        # La unicidad de la clave se resuelve en la vista devolviendo la venta existente.
+        extra_kwargs = {'idempotency_key': {'validators': []}}
+
+class SaleSyncItemSerializer(serializers.Serializer):
+    # Margen para el reloj de la terminal y antigüedad máxima de una venta encolada.
+    CLOCK_SKEW = timedelta(minutes=5)
+    MAX_AGE = timedelta(days=7)
+
+    idempotency_key = serializers.CharField(max_length=64)
+    # Hora en que se hizo la venta en la terminal; sin ella se usa la de la sincronización.
+    date_time = serializers.DateTimeField(required=False)
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    payment_method_id = serializers.IntegerField()
+    # Se valida en lote en sync_sales para no consultar un cliente por venta.
+    client = serializers.IntegerField(required=False, allow_null=True)
+    details = SaleDetailWriteSerializer(many=True)
+
+    def validate_date_time(self, value):
+        now = timezone.now()
+        if value > now + self.CLOCK_SKEW:
+            raise serializers.ValidationError("La fecha de la venta no puede ser futura.")
+        if value < now - self.MAX_AGE:
+            raise serializers.ValidationError(
+                f"La venta tiene más de {self.MAX_AGE.days} días; debe registrarse manualmente."
+            )
+        return value
+
+class SaleSyncSerializer(serializers.Serializer):
+    MAX_SALES = 500
+
+    sales = SaleSyncItemSerializer(many=True, allow_empty=False, max_length=MAX_SALES)
+
+class SaleBulkCancelSerializer(serializers.Serializer):
+    MAX_SALES = 500
+
+    sale_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=MAX_SALES)
+
+class BulkPriceUpdateSerializer(serializers.Serializer):
+    """ Selección de productos (por ids, filtros o `all`) y ajuste porcentual a aplicar. """
+    SELECTORS = ('product_ids', 'category', 'provider', 'estado', 'search')
+
+    product_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    category = serializers.IntegerField(required=False)
+    provider = serializers.IntegerField(required=False)
+    estado = serializers.ChoiceField(choices=Product.STATUS_CHOICES, required=False)
+    search = serializers.CharField(required=False)
+    all = serializers.BooleanField(default=False)
+    percentage = serializers.DecimalField(max_digits=7, decimal_places=2, min_value=Decimal('-99.99'))
+    update_target = serializers.ChoiceField(choices=['cost', 'sale', 'both'])
+
+    def validate(self, attrs):
+        if not attrs['all'] and not any(selector in attrs for selector in self.SELECTORS):
+            raise serializers.ValidationError(
+                "Faltan datos requeridos: indicá product_ids, category, provider, estado, search o all."
+            )
+        return attrs
+
+class StockCountItemSerializer(serializers.Serializer):
+    """ Un renglón del conteo: producto por id o sku y cantidad contada (`count`) o diferencia (`delta`). """
+    id = serializers.IntegerField(required=False)
+    sku = serializers.CharField(required=False)
+    count = serializers.IntegerField(required=False, min_value=0)
+    delta = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if ('id' in attrs) == ('sku' in attrs):
+            raise serializers.ValidationError("Indicá el producto por id o por sku.")
+        if ('count' in attrs) == ('delta' in attrs):
+            raise serializers.ValidationError("Indicá la cantidad contada (count) o la diferencia (delta).")
+        return attrs
+
+class StockCountSerializer(serializers.Serializer):
+    MAX_ITEMS = 20_000
+
+    items = StockCountItemSerializer(many=True, allow_empty=False, max_length=MAX_ITEMS)
+    note = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    dry_run = serializers.BooleanField(default=False)
 
 class UserSerializer(serializers.ModelSerializer):
     groups = serializers.PrimaryKeyRelatedField(many=True, queryset=Group.objects.all())
@@ -125,4 +233,34 @@ class SaleReadSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Sale
-        fields = ['id', 'date_time', 'total_amount', 'payment_method', 'final_amount', 'user', 'client', 'details', 'status']
\ No newline at end of file
+        fields = ['id', 'date_time', 'total_amount', 'payment_method', 'final_amount', 'user', 'client', 'details', 'status', 'idempotency_key']
+
+class SaleDetailCompactSerializer(serializers.ModelSerializer):
+    product_id = serializers.IntegerField(source='product.id', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    product_sku = serializers.CharField(source='product.sku', read_only=True, allow_null=True)
+
+    class Meta:
+        model = SaleDetail
+        fields = ['product_id', 'product_name', 'product_sku', 'quantity', 'unit_price']
+
+class SaleCompactReadSerializer(SaleReadSerializer):
+    details = SaleDetailCompactSerializer(many=True, read_only=True)
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    format = serializers.ChoiceField(source='export_format', choices=ExportJob.FORMAT_CHOICES)
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'format', 'level', 'start_date', 'end_date', 'status', 'rows_processed', 'total_rows',
+            'error', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = ['status', 'rows_processed', 'total_rows', 'error', 'created_at', 'started_at', 'finished_at']
+
+    def validate(self, attrs):
+        if attrs['start_date'] > attrs['end_date']:
+            raise serializers.ValidationError("La fecha de inicio no puede ser posterior a la de fin.")
+        if attrs['export_format'] == 'xlsx' and attrs.get('level') == 'lines':
+            raise serializers.ValidationError("El detalle por línea sólo está disponible en CSV y NDJSON.")
+        return attrs
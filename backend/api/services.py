@@ -0,0 +1,503 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, PositiveIntegerField, Prefetch, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import CatalogVersion, Client, PaymentMethod, PriceChange, Product, Sale, SaleDetail, StockMovement
+from .popularity import record_popularity
+from .exports import batches
+from .rollups import record_sales_rollups, sale_rollup_rows
+from .search import search_products
+
+PRICE_UPDATE_CHUNK = 500
+STOCK_COUNT_CHUNK = 500
+PRICE_FIELDS = {'cost': ('cost_price',), 'sale': ('sale_price',), 'both': ('cost_price', 'sale_price')}
+
+
+def sale_read_queryset(compact=False):
+    """
+    Queryset de ventas con todas las relaciones que usa SaleReadSerializer
+    cargadas en un número fijo de consultas. Con `compact` sólo se traen los
+    campos del producto que usa SaleCompactReadSerializer.
+    """
+    if compact:
+        details = SaleDetail.objects.select_related('product').only(
+            'id', 'sale_id', 'quantity', 'unit_price', 'product__id', 'product__name', 'product__sku'
+        )
+    else:
+        details = SaleDetail.objects.select_related('product__category', 'product__provider')
+    return Sale.objects.select_related('user', 'client', 'payment_method').prefetch_related(
+        Prefetch('details', queryset=details)
+    )
+
+
+def _quantities_by_product(details):
+    # Un mismo producto puede venir en varias líneas; el stock se valida por el total.
+    quantities = defaultdict(int)
+    for detail in details:
+        quantities[detail['product_id']] += detail['quantity']
+    return quantities
+
+
+def _lines_error(quantities, products, available):
+    """
+    Devuelve el motivo por el que las líneas no se pueden vender, o None.
+    `available` es el stock disponible por producto, que puede diferir de
+    `product.stock` cuando se procesan varias ventas en lote.
+    """
+    missing = [pid for pid in quantities if pid not in products]
+    if missing:
+        return f"Producto(s) no encontrado(s): {', '.join(map(str, missing))}"
+    for pid, quantity in quantities.items():
+        product = products[pid]
+        if product.estado != 'activo':
+            return f"El producto '{product.name}' no está activo y no se puede vender."
+        if available[pid] < quantity:
+            return f"No hay stock para {product.name}"
+    return None
+
+
+def _apply_stock_deltas(deltas):
+    """
+    Aplica los deltas de stock de todos los productos con un único UPDATE
+    condicional: sólo se actualizan las filas cuyo saldo no queda negativo,
+    así un egreso concurrente no puede dejar el stock por debajo de cero.
+    """
+    # Los productos con el mismo delta comparten una rama del CASE: en una
+    # venta o un conteo se repiten pocos valores y la expresión no crece con
+    # la cantidad de productos.
+    by_delta = defaultdict(list)
+    for pid, delta in deltas.items():
+        by_delta[delta].append(pid)
+    condition = Q()
+    whens = []
+    for delta, pids in by_delta.items():
+        condition |= Q(id__in=pids, stock__gte=-delta) if delta < 0 else Q(id__in=pids)
+        whens.append(When(id__in=pids, then=F('stock') + delta))
+    updated = Product.objects.filter(condition).update(
+        stock=Case(*whens, default=F('stock'), output_field=PositiveIntegerField()),
+        catalog_version=CatalogVersion.bump(),
+    )
+    if updated != len(deltas):
+        raise serializers.ValidationError("El stock cambió mientras se procesaba la operación. Intente nuevamente.")
+
+
+def record_stock_movements(movements):
+    """
+    Agrega los movimientos al libro y actualiza el saldo materializado
+    Product.stock en un número constante de consultas. Debe ejecutarse
+    dentro de una transacción.
+    """
+    deltas = defaultdict(int)
+    for movement in movements:
+        deltas[movement.product_id] += movement.quantity
+    deltas = {pid: delta for pid, delta in deltas.items() if delta}
+    if deltas:
+        _apply_stock_deltas(deltas)
+    return StockMovement.objects.bulk_create(movements)
+
+
+def _sale_movements(sale, quantities):
+    return [
+        StockMovement(
+            product_id=pid, kind='venta', quantity=-quantity, sale=sale, user=sale.user, created_at=sale.date_time
+        )
+        for pid, quantity in quantities.items()
+    ]
+
+
+def _sale_popularity(sale, quantities, sign=1):
+    day = timezone.localdate(sale.date_time)
+    return [(pid, day, sign * quantity) for pid, quantity in quantities.items()]
+
+
+def revert_sales(sale_ids, user=None, note=''):
+    """
+    Deshace los efectos de varias ventas canceladas o eliminadas: devuelve
+    las unidades al stock y las descuenta del ranking de popularidad y de los
+    rollups del dashboard. Se agrega un movimiento por venta y producto, pero
+    el saldo se actualiza con un único UPDATE agrupado por producto, sin
+    importar cuántas líneas o ventas haya.
+    """
+    lines = list(SaleDetail.objects.filter(sale_id__in=sale_ids).values(
+        # La categoría es la de la venta, no la actual del producto: así se descuenta de la misma fila del rollup.
+        'sale_id', 'product_id', 'category_id', 'quantity', 'unit_price',
+        date_time=F('sale__date_time'), payment_method_id=F('sale__payment_method_id'),
+        user_id=F('sale__user_id'),
+        # Líneas anteriores al backfill de costos: se usa el costo actual del producto.
+        snapshot_cost=Coalesce('unit_cost', 'product__cost_price'),
+    ))
+    returned = defaultdict(int)
+    for line in lines:
+        line['unit_cost'] = line.pop('snapshot_cost')
+        returned[(line['sale_id'], line['product_id'])] += line['quantity']
+    record_stock_movements([
+        StockMovement(
+            product_id=product_id, kind='cancelacion', quantity=quantity,
+            sale_id=sale_id, user=user, note=note
+        )
+        for (sale_id, product_id), quantity in returned.items()
+    ])
+    record_popularity(
+        (line['product_id'], timezone.localdate(line['date_time']), -line['quantity'])
+        for line in lines
+    )
+    record_sales_rollups(
+        Sale.objects.filter(id__in=sale_ids).values('date_time', 'payment_method_id', 'user_id', 'final_amount'),
+        lines,
+        sign=-1,
+    )
+
+
+def cancel_sales(sale_ids, user=None):
+    """
+    Cancela varias ventas y restaura su stock en un número constante de
+    consultas. Devuelve los ids cancelados, los que ya estaban cancelados y
+    los que no existen. Debe ejecutarse dentro de una transacción.
+    """
+    sale_ids = list(dict.fromkeys(sale_ids))
+    statuses = dict(Sale.objects.filter(id__in=sale_ids).values_list('id', 'status'))
+    cancelled = [sid for sid in sale_ids if statuses.get(sid) == 'Completada']
+    already_cancelled = [sid for sid in sale_ids if statuses.get(sid) == 'Cancelada']
+    not_found = [sid for sid in sale_ids if sid not in statuses]
+
+    if cancelled:
+        # El filtro por estado evita restaurar dos veces si otra petición canceló en paralelo.
+        updated = Sale.objects.filter(id__in=cancelled, status='Completada').update(status='Cancelada')
+        if updated != len(cancelled):
+            raise serializers.ValidationError("Otra operación modificó estas ventas. Intente nuevamente.")
+        revert_sales(cancelled, user=user)
+    return cancelled, already_cancelled, not_found
+
+
+def stock_as_of(product, moment):
+    """ Saldo de stock de un producto en una fecha y hora dadas, según el libro. """
+    return product.stock_movements.filter(created_at__lte=moment).aggregate(
+        balance=Sum('quantity')
+    )['balance'] or 0
+
+
+def _build_details(sale, details, products):
+    built = [
+        SaleDetail(
+            sale=sale,
+            product=products[detail['product_id']],
+            category_id=products[detail['product_id']].category_id,
+            quantity=detail['quantity'],
+            unit_price=detail['unit_price'],
+        )
+        for detail in details
+    ]
+    # bulk_create no llama a save(): el costo se captura acá, con los productos ya cargados.
+    for detail in built:
+        detail.calculate_profit()
+    return built
+
+
+def checkout_sale(*, user, payment_method, details, **sale_fields):
+    """
+    Registra una venta completa con un número constante de consultas,
+    sin importar cuántas líneas tenga el carrito.
+
+    Debe ejecutarse dentro de una transacción: si alguna línea falla la
+    validación o el descuento de stock, se lanza ValidationError y la
+    transacción se revierte completa.
+    """
+    if not details:
+        raise serializers.ValidationError("La venta debe tener al menos un producto.")
+
+    quantities = _quantities_by_product(details)
+    products = Product.objects.in_bulk(list(quantities))
+    error = _lines_error(quantities, products, {pid: p.stock for pid, p in products.items()})
+    if error:
+        raise serializers.ValidationError(error)
+
+    sale = Sale(user=user, payment_method=payment_method, **sale_fields)
+    sale.save()
+    record_stock_movements(_sale_movements(sale, quantities))
+    record_popularity(_sale_popularity(sale, quantities))
+    sale_row, line_rows = sale_rollup_rows(sale, details, products)
+    record_sales_rollups([sale_row], line_rows)
+    SaleDetail.objects.bulk_create(_build_details(sale, details, products))
+    return sale
+
+
+def _sync_result(data, result, sale_id=None, reason=None):
+    return {
+        'idempotency_key': data['idempotency_key'],
+        'status': result,
+        'sale_id': sale_id,
+        'reason': reason,
+    }
+
+
+def sync_sales(*, user, sales):
+    """
+    Aplica un lote de ventas encoladas por una terminal offline.
+
+    Las claves ya registradas se informan como 'duplicate', las ventas que no
+    pasan la validación como 'rejected' y el resto se inserta en una sola
+    transacción con bulk_create, con la fecha y hora de la terminal si la
+    informó (la venta, su movimiento de stock y los rollups quedan en el día
+    en que se hizo). Si el stock cambió entre la validación y la
+    escritura, se reintenta venta por venta para rechazar sólo las afectadas.
+    Devuelve un resultado por venta, en el mismo orden recibido.
+    """
+    results = [None] * len(sales)
+    existing = dict(
+        Sale.objects.filter(idempotency_key__in=[s['idempotency_key'] for s in sales])
+        .values_list('idempotency_key', 'id')
+    )
+    payment_methods = PaymentMethod.objects.in_bulk({s['payment_method_id'] for s in sales})
+    client_ids = set(Client.objects.filter(
+        id__in={s['client'] for s in sales if s.get('client')}
+    ).values_list('id', flat=True))
+    products = Product.objects.in_bulk({d['product_id'] for s in sales for d in s['details']})
+    available = {pid: p.stock for pid, p in products.items()}
+
+    accepted = []
+    first_by_key = {}
+    for index, data in enumerate(sales):
+        key = data['idempotency_key']
+        if key in existing:
+            results[index] = _sync_result(data, 'duplicate', sale_id=existing[key])
+            continue
+        if key in first_by_key:
+            # Repetida dentro del mismo lote: se resuelve al id de la primera.
+            results[index] = _sync_result(data, 'duplicate')
+            continue
+        first_by_key[key] = index
+
+        quantities = _quantities_by_product(data['details'])
+        payment_method = payment_methods.get(data['payment_method_id'])
+        if payment_method is None:
+            error = "Método de pago no encontrado."
+        elif data.get('client') and data['client'] not in client_ids:
+            error = "Cliente no encontrado."
+        elif not data['details']:
+            error = "La venta debe tener al menos un producto."
+        else:
+            error = _lines_error(quantities, products, available)
+        if error:
+            results[index] = _sync_result(data, 'rejected', reason=error)
+            continue
+
+        for pid, quantity in quantities.items():
+            available[pid] -= quantity
+        accepted.append((index, data, payment_method, quantities))
+
+    if accepted:
+        try:
+            with transaction.atomic():
+                _bulk_write_sales(user, accepted, products, results)
+        except (serializers.ValidationError, IntegrityError):
+            for item in accepted:
+                _write_sale_individually(user, item, results)
+
+    for index, data in enumerate(sales):
+        if results[index]['status'] == 'duplicate' and results[index]['sale_id'] is None:
+            first = results[first_by_key[data['idempotency_key']]]
+            if first['status'] == 'rejected':
+                # La primera no se registró: la repetida corre la misma suerte.
+                results[index] = _sync_result(data, 'rejected', reason=first['reason'])
+            else:
+                results[index]['sale_id'] = first['sale_id']
+    return results
+
+
+def _sync_date_time(data):
+    return {'date_time': data['date_time']} if data.get('date_time') else {}
+
+
+def _bulk_write_sales(user, accepted, products, results):
+    new_sales = []
+    for _, data, payment_method, _ in accepted:
+        sale = Sale(
+            user=user,
+            client_id=data.get('client'),
+            payment_method=payment_method,
+            total_amount=data['total_amount'],
+            idempotency_key=data['idempotency_key'],
+            **_sync_date_time(data),
+        )
+        sale.calculate_final_amount()
+        new_sales.append(sale)
+    Sale.objects.bulk_create(new_sales)
+
+    record_stock_movements([
+        movement
+        for sale, (_, _, _, quantities) in zip(new_sales, accepted)
+        for movement in _sale_movements(sale, quantities)
+    ])
+    record_popularity(
+        entry
+        for sale, (_, _, _, quantities) in zip(new_sales, accepted)
+        for entry in _sale_popularity(sale, quantities)
+    )
+    sale_rows, line_rows = [], []
+    for sale, (_, data, _, _) in zip(new_sales, accepted):
+        sale_row, sale_lines = sale_rollup_rows(sale, data['details'], products)
+        sale_rows.append(sale_row)
+        line_rows.extend(sale_lines)
+    record_sales_rollups(sale_rows, line_rows)
+
+    SaleDetail.objects.bulk_create([
+        detail
+        for sale, (_, data, _, _) in zip(new_sales, accepted)
+        for detail in _build_details(sale, data['details'], products)
+    ])
+    for sale, (index, data, _, _) in zip(new_sales, accepted):
+        results[index] = _sync_result(data, 'created', sale_id=sale.id)
+
+
+def _write_sale_individually(user, item, results):
+    index, data, payment_method, _ = item
+    try:
+        with transaction.atomic():
+            sale = checkout_sale(
+                user=user,
+                payment_method=payment_method,
+                details=data['details'],
+                client_id=data.get('client'),
+                total_amount=data['total_amount'],
+                idempotency_key=data['idempotency_key'],
+                **_sync_date_time(data),
+            )
+        results[index] = _sync_result(data, 'created', sale_id=sale.id)
+    except serializers.ValidationError as e:
+        results[index] = _sync_result(data, 'rejected', reason=' '.join(map(str, e.detail)))
+    except IntegrityError:
+        # Otra petición registró la misma clave mientras procesábamos el lote.
+        sale_id = Sale.objects.filter(idempotency_key=data['idempotency_key']).values_list('id', flat=True).first()
+        results[index] = _sync_result(data, 'duplicate', sale_id=sale_id)
+
+
+def select_products(product_ids=None, category=None, provider=None, estado=None, search=None):
+    """
+    Ids (ordenados) de los productos que cumplen todos los criterios dados:
+    lista de ids, categoría, proveedor, estado y texto de búsqueda. Sin
+    criterios devuelve todo el catálogo.
+    """
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(id__in=product_ids)
+    if category is not None:
+        products = products.filter(category_id=category)
+    if provider is not None:
+        products = products.filter(provider_id=provider)
+    if estado is not None:
+        products = products.filter(estado=estado)
+    if search:
+        products = search_products(products, search)
+    return list(products.order_by('id').values_list('id', flat=True))
+
+
+def bulk_update_prices(product_ids, percentage, target, user=None, chunk_size=PRICE_UPDATE_CHUNK):
+    """
+    Aplica `percentage` al costo, al precio de venta o a ambos (`target`)
+    de los productos dados, con un UPDATE por tanda de `chunk_size`
+    productos: el redondeo a centavos lo hace la base y no se instancian
+    modelos. Cada tanda agrega al historial una fila de PriceChange por
+    producto con los precios anteriores y nuevos. Todo ocurre en una
+    transacción con una sola versión de catálogo. Devuelve la cantidad de
+    productos actualizados.
+    """
+    multiplier = Value(1 + percentage / 100, output_field=DecimalField(max_digits=12, decimal_places=6))
+    prices = {field: Round(F(field) * multiplier, 2) for field in PRICE_FIELDS[target]}
+    updated = 0
+    with transaction.atomic():
+        version = CatalogVersion.bump()
+        for start in range(0, len(product_ids), chunk_size):
+            chunk = Product.objects.filter(id__in=product_ids[start:start + chunk_size])
+            before = {pid: (cost, sale) for pid, cost, sale in chunk.values_list('id', 'cost_price', 'sale_price')}
+            updated += chunk.update(**prices, catalog_version=version)
+            PriceChange.objects.bulk_create([
+                PriceChange(
+                    product_id=pid, old_cost_price=before[pid][0], new_cost_price=cost,
+                    old_sale_price=before[pid][1], new_sale_price=sale, percentage=percentage, user=user,
+                )
+                for pid, cost, sale in chunk.values_list('id', 'cost_price', 'sale_price')
+            ])
+    return updated
+
+
+def apply_stock_count(items, user=None, note='', dry_run=False, chunk_size=STOCK_COUNT_CHUNK):
+    """
+    Aplica un conteo de inventario: cada renglón indica el producto (id o
+    sku) y la cantidad contada o una diferencia. Los renglones repetidos de
+    un mismo producto se suman (el mismo artículo contado en dos góndolas).
+
+    Los saldos se leen bloqueados y de a `chunk_size` productos; las
+    diferencias se registran como movimientos de ajuste con
+    record_stock_movements, también por tandas, todo en una transacción.
+    En la misma pasada se arma el informe de diferencias: esperado contra
+    contado, por producto y valorizado al costo. Con `dry_run` sólo se
+    devuelve el informe.
+    """
+    with transaction.atomic():
+        products = {}
+        for field in ('id', 'sku'):
+            keys = list(dict.fromkeys(item[field] for item in items if field in item))
+            for chunk in batches(keys, chunk_size):
+                for row in Product.objects.select_for_update().filter(**{f'{field}__in': chunk}).values(
+                    'id', 'sku', 'name', 'stock', 'cost_price',
+                ):
+                    products[(field, row[field])] = row
+
+        counted, not_found, errors = {}, [], []
+        for index, item in enumerate(items):
+            key = ('id', item['id']) if 'id' in item else ('sku', item['sku'])
+            product = products.get(key)
+            if product is None:
+                not_found.append(key[1])
+                continue
+            kind, quantity = ('count', item['count']) if 'count' in item else ('delta', item['delta'])
+            entry = counted.setdefault(product['id'], {'product': product, 'kind': kind, 'quantity': 0})
+            if entry['kind'] != kind:
+                errors.append({'item': index, 'error': "El producto ya tiene renglones con el otro tipo de cantidad."})
+                continue
+            entry['quantity'] += quantity
+
+        report = {
+            'applied': not dry_run, 'products': 0, 'adjusted': 0,
+            'units_over': 0, 'units_short': 0, 'value_over': Decimal('0.00'), 'value_short': Decimal('0.00'),
+        }
+        lines, movements = [], []
+        for entry in counted.values():
+            product = entry['product']
+            expected = product['stock']
+            count = entry['quantity'] if entry['kind'] == 'count' else expected + entry['quantity']
+            if count < 0:
+                errors.append({'product': product['sku'] or product['id'], 'error': "El stock resultante no puede ser negativo."})
+                continue
+            report['products'] += 1
+            variance = count - expected
+            if not variance:
+                continue
+            value = variance * product['cost_price']
+            side = 'over' if variance > 0 else 'short'
+            report[f'units_{side}'] += abs(variance)
+            report[f'value_{side}'] += abs(value)
+            lines.append({
+                'id': product['id'], 'sku': product['sku'], 'name': product['name'],
+                'expected': expected, 'counted': count, 'variance': variance,
+                'cost_price': product['cost_price'], 'variance_value': value,
+            })
+            movements.append(StockMovement(
+                product_id=product['id'], kind='ajuste', quantity=variance, user=user, note=note or 'Conteo de inventario',
+            ))
+
+        if not dry_run:
+            for chunk in batches(movements, chunk_size):
+                record_stock_movements(chunk)
+
+    report['adjusted'] = len(lines)
+    report['net_value'] = report['value_over'] - report['value_short']
+    report['lines'] = sorted(lines, key=lambda line: abs(line['variance_value']), reverse=True)
+    report['not_found'] = not_found
+    report['errors'] = errors
+    return report
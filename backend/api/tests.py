@@ -1,3 +1,1659 @@
-from django.test import TestCase
+import csv
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+from io import BytesIO, StringIO
+import json
+from pathlib import Path
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Max, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+import pyarrow as pa
+import pyarrow.parquet as pq
+from rest_framework.test import APIClient
+
+from .models import (
+    Category, CatalogVersion, Client, ExportJob, PaymentMethod, PriceChange, Product, ProductPopularity, ProductSalesRollup, ProductSalesStats, Provider, Sale,
+    SaleDetail, SalesRollup, StockMovement,
+)
+from .analytics import DashboardAnalytics, summary_report
+from .columnar import day_fingerprints, export_sales_history
+from .dashboard import SECTIONS, _compute_section, dashboard_sections
+from .export_jobs import request_export, run_export_job
+from .exports import EXPORT_LEVELS, SALE_LINE_FIELDS, local_day_range, sales_export_rows
+from .imports import import_products, read_rows
+from .popularity import record_popularity
+from .report_cache import cached_report, report_data_version
+from .reports import dormant_products, orm_dashboard_report, orm_summary_report
+from .serializers import SaleCompactReadSerializer, SaleReadSerializer
+from .services import bulk_update_prices, checkout_sale, sale_read_queryset, select_products
+
+
+class ApiTestCase(TestCase):
+    """ Datos base compartidos por los tests de la API. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cajero', password='password123')
+        cls.user.groups.add(Group.objects.create(name='Admin'))
+        cls.payment_method = PaymentMethod.objects.create(name='Efectivo', adjustment_percentage=Decimal('0.00'))
+        cls.category = Category.objects.create(name='Bebidas')
+        cls.provider = Provider.objects.create(name='Proveedor', contact_person='Juan', phone_number='123')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_products(self, count, stock=10, prefix='Producto'):
+        products = Product.objects.bulk_create([
+            Product(
+                sku=f'{prefix}-{i}', name=f'{prefix} {i}',
+                cost_price=Decimal('50.00'), sale_price=Decimal('100.00'),
+                stock=stock, category=self.category, provider=self.provider,
+            )
+            for i in range(count)
+        ])
+        StockMovement.objects.bulk_create([
+            StockMovement(product=p, kind='inicial', quantity=stock) for p in products
+        ])
+        return products
+
+    def create_sale(self, products, quantity=1):
+        """ Crea una venta por la API (checkout completo) y devuelve su id. """
+        return self.client.post('/api/sales/', self.sale_payload(products, quantity=quantity), format='json').data['id']
+
+    def make_sales(self, count, lines=0):
+        """
+        Crea `count` ventas con bulk_create, sin pasar por el checkout: cada
+        una con cliente, vendedor y `lines` líneas de productos distintos.
+        """
+        products = self.make_products(count * lines, prefix=f'Listado{count}')
+        clients = Client.objects.bulk_create([Client(name=f'Cliente {count}-{i}') for i in range(count)])
+        total = Decimal('100.00') * lines
+        sales = Sale.objects.bulk_create([
+            Sale(user=self.user, client=clients[i], payment_method=self.payment_method,
+                 total_amount=total, final_amount=total)
+            for i in range(count)
+        ])
+        SaleDetail.objects.bulk_create([
+            SaleDetail(sale=sale, product=products[i * lines + j], quantity=1, unit_price=Decimal('100.00'))
+            for i, sale in enumerate(sales) for j in range(lines)
+        ])
+        return sales
+
+    def query_plan(self, sql):
+        """ Plan de SQLite (EXPLAIN QUERY PLAN) de una consulta capturada, en una sola línea. """
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return ' '.join(row[-1] for row in cursor.fetchall())
+
+    def sale_payload(self, products, quantity=1):
+        return {
+            'total_amount': str(Decimal('100.00') * quantity * len(products)),
+            'payment_method_id': self.payment_method.id,
+            'details': [
+                {'product_id': p.id, 'quantity': quantity, 'unit_price': '100.00'}
+                for p in products
+            ],
+        }
+
+
+class SaleCheckoutTests(ApiTestCase):
+
+    def test_create_sale_decrements_stock_and_writes_details(self):
+        products = self.make_products(3, stock=5)
+        response = self.client.post('/api/sales/', self.sale_payload(products, quantity=2), format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['details']), 3)
+        self.assertEqual(SaleDetail.objects.filter(sale_id=response.data['id']).count(), 3)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {3})
+
+    def test_insufficient_stock_rolls_back_whole_sale(self):
+        products = self.make_products(2, stock=1)
+        response = self.client.post('/api/sales/', self.sale_payload(products, quantity=2), format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {1})
+
+    def test_repeated_product_lines_are_checked_against_total_quantity(self):
+        product = self.make_products(1, stock=3)[0]
+        response = self.client.post('/api/sales/', self.sale_payload([product, product], quantity=2), format='json')
+
+        self.assertEqual(response.status_code, 400)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 3)
+
+    def test_inactive_product_is_rejected(self):
+        product = self.make_products(1)[0]
+        Product.objects.filter(pk=product.pk).update(estado='inactivo')
+        response = self.client.post('/api/sales/', self.sale_payload([product]), format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_query_count_does_not_depend_on_basket_size(self):
+        small = self.make_products(1, prefix='Chico')
+        large = self.make_products(40, prefix='Grande')
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            self.assertEqual(self.client.post('/api/sales/', self.sale_payload(small), format='json').status_code, 201)
+        with CaptureQueriesContext(connection) as large_ctx:
+            self.assertEqual(self.client.post('/api/sales/', self.sale_payload(large), format='json').status_code, 201)
+
+        self.assertEqual(len(small_ctx), len(large_ctx))
+
+
+class SaleSyncTests(ApiTestCase):
+
+    def sync_item(self, key, products, quantity=1):
+        return dict(self.sale_payload(products, quantity=quantity), idempotency_key=key)
+
+    def test_batch_creates_sales_and_reports_each_result(self):
+        products = self.make_products(2, stock=3)
+        payload = {'sales': [
+            self.sync_item('t1-1', products),
+            self.sync_item('t1-2', products, quantity=2),
+            self.sync_item('t1-3', products),  # ya no queda stock
+            self.sync_item('t1-1', products),  # repetida dentro del lote
+        ]}
+        response = self.client.post('/api/sales/sync/', payload, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        statuses = [r['status'] for r in response.data['results']]
+        self.assertEqual(statuses, ['created', 'created', 'rejected', 'duplicate'])
+        self.assertEqual(response.data['results'][3]['sale_id'], response.data['results'][0]['sale_id'])
+        self.assertEqual(response.data['summary'], {'created': 2, 'duplicate': 1, 'rejected': 1})
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(SaleDetail.objects.count(), 4)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {0})
+
+    def test_replaying_a_batch_does_not_duplicate_sales(self):
+        products = self.make_products(1, stock=10)
+        payload = {'sales': [self.sync_item(f'k{i}', products) for i in range(5)]}
+        self.client.post('/api/sales/sync/', payload, format='json')
+        response = self.client.post('/api/sales/sync/', payload, format='json')
+
+        self.assertEqual(response.data['summary'], {'created': 0, 'duplicate': 5, 'rejected': 0})
+        self.assertEqual(Sale.objects.count(), 5)
+        products[0].refresh_from_db()
+        self.assertEqual(products[0].stock, 5)
+
+    def test_queued_sales_keep_the_terminal_date_time(self):
+        products = self.make_products(1, stock=10)
+        sold_at = timezone.now() - timedelta(days=1)
+        payload = {'sales': [dict(self.sync_item('ayer', products), date_time=sold_at.isoformat())]}
+
+        response = self.client.post('/api/sales/sync/', payload, format='json')
+
+        sale = Sale.objects.get(pk=response.data['results'][0]['sale_id'])
+        yesterday = timezone.localdate(sold_at)
+        self.assertEqual(sale.date_time, sold_at)
+        self.assertEqual(list(sale.stock_movements.values_list('created_at', flat=True)), [sold_at])
+        self.assertEqual(list(SalesRollup.objects.values_list('day', 'hour')), [(yesterday, timezone.localtime(sold_at).hour)])
+        self.assertEqual(list(ProductPopularity.objects.values_list('day', flat=True)), [yesterday])
+
+    def test_rejects_future_or_stale_terminal_date_time(self):
+        products = self.make_products(1, stock=10)
+        for sold_at in (timezone.now() + timedelta(hours=1), timezone.now() - timedelta(days=30)):
+            payload = {'sales': [dict(self.sync_item('reloj', products), date_time=sold_at.isoformat())]}
+            self.assertEqual(self.client.post('/api/sales/sync/', payload, format='json').status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_repeat_of_a_rejected_sale_is_rejected(self):
+        products = self.make_products(1, stock=1)
+        payload = {'sales': [self.sync_item('grande', products, quantity=5), self.sync_item('grande', products)]}
+
+        results = self.client.post('/api/sales/sync/', payload, format='json').data['results']
+
+        self.assertEqual([(r['status'], r['sale_id']) for r in results], [('rejected', None), ('rejected', None)])
+        self.assertEqual(results[1]['reason'], results[0]['reason'])
+        self.assertFalse(Sale.objects.exists())
+
+    def test_sync_query_count_does_not_depend_on_batch_size(self):
+        small = self.make_products(1, stock=100, prefix='Chico')
+        large = self.make_products(1, stock=100, prefix='Grande')
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            self.client.post('/api/sales/sync/', {'sales': [self.sync_item('a', small)]}, format='json')
+        with CaptureQueriesContext(connection) as large_ctx:
+            response = self.client.post(
+                '/api/sales/sync/', {'sales': [self.sync_item(f'b{i}', large) for i in range(50)]}, format='json'
+            )
+
+        self.assertEqual(response.data['summary']['created'], 50)
+        self.assertEqual(len(small_ctx), len(large_ctx))
+
+    def test_create_with_known_idempotency_key_returns_original_sale(self):
+        products = self.make_products(1, stock=5)
+        payload = self.sync_item('unica', products)
+        first = self.client.post('/api/sales/', payload, format='json')
+        second = self.client.post('/api/sales/', payload, format='json')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['id'], first.data['id'])
+        products[0].refresh_from_db()
+        self.assertEqual(products[0].stock, 4)
+
+
+class StockLedgerTests(ApiTestCase):
+
+    def ledger_balance(self, product):
+        return sum(product.stock_movements.values_list('quantity', flat=True))
+
+    def test_sale_cancel_and_restock_append_movements(self):
+        product = self.make_products(1, stock=10)[0]
+        sale_id = self.client.post('/api/sales/', self.sale_payload([product], quantity=3), format='json').data['id']
+        self.client.patch(f'/api/sales/{sale_id}/cancel/')
+        self.client.patch(f'/api/products/{product.id}/update-stock/', {'stock': 5}, format='json')
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 15)
+        self.assertEqual(
+            list(product.stock_movements.order_by('id').values_list('kind', 'quantity')),
+            [('inicial', 10), ('venta', -3), ('cancelacion', 3), ('reposicion', 5)],
+        )
+        self.assertEqual(self.ledger_balance(product), product.stock)
+
+    def test_update_stock_cannot_go_negative(self):
+        product = self.make_products(1, stock=2)[0]
+        response = self.client.patch(f'/api/products/{product.id}/update-stock/', {'stock': -5}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 2)
+        self.assertEqual(product.stock_movements.count(), 1)
+
+    def test_deactivating_on_delete_keeps_current_stock(self):
+        product = self.make_products(1, stock=10)[0]
+        stale = Product.objects.get(pk=product.pk)
+        self.client.post('/api/sales/', self.sale_payload([product], quantity=3), format='json')
+
+        # Producto cargado antes de la venta, como si la venta se confirmara durante el borrado.
+        with mock.patch('api.views.ProductViewSet.get_object', return_value=stale):
+            response = self.client.delete(f'/api/products/{product.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        product.refresh_from_db()
+        self.assertEqual((product.estado, product.stock), ('inactivo', 7))
+        self.assertEqual(self.ledger_balance(product), product.stock)
+
+    def test_product_edit_applies_stock_change_against_current_balance(self):
+        product = self.make_products(1, stock=10)[0]
+        stale = Product.objects.get(pk=product.pk)
+        self.client.post('/api/sales/', self.sale_payload([product], quantity=3), format='json')
+        payload = {
+            'sku': product.sku, 'name': 'Renombrado', 'cost_price': '50.00', 'sale_price': '100.00',
+            'stock': 12, 'category': self.category.id, 'estado': 'activo',
+        }
+
+        # Producto cargado antes de la venta, como si la venta se confirmara durante la edición.
+        with mock.patch('api.views.ProductViewSet.get_object', return_value=stale):
+            response = self.client.put(f'/api/products/{product.id}/', payload, format='json')
+
+        self.assertEqual((response.status_code, response.data['stock']), (200, 12))
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.stock, self.ledger_balance(product)), ('Renombrado', 12, 12))
+        self.assertEqual(product.stock_movements.latest('id').quantity, 5)
+
+    def test_deleting_cancelled_sale_does_not_restore_stock_twice(self):
+        product = self.make_products(1, stock=10)[0]
+        sale_id = self.client.post('/api/sales/', self.sale_payload([product], quantity=4), format='json').data['id']
+        self.client.patch(f'/api/sales/{sale_id}/cancel/')
+        self.client.delete(f'/api/sales/{sale_id}/')
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 10)
+
+    def test_stock_as_of_date(self):
+        product = self.make_products(1, stock=10)[0]
+        before_sale = timezone.now()
+        self.client.post('/api/sales/', self.sale_payload([product], quantity=4), format='json')
+
+        response = self.client.get(
+            f'/api/products/{product.id}/stock-movements/', {'as_of': before_sale.isoformat()}
+        )
+        self.assertEqual(response.data['stock'], 10)
+
+    def test_reconcile_stock_rebuilds_balances_from_ledger(self):
+        products = self.make_products(3, stock=7)
+        Product.objects.filter(pk=products[0].pk).update(stock=99)
+        StockMovement.objects.create(product=products[1], kind='ajuste', quantity=-2)
+
+        version = CatalogVersion.current()
+
+        call_command('reconcile_stock', stdout=StringIO())
+
+        self.assertEqual(
+            dict(Product.objects.values_list('id', 'stock')),
+            {products[0].id: 7, products[1].id: 5, products[2].id: 7},
+        )
+        self.assertEqual(CatalogVersion.current(), version + 1)
+        self.assertEqual(
+            set(Product.objects.filter(catalog_version__gt=version).values_list('id', flat=True)),
+            {products[0].id, products[1].id},
+        )
+
+
+class SaleCancellationTests(ApiTestCase):
+
+    def test_cancel_query_count_does_not_depend_on_sale_size(self):
+        small = self.create_sale(self.make_products(1, prefix='Chico'))
+        large = self.create_sale(self.make_products(30, prefix='Grande'))
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            self.assertEqual(self.client.patch(f'/api/sales/{small}/cancel/').status_code, 200)
+        with CaptureQueriesContext(connection) as large_ctx:
+            self.assertEqual(self.client.patch(f'/api/sales/{large}/cancel/').status_code, 200)
+
+        self.assertEqual(len(small_ctx), len(large_ctx))
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {10})
+
+    def test_cancel_does_not_overwrite_concurrent_price_edits(self):
+        product = self.make_products(1)[0]
+        sale_id = self.create_sale([product])
+        Product.objects.filter(pk=product.pk).update(sale_price=Decimal('150.00'))
+        self.client.patch(f'/api/sales/{sale_id}/cancel/')
+
+        product.refresh_from_db()
+        self.assertEqual(product.sale_price, Decimal('150.00'))
+        self.assertEqual(product.stock, 10)
+
+    def test_bulk_cancel_groups_stock_restoration_by_product(self):
+        products = self.make_products(2)
+        sale_ids = [self.create_sale(products, quantity=2) for _ in range(3)]
+        self.client.patch(f'/api/sales/{sale_ids[0]}/cancel/')
+
+        response = self.client.post('/api/sales/bulk-cancel/', {'sale_ids': sale_ids + [9999]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['cancelled'], sale_ids[1:])
+        self.assertEqual(response.data['already_cancelled'], sale_ids[:1])
+        self.assertEqual(response.data['not_found'], [9999])
+        self.assertEqual(Sale.objects.filter(status='Cancelada').count(), 3)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {10})
+
+
+class SaleListingTests(ApiTestCase):
+
+    def serialization_queries(self, serializer_class, compact=False):
+        with CaptureQueriesContext(connection) as ctx:
+            data = serializer_class(sale_read_queryset(compact=compact), many=True).data
+        return len(ctx), data
+
+    def test_list_endpoint_query_count_is_fixed(self):
+        self.make_sales(10, lines=2)
+        with CaptureQueriesContext(connection) as first_ctx:
+            self.assertEqual(self.client.get('/api/sales/').status_code, 200)
+        self.make_sales(30, lines=2)
+        with CaptureQueriesContext(connection) as second_ctx:
+            response = self.client.get('/api/sales/')
+
+        self.assertEqual(len(first_ctx), len(second_ctx))
+        self.assertEqual(response.data['results'][0]['details'][0]['product']['category_name'], 'Bebidas')
+
+    def test_serializer_query_count_for_10_100_and_1000_sales(self):
+        counts = []
+        for size in (10, 100, 1000):
+            Sale.objects.all().delete()
+            self.make_sales(size, lines=2)
+            queries, data = self.serialization_queries(SaleReadSerializer)
+            self.assertEqual(len(data), size)
+            counts.append(queries)
+        self.assertEqual(len(set(counts)), 1)
+
+    def test_compact_lines(self):
+        self.make_sales(3, lines=2)
+        response = self.client.get('/api/sales/', {'lines': 'compact'})
+        line = response.data['results'][0]['details'][0]
+
+        self.assertEqual(set(line), {'product_id', 'product_name', 'product_sku', 'quantity', 'unit_price'})
+        queries, data = self.serialization_queries(SaleCompactReadSerializer, compact=True)
+        self.assertEqual(queries, 2)
+
+
+class KeysetPaginationTests(ApiTestCase):
+
+    def test_cursor_pages_walk_every_sale_once_without_count(self):
+        self.make_sales(25)
+        seen = []
+        url = '/api/sales/?page_size=10&lines=compact'
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+            seen.extend(sale['id'] for sale in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_deep_page_costs_the_same_as_first_page(self):
+        self.make_sales(60)
+        with CaptureQueriesContext(connection) as first_ctx:
+            response = self.client.get('/api/sales/', {'page_size': 5})
+        url = response.data['next']
+        for _ in range(8):
+            url = self.client.get(url).data['next']
+        with CaptureQueriesContext(connection) as deep_ctx:
+            self.client.get(url)
+
+        self.assertEqual(len(first_ctx), len(deep_ctx))
+        plan = self.query_plan(next(q['sql'] for q in deep_ctx.captured_queries if q['sql'].startswith('SELECT "api_sale"')))
+        self.assertIn('api_sale_date_ti_1b98f9_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_page_size_is_capped(self):
+        Product.objects.bulk_create([
+            Product(name=f'P{i}', cost_price=1, sale_price=2, category=self.category) for i in range(600)
+        ])
+        response = self.client.get('/api/products/', {'page_size': 10000})
+        self.assertEqual(len(response.data['results']), 500)
+
+    def test_approximate_count_is_optional(self):
+        self.make_sales(12)
+        response = self.client.get('/api/sales/', {'count': 'approx'})
+        self.assertEqual(response.data['approximate_count'], 12)
+
+    def test_page_parameter_keeps_page_number_pagination(self):
+        self.make_sales(12)
+        response = self.client.get('/api/sales/', {'page': 2, 'page_size': 10})
+
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class PosCatalogTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_snapshot_has_etag_and_honours_if_none_match(self):
+        self.make_products(3)
+        response = self.client.get('/api/products/pos-catalog/')
+
+        self.assertEqual(len(response.data['products']), 3)
+        self.assertEqual(response['ETag'], f'"catalog-{response.data["version"]}"')
+        cached = self.client.get('/api/products/pos-catalog/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_delta_returns_only_changes_since_version(self):
+        products = self.make_products(4)
+        version = self.client.get('/api/products/pos-catalog/').data['version']
+
+        self.client.post('/api/sales/', self.sale_payload(products[:1]), format='json')
+        self.client.patch(f'/api/products/{products[1].id}/', {'sale_price': '120.00'}, format='json')
+        self.client.delete(f'/api/products/{products[3].id}/')
+        self.client.patch(f'/api/products/{products[2].id}/', {'estado': 'inactivo'}, format='json')
+
+        delta = self.client.get('/api/products/pos-catalog/', {'since': version}).data
+        self.assertEqual({p['id'] for p in delta['products']}, {products[0].id, products[1].id})
+        self.assertEqual(delta['deactivated'], [products[2].id])
+        self.assertEqual(delta['deleted'], [products[3].id])
+        self.assertGreater(delta['version'], version)
+
+        empty = self.client.get('/api/products/pos-catalog/', {'since': delta['version']}).data
+        self.assertEqual((empty['products'], empty['deactivated'], empty['deleted']), ([], [], []))
+
+
+class PopularityTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_ranking_follows_sales_and_cancellations(self):
+        first, second, third = self.make_products(3, stock=50)
+        self.create_sale([first], quantity=5)
+        cancelled = self.create_sale([second], quantity=8)
+        self.create_sale([third], quantity=3)
+        self.client.patch(f'/api/sales/{cancelled}/cancel/')
+
+        response = self.client.get('/api/products/popular-for-pos/')
+        self.assertEqual([p['id'] for p in response.data], [first.id, third.id])
+        self.assertEqual(ProductPopularity.objects.get(product=second).quantity, 0)
+
+    def test_cached_ranking_follows_cancellations_and_deactivations(self):
+        first, second = self.make_products(2, stock=50)
+        self.create_sale([first], quantity=5)
+        cancelled = self.create_sale([second], quantity=8)
+        self.assertEqual([p['id'] for p in self.client.get('/api/products/popular-for-pos/').data], [second.id, first.id])
+
+        self.client.patch(f'/api/sales/{cancelled}/cancel/')
+        self.assertEqual([p['id'] for p in self.client.get('/api/products/popular-for-pos/').data], [first.id])
+
+        self.client.patch(f'/api/products/{first.id}/', {'estado': 'inactivo'}, format='json')
+        self.assertEqual(self.client.get('/api/products/popular-for-pos/').data, [])
+
+    def test_records_more_keys_than_sqlite_expression_depth(self):
+        products = self.make_products(11)
+        today = timezone.localdate()
+        entries = [(p.id, today - timedelta(days=offset), 2) for p in products for offset in range(100)]
+
+        record_popularity(entries)
+        record_popularity((pid, day, -1) for pid, day, _ in entries)
+
+        self.assertEqual(ProductPopularity.objects.count(), 1100)
+        self.assertEqual(set(ProductPopularity.objects.values_list('quantity', flat=True)), {1})
+
+    def test_window_and_category_filters(self):
+        old, recent = self.make_products(2, stock=50)
+        other_category = Category.objects.create(name='Limpieza')
+        Product.objects.filter(pk=recent.pk).update(category=other_category)
+        today = timezone.localdate()
+        ProductPopularity.objects.bulk_create([
+            ProductPopularity(product=old, day=today - timedelta(days=30), quantity=20),
+            ProductPopularity(product=recent, day=today, quantity=2),
+        ])
+
+        week = self.client.get('/api/products/popular-for-pos/', {'days': 7}).data
+        self.assertEqual([p['id'] for p in week], [recent.id])
+        by_category = self.client.get('/api/products/popular-for-pos/', {'category': self.category.id}).data
+        self.assertEqual([p['id'] for p in by_category], [old.id])
+
+    def test_query_count_does_not_grow_with_history(self):
+        products = self.make_products(5, stock=1000)
+        self.create_sale([products[0]], quantity=1)
+        with CaptureQueriesContext(connection) as short_ctx:
+            self.client.get('/api/products/popular-for-pos/', {'limit': 5})
+        today = timezone.localdate()
+        ProductPopularity.objects.bulk_create([
+            ProductPopularity(product=p, day=today - timedelta(days=d), quantity=d)
+            for p in products for d in range(1, 90)
+        ])
+        cache.clear()
+        with CaptureQueriesContext(connection) as long_ctx:
+            response = self.client.get('/api/products/popular-for-pos/', {'limit': 5})
+
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(len(short_ctx), len(long_ctx))
+
+    def test_rebuild_popularity_from_sales(self):
+        product = self.make_products(1, stock=50)[0]
+        self.create_sale([product], quantity=4)
+        self.create_sale([product], quantity=2)
+        ProductPopularity.objects.all().delete()
+
+        call_command('rebuild_popularity', stdout=StringIO())
+
+        self.assertEqual(ProductPopularity.objects.get(product=product).quantity, 6)
+
+
+class SalesRollupTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def rollup_totals(self):
+        sales = SalesRollup.objects.aggregate(count=Sum('sales_count'), total=Sum('total_amount'))
+        lines = ProductSalesRollup.objects.aggregate(
+            quantity=Sum('quantity'), revenue=Sum('revenue'), cost=Sum('cost')
+        )
+        return sales['count'] or 0, sales['total'] or 0, lines['quantity'] or 0, lines['revenue'] or 0, lines['cost'] or 0
+
+    def category_totals(self):
+        return {
+            category_id: quantity for category_id, quantity in
+            ProductSalesRollup.objects.values_list('category_id').annotate(quantity=Sum('quantity')).order_by()
+            if quantity
+        }
+
+    def test_checkout_and_cancel_keep_rollups_in_sync(self):
+        products = self.make_products(2)
+        first = self.create_sale(products, quantity=2)
+        self.create_sale(products[:1], quantity=1)
+
+        self.assertEqual(self.rollup_totals(), (2, Decimal('500.00'), 5, Decimal('500.00'), Decimal('250.00')))
+        self.assertEqual(SalesRollup.objects.count(), 1)
+        self.assertEqual(ProductSalesRollup.objects.count(), 2)
+
+        self.client.patch(f'/api/sales/{first}/cancel/')
+        self.assertEqual(self.rollup_totals(), (1, Decimal('100.00'), 1, Decimal('100.00'), Decimal('50.00')))
+
+    def test_sync_and_bulk_cancel_of_many_distinct_keys(self):
+        # Más de 1000 claves de rollup y de popularidad: un OR por clave excede la profundidad de SQLite.
+        products = self.make_products(1050)
+        sales = [
+            dict(self.sale_payload(products[i * 3:i * 3 + 3]), idempotency_key=f'lote-{i}')
+            for i in range(350)
+        ]
+
+        synced = self.client.post('/api/sales/sync/', {'sales': sales}, format='json')
+        self.assertEqual(synced.status_code, 200)
+        self.assertEqual(ProductSalesRollup.objects.count(), 1050)
+        cancelled = self.client.post(
+            '/api/sales/bulk-cancel/', {'sale_ids': [r['sale_id'] for r in synced.data['results']]}, format='json'
+        )
+
+        self.assertEqual((cancelled.status_code, len(cancelled.data['cancelled'])), (200, 350))
+        self.assertEqual(self.rollup_totals(), (0, 0, 0, 0, 0))
+
+    def test_cancel_after_recategorizing_uses_the_sale_category(self):
+        product = self.make_products(1)[0]
+        sale_id = self.create_sale([product])
+        other = Category.objects.create(name='Almacén')
+        self.client.patch(f'/api/products/{product.id}/', {'category': other.id}, format='json')
+        self.client.patch(f'/api/sales/{sale_id}/cancel/')
+
+        by_category = dict(
+            ProductSalesRollup.objects.values_list('category_id').annotate(quantity=Sum('quantity')).order_by()
+        )
+        self.assertEqual(by_category, {self.category.id: 0})
+        self.assertEqual(SaleDetail.objects.get(sale_id=sale_id).category_id, self.category.id)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        products = self.make_products(3)
+        for quantity in (1, 2, 3):
+            self.create_sale(products[:quantity], quantity=quantity)
+        self.client.delete(f'/api/sales/{Sale.objects.first().id}/')
+        Product.objects.filter(pk=products[0].pk).update(category=Category.objects.create(name='Almacén'))
+        incremental = self.rollup_totals(), self.category_totals()
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+
+        self.assertEqual((self.rollup_totals(), self.category_totals()), incremental)
+
+    def test_dashboard_reads_rollups(self):
+        products = self.make_products(2)
+        self.create_sale(products, quantity=2)
+        self.create_sale(products[:1], quantity=1)
+
+        data = self.client.get('/api/reports/dashboard/').data
+
+        self.assertEqual(data['kpis']['ventas_del_dia'], Decimal('500.00'))
+        self.assertEqual(data['kpis']['ganancia_bruta_del_dia'], Decimal('250.00'))
+        self.assertEqual(data['kpis']['productos_vendidos'], 5)
+        self.assertEqual(data['rankings']['mas_vendidos'][0], {'product__name': products[0].name, 'value': 3})
+        self.assertEqual(data['charts']['ventas_por_categoria'], [{'name': 'Bebidas', 'Ventas': Decimal('500.00')}])
+        self.assertEqual(data['other_reports']['productos_dormidos'], [])
+
+    def test_dashboard_query_count_does_not_depend_on_history(self):
+        products = self.make_products(3)
+        self.create_sale(products)
+        with CaptureQueriesContext(connection) as few_ctx:
+            self.client.get('/api/reports/dashboard/')
+        for _ in range(5):
+            self.create_sale(products)
+        with CaptureQueriesContext(connection) as many_ctx:
+            self.client.get('/api/reports/dashboard/')
+
+        self.assertEqual(len(few_ctx), len(many_ctx))
+        self.assertFalse(any('api_saledetail' in query['sql'] for query in many_ctx.captured_queries))
+
+
+class ProductSalesStatsTests(ApiTestCase):
+
+    def test_sales_and_cancellations_update_stats(self):
+        products = self.make_products(2)
+        first = self.create_sale(products, quantity=2)
+        self.create_sale(products[:1], quantity=1)
+        self.client.patch(f'/api/sales/{first}/cancel/')
+
+        stats = {s.product_id: s for s in ProductSalesStats.objects.all()}
+        self.assertEqual(stats[products[0].id].units_sold, 1)
+        self.assertEqual(stats[products[0].id].revenue, Decimal('100.00'))
+        self.assertEqual(stats[products[1].id].units_sold, 0)
+        # La cancelación no hace retroceder la fecha de última venta.
+        self.assertIsNotNone(stats[products[1].id].last_sold_at)
+
+    def test_rebuild_matches_incremental_stats(self):
+        products = self.make_products(3)
+        self.create_sale(products, quantity=2)
+        self.create_sale(products[:2], quantity=1)
+        incremental = list(ProductSalesStats.objects.order_by('product_id').values_list('product_id', 'units_sold', 'revenue', 'last_sold_at'))
+
+        call_command('rebuild_product_stats', stdout=StringIO())
+
+        self.assertEqual(
+            list(ProductSalesStats.objects.order_by('product_id').values_list('product_id', 'units_sold', 'revenue', 'last_sold_at')),
+            incremental,
+        )
+
+    def test_dormant_products_use_last_sold_at(self):
+        recent, old, never = self.make_products(3)
+        self.create_sale([recent, old])
+        ProductSalesStats.objects.filter(product=old).update(last_sold_at=timezone.now() - timedelta(days=90))
+
+        with CaptureQueriesContext(connection) as ctx:
+            dormant = dormant_products(timezone.localdate())
+
+        self.assertEqual({p['name'] for p in dormant}, {old.name, never.name})
+        self.assertEqual(len(ctx), 1)
+        self.assertNotIn('saledetail', ctx.captured_queries[0]['sql'])
+        self.assertNotIn('rollup', ctx.captured_queries[0]['sql'])
+
+
+class SaleCostSnapshotTests(ApiTestCase):
+
+    def test_checkout_captures_cost_and_profit(self):
+        product = self.make_products(1)[0]
+        self.create_sale([product], quantity=3)
+        Product.objects.filter(pk=product.pk).update(cost_price=Decimal('80.00'))
+
+        detail = SaleDetail.objects.get()
+        self.assertEqual((detail.unit_cost, detail.profit), (Decimal('50.00'), Decimal('150.00')))
+
+    def test_cancel_uses_captured_cost(self):
+        product = self.make_products(1)[0]
+        sale_id = self.create_sale([product], quantity=2)
+        Product.objects.filter(pk=product.pk).update(cost_price=Decimal('80.00'))
+        self.client.patch(f'/api/sales/{sale_id}/cancel/')
+
+        totals = ProductSalesRollup.objects.aggregate(cost=Sum('cost'), revenue=Sum('revenue'))
+        self.assertEqual((totals['cost'], totals['revenue']), (Decimal('0'), Decimal('0')))
+        self.assertEqual(ProductSalesStats.objects.get().profit, Decimal('0'))
+
+    def test_backfill_fills_missing_costs_in_chunks(self):
+        products = self.make_products(3)
+        for _ in range(2):
+            self.create_sale(products)
+        SaleDetail.objects.update(unit_cost=None, profit=None)
+        Product.objects.filter(pk=products[0].pk).update(cost_price=Decimal('70.00'))
+        out = StringIO()
+
+        call_command('backfill_sale_costs', chunk_size=4, stdout=out)
+
+        self.assertFalse(SaleDetail.objects.filter(unit_cost__isnull=True).exists())
+        self.assertEqual(
+            set(SaleDetail.objects.filter(product=products[0]).values_list('unit_cost', 'profit')),
+            {(Decimal('70.00'), Decimal('30.00'))},
+        )
+        self.assertIn('6 líneas', out.getvalue())
+
+    def test_most_profitable_uses_prices_actually_charged(self):
+        cheap, expensive = self.make_products(2)
+        payload = self.sale_payload([cheap, expensive])
+        payload['details'][0]['unit_price'] = '90.00'
+        payload['total_amount'] = '190.00'
+        self.client.post('/api/sales/', payload, format='json')
+        Product.objects.filter(pk=cheap.pk).update(sale_price=Decimal('1000.00'))
+
+        report = self.client.get('/api/reports/').data
+
+        self.assertEqual(report['most_profitable_product'], {'name': expensive.name, 'profit_margin': 50.0})
+
+
+class BulkPriceUpdateTests(ApiTestCase):
+
+    def update(self, **payload):
+        return self.client.post('/api/bulk-price-update/', payload, format='json')
+
+    def test_updates_selected_products_and_records_history(self):
+        first, second, untouched = self.make_products(3)
+        version = CatalogVersion.current()
+
+        response = self.update(product_ids=[first.id, second.id, 999999], percentage='12.5', update_target='sale')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['updated'], response.data['not_matched']), (2, [999999]))
+        self.assertEqual(response.data['message'], '2 productos actualizados.')
+        self.assertEqual(
+            dict(Product.objects.values_list('id', 'sale_price')),
+            {first.id: Decimal('112.50'), second.id: Decimal('112.50'), untouched.id: Decimal('100.00')},
+        )
+        self.assertEqual(set(Product.objects.values_list('cost_price', flat=True)), {Decimal('50.00')})
+        self.assertGreater(Product.objects.get(pk=first.pk).catalog_version, version)
+        change = PriceChange.objects.get(product=first)
+        self.assertEqual(
+            (change.old_sale_price, change.new_sale_price, change.old_cost_price, change.new_cost_price, change.user),
+            (Decimal('100.00'), Decimal('112.50'), Decimal('50.00'), Decimal('50.00'), self.user),
+        )
+
+    def test_selects_by_filters_in_chunks(self):
+        products = self.make_products(5, prefix='Yerba')
+        self.make_products(2, prefix='Fideos')
+        Product.objects.filter(pk=products[0].pk).update(estado='inactivo')
+
+        product_ids = select_products(search='yerba', estado='activo')
+        updated = bulk_update_prices(product_ids, Decimal('-10'), 'both', chunk_size=3)
+
+        self.assertEqual(updated, 4)
+        self.assertEqual(
+            set(Product.objects.filter(name__startswith='Yerba', estado='activo').values_list('cost_price', 'sale_price')),
+            {(Decimal('45.00'), Decimal('90.00'))},
+        )
+        self.assertFalse(Product.objects.filter(name__startswith='Fideos', sale_price=Decimal('90.00')).exists())
+        self.assertEqual(PriceChange.objects.count(), 4)
+
+    def test_endpoint_updates_filtered_selection_in_chunks(self):
+        products = self.make_products(5, prefix='Yerba')
+        Product.objects.filter(pk=products[0].pk).update(estado='inactivo')
+
+        # La vista usa el tamaño de tanda por defecto; se achica para que la selección ocupe dos tandas.
+        with mock.patch('api.views.bulk_update_prices', partial(bulk_update_prices, chunk_size=3)), \
+                CaptureQueriesContext(connection) as ctx:
+            response = self.update(search='yerba', estado='activo', percentage='-10', update_target='both')
+
+        self.assertEqual((response.status_code, response.data['updated']), (200, 4))
+        self.assertEqual(
+            [query['sql'].startswith('UPDATE "api_product"') for query in ctx].count(True), 2
+        )
+        self.assertEqual(
+            dict(Product.objects.values_list('id', 'sale_price')),
+            {p.id: Decimal('100.00') if p == products[0] else Decimal('90.00') for p in products},
+        )
+        self.assertEqual(
+            set(PriceChange.objects.values_list('product_id', 'user')), {(p.id, self.user.id) for p in products[1:]}
+        )
+
+    def test_query_count_does_not_depend_on_selection_size(self):
+        self.make_products(4, prefix='Chico')
+        self.update(search='chico', percentage='5', update_target='cost')
+        with CaptureQueriesContext(connection) as small_ctx:
+            self.update(search='chico', percentage='5', update_target='cost')
+        self.make_products(60, prefix='Grande')
+        with CaptureQueriesContext(connection) as large_ctx:
+            self.update(search='grande', percentage='5', update_target='cost')
+
+        self.assertEqual(len(small_ctx), len(large_ctx))
+
+    def test_requires_a_selection_and_valid_percentage(self):
+        self.make_products(1)
+        self.assertEqual(self.update(percentage='5', update_target='sale').status_code, 400)
+        self.assertEqual(self.update(all=True, percentage='-100', update_target='sale').status_code, 400)
+        self.assertEqual(self.update(all=True, percentage='5', update_target='precio').status_code, 400)
+        self.assertEqual(self.update(category=self.category.id + 1, percentage='5', update_target='sale').status_code, 404)
+        self.assertEqual(self.update(all=True, percentage='5', update_target='sale').data['updated'], 1)
+
+
+class ReportCacheTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.products = self.make_products(2)
+
+    def test_dashboard_is_served_from_cache_until_data_changes(self):
+        first = self.client.get('/api/reports/dashboard/')
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get('/api/reports/dashboard/')
+
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(first.data, second.data)
+        # Grupos del usuario y las dos versiones de datos; ninguna consulta de reportes.
+        self.assertEqual(len(ctx), 3)
+
+        self.client.post('/api/sales/', self.sale_payload(self.products), format='json')
+        third = self.client.get('/api/reports/dashboard/')
+        self.assertEqual(third['X-Cache'], 'MISS')
+        self.assertEqual(third.data['kpis']['productos_vendidos'], 2)
+
+    def test_product_changes_invalidate_reports(self):
+        self.client.get('/api/reports/')
+        self.client.patch(f'/api/products/{self.products[0].id}/', {'sale_price': '120.00'}, format='json')
+
+        self.assertEqual(self.client.get('/api/reports/')['X-Cache'], 'MISS')
+
+    def test_cancellation_invalidates_dashboard(self):
+        sale_id = self.client.post('/api/sales/', self.sale_payload(self.products), format='json').data['id']
+        self.client.get('/api/reports/dashboard/')
+        self.client.patch(f'/api/sales/{sale_id}/cancel/')
+
+        response = self.client.get('/api/reports/dashboard/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['kpis']['productos_vendidos'], 0)
+
+    def test_concurrent_miss_waits_for_the_computing_request(self):
+        key = f'report:dashboard:{timezone.localdate()}:{report_data_version()}'
+        cache.add(f'{key}:lock', 1)
+        compute = mock.Mock(return_value={'kpis': {}})
+
+        with mock.patch('api.report_cache.time.sleep', side_effect=lambda _: cache.set(key, {'cached': True})):
+            data, hit = cached_report('dashboard', compute)
+
+        self.assertEqual((data, hit), ({'cached': True}, True))
+        compute.assert_not_called()
+
+    def test_stats_count_hits_and_misses(self):
+        for _ in range(3):
+            self.client.get('/api/reports/dashboard/')
+
+        stats = self.client.get('/api/reports/cache-stats/').data
+        self.assertEqual((stats['hits'], stats['misses']), (2, 1))
+
+
+class AnalyticsEngineTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        products = self.make_products(4, stock=100)
+        cash = self.payment_method
+        card = PaymentMethod.objects.create(name='Tarjeta', adjustment_percentage=Decimal('10.00'))
+        now = timezone.now()
+        for days_ago, method, quantity, count in [(0, cash, 1, 4), (3, card, 2, 3), (20, cash, 3, 2), (200, card, 4, 1)]:
+            payload = self.sale_payload(products[:count], quantity=quantity)
+            payload['payment_method_id'] = method.id
+            sale_id = self.client.post('/api/sales/', payload, format='json').data['id']
+            Sale.objects.filter(pk=sale_id).update(date_time=now - timedelta(days=days_ago))
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+
+    def test_dashboard_matches_orm_reference(self):
+        self.assertEqual(DashboardAnalytics().report(), orm_dashboard_report())
+
+    def test_summary_matches_orm_reference(self):
+        self.assertEqual(summary_report(), orm_summary_report())
+
+    def test_dashboard_loads_sales_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            DashboardAnalytics().report()
+
+        rollup_queries = [q for q in ctx.captured_queries if 'salesrollup' in q['sql']]
+        self.assertEqual(len(rollup_queries), 2)
+
+    def test_empty_history(self):
+        SalesRollup.objects.all().delete()
+        ProductSalesRollup.objects.all().delete()
+
+        self.assertEqual(DashboardAnalytics().report(), orm_dashboard_report())
+        self.assertEqual(summary_report(), orm_summary_report())
+
+
+class DashboardSectionsTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        products = self.make_products(3)
+        self.client.post('/api/sales/', self.sale_payload(products, quantity=2), format='json')
+        self.full = DashboardAnalytics().report()
+
+    def test_only_requested_sections_are_returned(self):
+        response = self.client.get('/api/reports/dashboard/', {'sections': 'kpis,charts.daily'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'kpis', 'charts', 'timings'})
+        self.assertEqual(response.data['kpis'], self.full['kpis'])
+        self.assertEqual(response.data['charts'], {'ventas_diarias': self.full['charts']['ventas_diarias']})
+        self.assertEqual(set(response.data['timings']), {'kpis', 'charts.daily'})
+        self.assertIn('charts.daily;dur=', response['Server-Timing'])
+
+    def test_prefix_selects_every_section_in_the_group(self):
+        response = self.client.get('/api/reports/dashboard/', {'sections': 'charts,rankings'})
+
+        self.assertEqual(response.data['charts'], self.full['charts'])
+        self.assertEqual(response.data['rankings'], self.full['rankings'])
+
+    def test_sections_are_cached_individually(self):
+        self.client.get('/api/reports/dashboard/', {'sections': 'kpis'})
+        timings = self.client.get('/api/reports/dashboard/', {'sections': 'kpis,dormant'}).data['timings']
+
+        self.assertEqual(timings['kpis']['cache'], 'HIT')
+        self.assertEqual(timings['dormant']['cache'], 'MISS')
+
+    def test_unknown_section_is_rejected(self):
+        response = self.client.get('/api/reports/dashboard/', {'sections': 'kpis,ventas'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ventas', response.data['error'])
+
+
+class DashboardParallelSectionsTests(TransactionTestCase):
+    """ Sin transacción abierta las secciones se calculan en hilos con conexiones propias. """
+
+    # Restaura las filas de versión creadas por las migraciones después del flush.
+    serialized_rollback = True
+
+    def test_parallel_sections_match_full_report(self):
+        cache.clear()
+        user = User.objects.create_user(username='vendedor', password='password123')
+        category = Category.objects.create(name='Almacén')
+        product = Product.objects.create(name='Yerba', sku='Y-1', cost_price=50, sale_price=100, stock=10, category=category)
+        checkout_sale(
+            user=user, payment_method=PaymentMethod.objects.create(name='Contado', adjustment_percentage=Decimal('0.00')),
+            details=[{'product_id': product.id, 'quantity': 2, 'unit_price': Decimal('100.00')}],
+            total_amount=Decimal('200.00'),
+        )
+        threads = set()
+
+        def tracking(*args):
+            threads.add(threading.get_ident())
+            return _compute_section(*args)
+
+        with mock.patch('api.dashboard._compute_section', side_effect=tracking):
+            data, timings = dashboard_sections(list(SECTIONS))
+
+        self.assertEqual(data, DashboardAnalytics().report())
+        self.assertEqual(set(timings), set(SECTIONS))
+        self.assertGreater(len(threads), 1)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+class SalesExportTests(ApiTestCase):
+
+    def export(self, start, end):
+        response = self.client.get('/api/reports/export-sales/', {'start_date': start, 'end_date': end})
+        self.assertEqual(response.status_code, 200)
+        return load_workbook(BytesIO(b''.join(response.streaming_content)))['Reporte de Ventas']
+
+    def test_streams_styled_rows_of_the_range(self):
+        products = self.make_products(2)
+        self.client.post('/api/sales/', self.sale_payload(products[:1]), format='json')
+        self.client.post('/api/sales/', self.sale_payload(products), format='json')
+        old = self.client.post('/api/sales/', self.sale_payload(products[1:]), format='json').data['id']
+        Sale.objects.filter(pk=old).update(date_time=timezone.now() - timedelta(days=10))
+        today = timezone.localdate().isoformat()
+
+        ws = self.export(today, today)
+
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(rows[0], ('Fecha', 'ID Venta', 'Estado', 'Monto Total', 'Neto Gravado (21%)', 'IVA (21%)'))
+        self.assertEqual([row[3] for row in rows[1:]], [100, 200])
+        self.assertAlmostEqual(rows[1][4] + rows[1][5], 100)
+        self.assertTrue(ws['A1'].font.bold)
+        self.assertEqual(ws['D2'].number_format, '"$"#,##0.00')
+        self.assertEqual(ws['A2'].number_format, 'DD/MM/YYYY HH:MM')
+        self.assertEqual(ws['B2'].alignment.horizontal, 'center')
+        self.assertEqual(ws.column_dimensions['A'].width, 20)
+
+    def test_range_queries_use_the_date_time_index(self):
+        today = timezone.localdate()
+        for level in ('sales', 'lines'):
+            _, _, rows = EXPORT_LEVELS[level]
+            with CaptureQueriesContext(connection) as ctx:
+                list(rows(today, today))
+            plan = self.query_plan(ctx.captured_queries[0]['sql'])
+            self.assertIn('SEARCH api_sale USING INDEX api_sale_date_ti_1b98f9_idx (date_time>? AND date_time<?)', plan)
+            # Sin ordenar todo el rango: en líneas sólo se ordenan las de cada venta.
+            self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_reads_sales_in_chunks(self):
+        products = self.make_products(1)
+        for _ in range(3):
+            self.client.post('/api/sales/', self.sale_payload(products), format='json')
+        today = timezone.localdate()
+
+        rows = list(sales_export_rows(today, today, chunk_size=2))
+
+        self.assertEqual([row[1] for row in rows], list(Sale.objects.order_by('date_time', 'id').values_list('id', flat=True)))
+
+    def test_requires_valid_dates(self):
+        response = self.client.get('/api/reports/export-sales/', {'start_date': '2024-13-01', 'end_date': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def flat_export(self, **params):
+        today = timezone.localdate().isoformat()
+        response = self.client.get('/api/reports/export-sales/', {'start_date': today, 'end_date': today, **params})
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_sales_as_csv(self):
+        products = self.make_products(2)
+        sale_id = self.client.post('/api/sales/', self.sale_payload(products), format='json').data['id']
+
+        response, content = self.flat_export(format='csv')
+
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(rows[0], ['fecha', 'venta_id', 'estado', 'monto_total', 'neto_gravado', 'iva'])
+        self.assertEqual(rows[1][1:], [str(sale_id), 'Completada', '200.00', '165.29', '34.71'])
+        self.assertEqual(
+            timezone.localtime(Sale.objects.get().date_time).isoformat(), rows[1][0]
+        )
+
+    def test_lines_as_ndjson_with_captured_cost(self):
+        product = self.make_products(1)[0]
+        sale_id = self.client.post('/api/sales/', self.sale_payload([product], quantity=2), format='json').data['id']
+        Product.objects.filter(pk=product.pk).update(cost_price=Decimal('80.00'))
+
+        response, content = self.flat_export(format='ndjson', level='lines')
+
+        lines = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(lines), 1)
+        self.assertEqual({key: value for key, value in lines[0].items() if key != 'fecha'}, {
+            'venta_id': sale_id, 'estado': 'Completada', 'sku': product.sku, 'producto': product.name,
+            'categoria': 'Bebidas', 'cantidad': 2, 'precio_unitario': '100.00',
+            'costo_unitario': '50.00', 'ganancia': '100.00',
+        })
+
+    def test_empty_csv_has_header(self):
+        _, content = self.flat_export(format='csv', level='lines')
+        self.assertEqual(content.splitlines(), [','.join(SALE_LINE_FIELDS)])
+
+    def test_rejects_unknown_format_and_level(self):
+        today = timezone.localdate().isoformat()
+        for params in ({'format': 'pdf'}, {'level': 'items'}, {'format': 'xlsx', 'level': 'lines'}):
+            response = self.client.get(
+                '/api/reports/export-sales/', {'start_date': today, 'end_date': today, **params}
+            )
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.json())
+
+
+class ExportJobTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        exports_root = tempfile.TemporaryDirectory()
+        self.addCleanup(exports_root.cleanup)
+        self.enterContext(override_settings(EXPORT_JOBS_ROOT=exports_root.name))
+        self.today = timezone.localdate().isoformat()
+        self.products = self.make_products(2)
+        for _ in range(3):
+            self.client.post('/api/sales/', self.sale_payload(self.products), format='json')
+
+    def request_export(self, **params):
+        payload = {'format': 'csv', 'start_date': self.today, 'end_date': self.today, **params}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/reports/export-jobs/', payload, format='json')
+
+    def test_job_runs_and_file_is_downloadable(self):
+        response = self.request_export(level='lines')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'pendiente')
+
+        job = self.client.get(f"/api/reports/export-jobs/{response.data['id']}/").data
+        self.assertEqual((job['status'], job['rows_processed'], job['total_rows']), ('terminado', 6, 6))
+        download = self.client.get(f"/api/reports/export-jobs/{job['id']}/download/")
+        self.assertEqual(download['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(f'reporte_lineas_venta_{self.today}_a_{self.today}.csv', download['Content-Disposition'])
+        self.assertEqual(len(b''.join(download.streaming_content).decode().splitlines()), 7)
+
+    def test_identical_export_reuses_file_until_sales_change(self):
+        first = self.request_export(format='xlsx')
+        again = self.request_export(format='xlsx')
+        self.assertEqual((again.status_code, again.data['id'], again.data['reused']), (200, first.data['id'], True))
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+        self.client.post('/api/sales/', self.sale_payload(self.products[:1]), format='json')
+        after_sale = self.request_export(format='xlsx')
+        self.assertNotEqual(after_sale.data['id'], first.data['id'])
+        self.assertFalse(after_sale.data['reused'])
+
+    def test_line_export_is_not_reused_after_catalog_change(self):
+        lines = self.request_export(level='lines')
+        sales = self.request_export(level='sales')
+        self.client.patch(f'/api/products/{self.products[0].id}/', {'name': 'Renombrado'}, format='json')
+
+        lines_again = self.request_export(level='lines')
+        self.assertNotEqual(lines_again.data['id'], lines.data['id'])
+        self.assertFalse(lines_again.data['reused'])
+        download = self.client.get(f"/api/reports/export-jobs/{lines_again.data['id']}/download/")
+        self.assertIn('Renombrado', b''.join(download.streaming_content).decode())
+        sales_again = self.request_export(level='sales')
+        self.assertEqual((sales_again.data['id'], sales_again.data['reused']), (sales.data['id'], True))
+
+    def test_pending_job_lost_on_restart_is_resubmitted_when_reused(self):
+        # El pool que tenía el trabajo en cola se perdió con el proceso.
+        with mock.patch('api.export_jobs.submit'):
+            first = self.request_export()
+        self.assertEqual(ExportJob.objects.get(pk=first.data['id']).status, 'pendiente')
+
+        again = self.request_export()
+
+        self.assertEqual((again.data['id'], again.data['reused']), (first.data['id'], True))
+        self.assertEqual(ExportJob.objects.get(pk=first.data['id']).status, 'terminado')
+
+    def test_stale_job_in_progress_is_not_reused(self):
+        first = self.request_export()
+        ExportJob.objects.filter(pk=first.data['id']).update(
+            status='en_proceso', started_at=timezone.now() - timedelta(hours=2)
+        )
+
+        again = self.request_export()
+
+        self.assertNotEqual(again.data['id'], first.data['id'])
+        self.assertEqual(ExportJob.objects.get(pk=again.data['id']).status, 'terminado')
+
+    def test_download_waits_for_the_job(self):
+        job = ExportJob.objects.create(
+            export_format='csv', start_date=timezone.localdate(), end_date=timezone.localdate(), data_version=0
+        )
+        response = self.client.get(f'/api/reports/export-jobs/{job.id}/download/')
+        self.assertEqual(response.status_code, 409)
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.request_export(format='xlsx', level='lines').status_code, 400)
+        self.assertEqual(self.request_export(format='pdf').status_code, 400)
+        self.assertEqual(self.request_export(start_date='2024-02-01', end_date='2024-01-01').status_code, 400)
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_command_processes_pending_jobs(self):
+        job = ExportJob.objects.create(
+            export_format='ndjson', start_date=timezone.localdate(), end_date=timezone.localdate(), data_version=0
+        )
+        out = StringIO()
+
+        call_command('run_export_jobs', stdout=out)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed), ('terminado', 3))
+        self.assertIn('1 exportaciones procesadas', out.getvalue())
+
+
+class ExportJobWorkerTests(TransactionTestCase):
+    """ Fuera de una transacción el trabajo corre en el pool, no en el hilo de la petición. """
+
+    serialized_rollback = True
+
+    def test_job_runs_in_worker_thread(self):
+        exports_root = tempfile.TemporaryDirectory()
+        self.addCleanup(exports_root.cleanup)
+        self.enterContext(override_settings(EXPORT_JOBS_ROOT=exports_root.name))
+        threads = set()
+
+        def tracking(job_id):
+            threads.add(threading.get_ident())
+            return run_export_job(job_id)
+
+        with mock.patch('api.export_jobs.run_export_job', side_effect=tracking):
+            job, reused = request_export(None, 'csv', 'sales', timezone.localdate(), timezone.localdate())
+            for _ in range(100):
+                job.refresh_from_db()
+                if job.status == 'terminado':
+                    break
+                time.sleep(0.05)
+
+        self.assertFalse(reused)
+        self.assertEqual(job.status, 'terminado')
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+class ColumnarExportTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+        self.products = self.make_products(2)
+        self.sale_ids = [
+            self.client.post('/api/sales/', self.sale_payload(self.products), format='json').data['id']
+            for _ in range(3)
+        ]
+        # Una venta del día anterior, para tener dos particiones.
+        Sale.objects.filter(pk=self.sale_ids[0]).update(date_time=timezone.now() - timedelta(days=1))
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+    def test_writes_day_partitions_and_dimensions(self):
+        summary = export_sales_history(self.root)
+
+        self.assertEqual(summary['written'], [self.yesterday.isoformat(), self.today.isoformat()])
+        self.assertEqual(summary['rows'], {'sales': 3, 'sale_lines': 6})
+        sales = pq.read_table(self.root / 'sales' / f'day={self.today.isoformat()}' / 'part.parquet')
+        self.assertEqual(sorted(sales.column('id').to_pylist()), self.sale_ids[1:])
+        self.assertEqual(sales.column('final_amount').to_pylist(), [Decimal('200.00')] * 2)
+        lines = pq.read_table(self.root / 'sale_lines' / f'day={self.yesterday.isoformat()}' / 'part.parquet')
+        self.assertEqual(lines.column('unit_cost').to_pylist(), [Decimal('50.00')] * 2)
+        products = pq.read_table(self.root / 'products.parquet')
+        self.assertEqual(products.column('sku').to_pylist(), [p.sku for p in self.products])
+
+    def test_reuses_unchanged_days(self):
+        export_sales_history(self.root)
+        self.client.post('/api/sales/', self.sale_payload(self.products[:1]), format='json')
+
+        summary = export_sales_history(self.root)
+
+        self.assertEqual((summary['written'], summary['reused']), ([self.today.isoformat()], 1))
+        self.assertEqual(export_sales_history(self.root)['written'], [])
+
+    def test_removes_days_without_sales(self):
+        export_sales_history(self.root)
+        Sale.objects.filter(pk=self.sale_ids[0]).delete()
+
+        summary = export_sales_history(self.root)
+
+        self.assertEqual(summary['removed'], [self.yesterday.isoformat()])
+        self.assertFalse((self.root / 'sales' / f'day={self.yesterday.isoformat()}').exists())
+
+    def test_fingerprints_group_the_whole_range_by_local_day(self):
+        # Una venta justo antes de la medianoche local y otra justo en la medianoche.
+        midnight, _ = local_day_range(self.today - timedelta(days=30), self.today)
+        Sale.objects.filter(pk=self.sale_ids[1]).update(date_time=midnight - timedelta(microseconds=1))
+        Sale.objects.filter(pk=self.sale_ids[2]).update(date_time=midnight)
+
+        with self.assertNumQueries(2):
+            fingerprints = day_fingerprints(self.today - timedelta(days=400), self.today)
+
+        self.assertEqual(
+            {day: fingerprint.split(':')[0] for day, fingerprint in fingerprints.items()},
+            {
+                (self.today - timedelta(days=31)).isoformat(): '1',
+                (self.today - timedelta(days=30)).isoformat(): '1',
+                self.yesterday.isoformat(): '1',
+            },
+        )
+        line_ids = SaleDetail.objects.filter(sale_id=self.sale_ids[2]).values_list('id', flat=True)
+        self.assertEqual(
+            fingerprints[(self.today - timedelta(days=30)).isoformat()],
+            f"1:{self.sale_ids[2]}:200.00:0|2:{max(line_ids)}:2:100.00",
+        )
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_fingerprints_split_utc_hours_that_cross_local_midnight(self):
+        # En UTC+5:30 la medianoche local cae a mitad de una hora UTC.
+        midnight, _ = local_day_range(self.today, self.today)
+        Sale.objects.filter(pk=self.sale_ids[0]).update(date_time=midnight - timedelta(hours=5))
+        Sale.objects.filter(pk=self.sale_ids[1]).update(date_time=midnight - timedelta(minutes=10))
+        Sale.objects.filter(pk=self.sale_ids[2]).update(date_time=midnight + timedelta(minutes=10))
+
+        fingerprints = day_fingerprints(self.today - timedelta(days=1), self.today)
+
+        self.assertEqual(
+            {day: fingerprint.split(':')[0] for day, fingerprint in fingerprints.items()},
+            {self.yesterday.isoformat(): '2', self.today.isoformat(): '1'},
+        )
+
+    def test_arrow_ipc_format(self):
+        call_command('export_sales_history', output=self.root, format='arrow', stdout=StringIO())
+
+        with pa.ipc.open_file(self.root / 'sale_lines' / f'day={self.today.isoformat()}' / 'part.arrow') as reader:
+            self.assertEqual(reader.read_all().num_rows, 4)
+
+
+class ProductSearchTests(ApiTestCase):
+
+    def search(self, term):
+        response = self.client.get('/api/products/', {'search': term})
+        return [p['name'] for p in response.data['results']]
+
+    def test_prefix_search_ranks_name_matches_first(self):
+        Product.objects.create(name='Jabón en polvo', description='Para lavar yerba', cost_price=1, sale_price=2)
+        Product.objects.create(name='Yerba mate suave', cost_price=1, sale_price=2)
+
+        self.assertEqual(self.search('yerb'), ['Yerba mate suave', 'Jabón en polvo'])
+        self.assertEqual(self.search('jabon polv'), ['Jabón en polvo'])
+
+    def test_index_follows_bulk_updates_and_deletes(self):
+        products = self.make_products(3, prefix='Galletitas')
+        Product.objects.filter(pk=products[0].pk).update(name='Fideos largos', sku='FID-1')
+        Product.objects.filter(pk=products[1].pk).delete()
+
+        self.assertEqual(self.search('fideos'), ['Fideos largos'])
+        self.assertEqual(self.search('galletitas'), ['Galletitas 2'])
+
+    def test_search_by_sku(self):
+        self.make_products(2, prefix='ABC')
+        self.assertEqual(self.search('ABC-1'), ['ABC 1'])
+
+    def test_falls_back_to_like_without_fts(self):
+        self.make_products(2, prefix='Cerveza')
+        with mock.patch('api.search.product_fts_available', return_value=False):
+            self.assertEqual(self.search('erveza 1'), ['Cerveza 1'])
+
+    def test_user_input_cannot_inject_fts_syntax(self):
+        self.make_products(1, prefix='Vino')
+        self.assertEqual(self.search('vino" OR "x'), [])
+        self.assertEqual(self.client.get('/api/products/', {'search': 'NEAR(a b)'}).status_code, 200)
+
+
+class ProductImportTests(ApiTestCase):
+
+    def upload(self, name, content, **data):
+        return self.client.post(
+            '/api/products/import/', {'file': SimpleUploadedFile(name, content), **data}, format='multipart'
+        )
+
+    def csv_upload(self, lines, **data):
+        return self.upload('catalogo.csv', '\n'.join(lines).encode(), **data)
+
+    def test_upserts_by_sku_and_resolves_names(self):
+        existing = self.make_products(1)[0]
+        response = self.csv_upload([
+            'Código;Nombre;Precio de costo;Precio de venta;Categoría;Proveedor;Stock',
+            f'{existing.sku};;;"1.250,50";;;99',
+            'NUEVO-1;Aceite de oliva;800;1200,00;Almacén;proveedor;5',
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.data['created'], response.data['updated'], response.data['categories_created'], response.data['errors']),
+            (1, 1, 1, []),
+        )
+        existing.refresh_from_db()
+        self.assertEqual(
+            (existing.name, existing.cost_price, existing.sale_price, existing.stock, existing.category),
+            ('Producto 0', Decimal('50.00'), Decimal('1250.50'), 10, self.category),
+        )
+        new = Product.objects.get(sku='NUEVO-1')
+        self.assertEqual((new.category.name, new.provider, new.stock), ('Almacén', self.provider, 5))
+        self.assertEqual(StockMovement.objects.get(product=new).kind, 'inicial')
+        self.assertEqual(new.catalog_version, existing.catalog_version)
+
+    def test_reports_errors_per_row_and_imports_the_rest(self):
+        self.make_products(1)
+        response = self.csv_upload([
+            'sku,name,cost_price,sale_price,provider',
+            'A-1,Producto A,10,20,',
+            'A-1,Producto A bis,10,20,',
+            'B-1,,10,20,',
+            'C-1,Producto 0,10,20,',
+            'D-1,Producto D,diez,20,Otro proveedor',
+            ',Sin código,10,20,',
+        ])
+
+        self.assertEqual((response.data['created'], response.data['error_count']), (1, 5))
+        errors = {error['row']: error['errors'] for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [3, 4, 5, 6, 7])
+        self.assertIn('fila 2', errors[3]['sku'])
+        self.assertIn('name', errors[4])
+        self.assertIn('Producto-0', errors[5]['name'])
+        self.assertEqual(set(errors[6]), {'cost_price', 'provider'})
+        self.assertIn('sku', errors[7])
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_non_finite_numbers_are_row_errors(self):
+        response = self.csv_upload([
+            'sku,name,cost_price,sale_price,stock',
+            'N-1,Producto N,nan,20,1',
+            'N-2,Producto I,10,Infinity,1',
+            'N-3,Producto S,10,20,inf',
+            'N-4,Producto OK,10,20,1',
+        ])
+
+        self.assertEqual((response.status_code, response.data['created'], response.data['error_count']), (200, 1, 3))
+        self.assertEqual(
+            [set(error['errors']) for error in response.data['errors']],
+            [{'cost_price'}, {'sale_price'}, {'stock'}],
+        )
+
+    def test_reads_xlsx_and_detects_repeated_sku_across_chunks(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['SKU', 'Nombre', 'Costo', 'Precio', 'Estado'])
+        for i in range(5):
+            sheet.append([7790000000000.0 + i, f'Galletitas {i}', 100, 150.5, 'Inactivo'])
+        content = BytesIO()
+        workbook.save(content)
+
+        self.assertEqual(self.upload('lista.xlsx', content.getvalue()).data['created'], 5)
+        sheet.append([7790000000000.0, 'Galletitas repetidas', 100, 150.5, 'activo'])
+        content = BytesIO()
+        workbook.save(content)
+        summary = import_products(read_rows(content, 'lista.xlsx'), chunk_size=2)
+
+        self.assertEqual((summary['updated'], summary['error_count'], summary['errors'][0]['row']), (5, 1, 7))
+        self.assertEqual(
+            Product.objects.values_list('sku', 'sale_price', 'estado').get(name='Galletitas 1'),
+            ('7790000000001', Decimal('150.50'), 'inactivo'),
+        )
+
+    def test_dry_run_validates_without_saving(self):
+        response = self.csv_upload(['sku,name,cost_price,sale_price,category', 'X-1,Nuevo,1,2,Limpieza'], dry_run='true')
+
+        self.assertEqual((response.data['created'], response.data['dry_run']), (1, True))
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.filter(name='Limpieza').exists())
+
+    def test_rejects_unusable_files(self):
+        self.assertEqual(self.csv_upload(['name,sale_price', 'Sin sku,10']).status_code, 400)
+        self.assertEqual(self.upload('catalogo.xls', b'xx').status_code, 400)
+        self.assertEqual(self.upload('catalogo.xlsx', b'no es un zip').status_code, 400)
+        self.assertEqual(self.client.post('/api/products/import/', {}, format='multipart').status_code, 400)
+
+    def test_management_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'catalogo.csv'
+            path.write_text('sku,name,cost_price,sale_price\nA-1,Yerba,10,20\nB-1,Azúcar,x,20\n', encoding='utf-8')
+            out, err = StringIO(), StringIO()
+            call_command('import_products', str(path), stdout=out, stderr=err)
+
+        self.assertIn('1 creados', out.getvalue())
+        self.assertIn('fila 3: cost_price', err.getvalue())
+
+
+class StockCountTests(ApiTestCase):
+
+    def count(self, items, **data):
+        return self.client.post('/api/products/stock-count/', {'items': items, **data}, format='json')
+
+    def test_applies_counts_and_deltas_with_variance_report(self):
+        short, over, exact, shifted = self.make_products(4, stock=10)
+        response = self.count([
+            {'sku': short.sku, 'count': 7},
+            {'id': over.id, 'count': 8},
+            {'id': over.id, 'count': 4},
+            {'sku': exact.sku, 'count': 10},
+            {'id': shifted.id, 'delta': -3},
+            {'sku': 'NO-EXISTE', 'count': 1},
+        ], note='Inventario anual')
+
+        self.assertEqual(response.status_code, 200)
+        report = response.data
+        self.assertEqual((report['products'], report['adjusted'], report['not_found']), (4, 3, ['NO-EXISTE']))
+        self.assertEqual((report['units_over'], report['units_short']), (2, 6))
+        self.assertEqual((report['value_over'], report['value_short'], report['net_value']),
+                         (Decimal('100.00'), Decimal('300.00'), Decimal('-200.00')))
+        self.assertEqual(report['lines'][0]['variance_value'], Decimal('-150.00'))
+        self.assertEqual(
+            dict(Product.objects.values_list('id', 'stock')),
+            {short.id: 7, over.id: 12, exact.id: 10, shifted.id: 7},
+        )
+        self.assertEqual(
+            set(StockMovement.objects.filter(kind='ajuste').values_list('product_id', 'quantity', 'note')),
+            {(short.id, -3, 'Inventario anual'), (over.id, 2, 'Inventario anual'), (shifted.id, -3, 'Inventario anual')},
+        )
+
+    def test_dry_run_and_invalid_rows(self):
+        first, second = self.make_products(2, stock=2)
+        response = self.count([
+            {'id': first.id, 'count': 5},
+            {'id': first.id, 'delta': 1},
+            {'id': second.id, 'delta': -3},
+        ], dry_run=True)
+
+        self.assertEqual((response.data['applied'], response.data['adjusted'], len(response.data['errors'])), (False, 1, 2))
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {2})
+        self.assertFalse(StockMovement.objects.filter(kind='ajuste').exists())
+
+    def test_query_count_does_not_depend_on_item_count(self):
+        small = self.make_products(3, prefix='Chico')
+        large = self.make_products(60, prefix='Grande')
+        with CaptureQueriesContext(connection) as small_ctx:
+            self.count([{'id': p.id, 'count': 1} for p in small])
+        with CaptureQueriesContext(connection) as large_ctx:
+            self.count([{'sku': p.sku, 'count': 1} for p in large])
+
+        self.assertEqual(len(small_ctx), len(large_ctx))
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {1})
+
+    def test_item_validation(self):
+        product = self.make_products(1)[0]
+        self.assertEqual(self.count([{'id': product.id, 'sku': product.sku, 'count': 1}]).status_code, 400)
+        self.assertEqual(self.count([{'id': product.id}]).status_code, 400)
+        self.assertEqual(self.count([{'id': product.id, 'count': -1}]).status_code, 400)
+        self.assertEqual(self.count([]).status_code, 400)
+
+
+class ProductScanTests(ApiTestCase):
+
+    def test_single_sku_returns_minimal_payload_in_one_query(self):
+        product = self.make_products(3, prefix='EAN')[1]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/products/scan/', {'sku': 'EAN-1'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], product.id)
+        self.assertEqual(set(response.data), {'id', 'sku', 'name', 'sale_price', 'stock', 'estado'})
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertEqual(sum('api_product' in q['sql'] for q in ctx.captured_queries), 1)
+
+    def test_unknown_sku_returns_404(self):
+        self.assertEqual(self.client.get('/api/products/scan/', {'sku': 'NOPE'}).status_code, 404)
+
+    def test_sku_list_keeps_request_order_and_reports_missing(self):
+        self.make_products(3, prefix='EAN')
+        response = self.client.get('/api/products/scan/', {'sku': 'EAN-2,NOPE,EAN-0'})
+
+        self.assertEqual([p['sku'] for p in response.data['results']], ['EAN-2', 'EAN-0'])
+        self.assertEqual(response.data['not_found'], ['NOPE'])
+
+
+class PermissionQueryTests(ApiTestCase):
+
+    def group_queries(self, ctx):
+        return [q for q in ctx.captured_queries if 'auth_group' in q['sql']]
+
+    def test_groups_are_resolved_once_per_request(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get('/api/payment-methods/').status_code, 200)
+        self.assertEqual(len(self.group_queries(ctx)), 1)
+
+    def test_demoted_user_loses_access_despite_jwt_groups_claim(self):
+        self.user.groups.add(Group.objects.create(name='SuperAdmin'))
+        tokens = self.client.post('/api/token/', {'username': 'cajero', 'password': 'password123'}).data
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.assertEqual(client.get('/api/users/').status_code, 200)
+
+        self.user.groups.clear()
+
+        self.assertEqual(client.get('/api/users/').status_code, 403)
+        refreshed = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}).data['access']
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {refreshed}')
+        self.assertEqual(client.get('/api/users/').status_code, 403)
+        # Las acciones sin estado usan el claim, que la renovación leyó de la base.
+        self.assertEqual(client.get('/api/products/pos-catalog/').status_code, 403)
+
+    def test_users_without_role_are_rejected(self):
+        self.client.force_authenticate(User.objects.create_user(username='sin-rol', password='x'))
+        self.assertEqual(self.client.get('/api/payment-methods/').status_code, 403)
+
+
+class StatelessAuthenticationTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        token = self.client.post('/api/token/', {'username': 'cajero', 'password': 'password123'}).data['access']
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def user_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [q for q in ctx.captured_queries if 'auth_user' in q['sql'] or 'auth_group' in q['sql']]
+
+    def test_read_heavy_endpoints_skip_user_lookup(self):
+        self.make_products(1, prefix='EAN')
+        self.assertEqual(self.user_queries('/api/products/scan/', sku='EAN-0'), [])
+        self.assertEqual(self.user_queries('/api/products/pos-catalog/'), [])
+        self.assertEqual(self.user_queries('/api/reports/dashboard/'), [])
+
+    def test_admin_endpoints_keep_database_user(self):
+        # Usuario y grupos salen de la base, no del token.
+        self.assertEqual(len(self.user_queries('/api/products/')), 2)
+
+    def test_sales_are_attributed_to_database_user(self):
+        product = self.make_products(1)[0]
+        response = self.client.post('/api/sales/', self.sale_payload([product]), format='json')
+        self.assertEqual(Sale.objects.get(pk=response.data['id']).user, self.user)
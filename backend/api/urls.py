@@ -1,13 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     ProductViewSet, CategoryViewSet, ProviderViewSet, ClientViewSet,
     SaleViewSet, ReportsView, UserViewSet, GroupViewSet, DailyCashCountView,
-    BulkPriceUpdateView, MyTokenObtainPairView, PaymentMethodViewSet, 
-    AdminPaymentMethodViewSet, DashboardReportsView,
-    ExportSalesView, cancel_sale_view, ChangePasswordView, get_dolar_cotizaciones,
-    CashCountHistoryViewSet,
+    BulkPriceUpdateView, MyTokenObtainPairView, MyTokenRefreshView, PaymentMethodViewSet, 
+    AdminPaymentMethodViewSet, DashboardReportsView, ReportCacheStatsView,
+    ExportSalesView, cancel_sale_view, bulk_cancel_sales_view, ChangePasswordView, get_dolar_cotizaciones,
+    CashCountHistoryViewSet, ExportJobViewSet,
 )
 
 router = DefaultRouter()
@@ -21,6 +20,7 @@ router.register(r'groups', GroupViewSet, basename='group')
 router.register(r'cash-count-history', CashCountHistoryViewSet, basename='cashcounthistory')
 router.register(r'payment-methods', PaymentMethodViewSet, basename='paymentmethod')
 router.register(r'admin/payment-methods', AdminPaymentMethodViewSet, basename='admin-payment-methods')
+router.register(r'reports/export-jobs', ExportJobViewSet, basename='export-job')
 
 urlpatterns = [
     # Nueva ruta para que un usuario cambie su propia contraseña.
@@ -29,9 +29,11 @@ urlpatterns = [
     # Rutas existentes
     path('reports/export-sales/', ExportSalesView.as_view(), name='export-sales'),
     path('sales/<int:pk>/cancel/', cancel_sale_view, name='cancel-sale'),
+    path('sales/bulk-cancel/', bulk_cancel_sales_view, name='bulk-cancel-sales'),
     path('reports/dashboard/', DashboardReportsView.as_view(), name='dashboard-reports'),
+    path('reports/cache-stats/', ReportCacheStatsView.as_view(), name='report-cache-stats'),
     path('token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', MyTokenRefreshView.as_view(), name='token_refresh'),
     path('reports/', ReportsView.as_view(), name='reports'),
     path('cash-count/', DailyCashCountView.as_view(), name='cash_count'),
     path('bulk-price-update/', BulkPriceUpdateView.as_view(), name='bulk_price_update'),
@@ -1,41 +1,62 @@
 import requests
 import logging
-import csv
-from datetime import date, datetime, timedelta
+import time
+from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Sum, F, ProtectedError
-from django.db.models.functions import TruncHour ,TruncDay, TruncMonth, TruncWeek, ExtractHour
+from django.db.models import Sum, ProtectedError
 from django.contrib.auth.models import User, Group
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.utils import get_column_letter
-from rest_framework import viewsets, status, serializers, filters
+from rest_framework import mixins, viewsets, status, serializers, filters
 from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.negotiation import DefaultContentNegotiation
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 from .models import (
     Product, Category, Provider, Client, Sale, SaleDetail, PaymentMethod,
-    CashCount,
+    CashCount, StockMovement, CatalogVersion, ProductTombstone, ExportJob,
 )
+from .authentication import StatelessAuthenticationMixin
+from .analytics import DashboardAnalytics, summary_report
+from .catalog import catalog_snapshot, catalog_delta
+from .dashboard import SECTIONS, dashboard_sections, parse_sections
+from .export_jobs import job_path, request_export
+from .exports import EXPORT_LEVELS, FLAT_FORMATS, XLSX_CONTENT_TYPE, export_filename, sales_xlsx_file
+from .imports import import_products, read_rows
+from .popularity import WINDOW_DAYS, top_product_ids
+from .report_cache import cached_report, report_cache_stats, report_data_version
+from .search import ProductSearchFilter
 from .serializers import (
     ProductSerializer, CategorySerializer, ProviderSerializer, ClientSerializer,
-    SaleReadSerializer, SaleWriteSerializer, MyTokenObtainPairSerializer,
-    UserSerializer, GroupSerializer, PaymentMethodSerializer, CashCountSerializer
+    SaleReadSerializer, SaleCompactReadSerializer, SaleWriteSerializer, SaleSyncSerializer,
+    SaleBulkCancelSerializer, MyTokenObtainPairSerializer, MyTokenRefreshSerializer,
+    UserSerializer, GroupSerializer, PaymentMethodSerializer, CashCountSerializer,
+    StockMovementSerializer, ExportJobSerializer, BulkPriceUpdateSerializer, StockCountSerializer,
 )
 from .permissions import (
     IsSuperAdminUser, IsAdminUser, IsVendedorUser,
     IsSuperAdminOrAdmin, CanViewPanel, CanCreateSales
 )
+from .pagination import (
+    SaleKeysetPagination, ProductKeysetPagination, CashCountKeysetPagination,
+    StockMovementKeysetPagination,
+)
+from .services import (
+    checkout_sale, sale_read_queryset, sync_sales, record_stock_movements,
+    revert_sales, cancel_sales, stock_as_of, select_products, bulk_update_prices, apply_stock_count,
+)
 
 logger = logging.getLogger(__name__)
 
+SCAN_FIELDS = ('id', 'sku', 'name', 'sale_price', 'stock', 'estado')
+SCAN_MAX_SKUS = 200
+
 def get_dolar_cotizaciones(request):
     try:
         bluelytics_res = requests.get('https://api.bluelytics.com.ar/v2/latest')
@@ -69,55 +90,86 @@ def get_dolar_cotizaciones(request):
 class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
-class ProductViewSet(viewsets.ModelViewSet):
+class MyTokenRefreshView(TokenRefreshView):
+    serializer_class = MyTokenRefreshSerializer
+
+class ProductViewSet(StatelessAuthenticationMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().order_by('name')
     serializer_class = ProductSerializer
+    pagination_class = ProductKeysetPagination
+    stateless_actions = ['popular_for_pos', 'all_active_for_pos', 'pos_catalog', 'scan']
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'provider', 'estado'] 
     search_fields = ['name', 'sku', 'description']
     ordering_fields = ['name', 'stock', 'sale_price', 'cost_price']
 
     def get_permissions(self):
-        admin_actions = ['list', 'retrieve', 'create', 'update', 'partial_update', 'destroy', 'update_stock']
+        admin_actions = [
+            'list', 'retrieve', 'create', 'update', 'partial_update', 'destroy', 'update_stock', 'stock_movements',
+            'import_catalog', 'stock_count',
+        ]
         
         if self.action in admin_actions:
             self.permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
-        elif self.action in ['popular_for_pos', 'all_active_for_pos']:
+        elif self.action in ['popular_for_pos', 'all_active_for_pos', 'pos_catalog', 'scan']:
             self.permission_classes = [IsAuthenticated, CanCreateSales]
         else:
             self.permission_classes = [IsAuthenticated]
             
         return super().get_permissions()
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        product = serializer.save()
+        if product.stock:
+            StockMovement.objects.create(product=product, kind='inicial', quantity=product.stock, user=self.request.user)
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # El saldo se relee con la fila bloqueada y el cambio de stock se aplica como
+        # delta con F() a través del libro: una venta confirmada después de cargar el
+        # producto no se pisa y Product.stock sigue igual a la suma de movimientos.
+        product = serializer.instance
+        product.stock = Product.objects.select_for_update().values_list('stock', flat=True).get(pk=product.pk)
+        new_stock = serializer.validated_data.pop('stock', product.stock)
+        product = serializer.save()
+        if new_stock != product.stock:
+            record_stock_movements([StockMovement(
+                product=product, kind='ajuste', quantity=new_stock - product.stock,
+                user=self.request.user, note='Edición del producto'
+            )])
+            product.refresh_from_db(fields=['stock', 'catalog_version'])
+
     def destroy(self, request, *args, **kwargs):
         product = self.get_object()
         if SaleDetail.objects.filter(product=product).exists():
             product.estado = 'inactivo'
-            product.save()
+            # Sólo el estado: guardar la fila entera pisaría el stock de una venta confirmada entretanto.
+            product.save(update_fields=['estado'])
             return Response(
                 {"detail": "Este producto no se puede eliminar porque tiene ventas asociadas. Se ha marcado como inactivo."},
                 status=status.HTTP_200_OK
             )
         else:
-            product.delete()
+            with transaction.atomic():
+                ProductTombstone.objects.create(product_id=product.id, catalog_version=CatalogVersion.bump())
+                product.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'], url_path='popular-for-pos')
     def popular_for_pos(self, request):
-        ninety_days_ago = timezone.now() - timedelta(days=90)
-        
-        sold_products_ranking = SaleDetail.objects.filter(
-            sale__status='Completada',
-            sale__date_time__gte=ninety_days_ago,
-            product__estado='activo'
-        ).values('product_id').annotate(
-            total_sold=Sum('quantity')
-        ).order_by('-total_sold')[:10]
-
-        product_ids_ordered = [item['product_id'] for item in sold_products_ranking]
+        try:
+            days = min(max(int(request.query_params.get('days', WINDOW_DAYS)), 1), WINDOW_DAYS)
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+            category_id = request.query_params.get('category')
+            category_id = int(category_id) if category_id else None
+        except ValueError:
+            return Response({'error': 'Los parámetros "days", "limit" y "category" deben ser números enteros.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        product_ids_ordered = top_product_ids(days=days, category_id=category_id, limit=limit)
         
-        products_queryset = Product.objects.filter(id__in=product_ids_ordered)
+        products_queryset = Product.objects.filter(id__in=product_ids_ordered).select_related('category', 'provider')
         products_dict = {product.id: product for product in products_queryset}
         sorted_products = [products_dict[pid] for pid in product_ids_ordered if pid in products_dict]
         
@@ -127,10 +179,68 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], url_path='all-active-for-pos')
     def all_active_for_pos(self, request):
         self.pagination_class = None 
-        active_products = Product.objects.filter(estado='activo').order_by('name')
+        active_products = Product.objects.filter(estado='activo').select_related('category', 'provider').order_by('name')
         serializer = self.get_serializer(active_products, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], url_path='pos-catalog')
+    def pos_catalog(self, request):
+        since = request.query_params.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({'error': 'El parámetro "since" debe ser un número de versión.'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(catalog_delta(since))
+
+        version = CatalogVersion.current()
+        etag = f'"catalog-{version}"'
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        snapshot = catalog_snapshot()
+        return Response(snapshot, headers={'ETag': f'"catalog-{snapshot["version"]}"'})
+
+    @action(detail=False, methods=['get'], url_path='scan')
+    def scan(self, request):
+        # Lectura directa por el índice único de sku, sin instanciar modelos ni pasar por
+        # filtros, paginación o serializadores: es la consulta más frecuente de la caja.
+        skus = [sku.strip() for sku in request.query_params.get('sku', '').split(',') if sku.strip()]
+        if not skus:
+            return Response({'error': 'El parámetro "sku" es requerido.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(skus) > SCAN_MAX_SKUS:
+            return Response({'error': f'Se pueden consultar hasta {SCAN_MAX_SKUS} códigos por vez.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        start = time.perf_counter()
+        found = {
+            row['sku']: row
+            for row in Product.objects.filter(sku__in=skus).values(*SCAN_FIELDS)
+        }
+        headers = {'Server-Timing': f'db;dur={(time.perf_counter() - start) * 1000:.3f}'}
+
+        if len(skus) == 1:
+            if not found:
+                return Response({'detail': 'Producto no encontrado.'}, status=status.HTTP_404_NOT_FOUND, headers=headers)
+            return Response(found[skus[0]], headers=headers)
+        return Response({
+            'results': [found[sku] for sku in skus if sku in found],
+            'not_found': [sku for sku in skus if sku not in found],
+        }, headers=headers)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_catalog(self, request):
+        # Alta y actualización masiva desde un CSV o XLSX, con upsert por sku.
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'El campo "file" es requerido.'}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+        try:
+            summary = import_products(read_rows(upload, upload.name), user=request.user, dry_run=dry_run)
+        except UnicodeDecodeError:
+            return Response({'error': 'El CSV debe estar codificado en UTF-8.'}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**summary, 'dry_run': dry_run}, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['patch'], url_path='update-stock')
     def update_stock(self, request, pk=None):
         product = self.get_object()
@@ -138,11 +248,46 @@ class ProductViewSet(viewsets.ModelViewSet):
         if stock_to_add is None:
             return Response({'error': 'El campo "stock" es requerido.'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            product.stock += int(stock_to_add)
-            product.save()
-            return Response(ProductSerializer(product).data, status=status.HTTP_200_OK)
+            quantity = int(stock_to_add)
         except (ValueError, TypeError):
             return Response({'error': 'El stock debe ser un número entero válido.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                record_stock_movements([StockMovement(
+                    product=product, kind='reposicion' if quantity > 0 else 'ajuste',
+                    quantity=quantity, user=request.user
+                )])
+        except serializers.ValidationError:
+            return Response({'error': 'El stock resultante no puede ser negativo.'}, status=status.HTTP_400_BAD_REQUEST)
+        product.refresh_from_db()
+        return Response(ProductSerializer(product).data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='stock-count')
+    def stock_count(self, request):
+        # Conteo físico de inventario completo en una sola petición, con el informe de diferencias.
+        serializer = StockCountSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = apply_stock_count(**serializer.validated_data, user=request.user)
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='stock-movements')
+    def stock_movements(self, request, pk=None):
+        product = self.get_object()
+        as_of = request.query_params.get('as_of')
+        if as_of:
+            try:
+                moment = datetime.fromisoformat(as_of)
+            except ValueError:
+                return Response({'error': 'Formato de fecha inválido. Usar ISO 8601.'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            return Response({'product': product.id, 'as_of': moment, 'stock': stock_as_of(product, moment)})
+
+        movements = product.stock_movements.select_related('user').order_by('-created_at', '-id')
+        paginator = StockMovementKeysetPagination()
+        page = paginator.paginate_queryset(movements, request, view=None)
+        serializer = StockMovementSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 class CategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
@@ -230,6 +375,7 @@ class GroupViewSet(viewsets.ModelViewSet):
 
 class SaleViewSet(viewsets.ModelViewSet):
     queryset = Sale.objects.all().order_by('-date_time')
+    pagination_class = SaleKeysetPagination
 
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter] 
     filterset_fields = {
@@ -237,11 +383,23 @@ class SaleViewSet(viewsets.ModelViewSet):
         'status': ['exact'], # Permite filtrar por el estado exacto (Completada, Cancelada)
     }
 
+    def is_compact(self):
+        return self.request.query_params.get('lines') == 'compact'
+
+    def get_queryset(self):
+        if self.action in ['list', 'retrieve']:
+            return sale_read_queryset(compact=self.is_compact()).order_by('-date_time')
+        return super().get_queryset()
+
     def get_serializer_class(self):
-        return SaleWriteSerializer if self.action == 'create' else SaleReadSerializer
+        if self.action == 'sync':
+            return SaleSyncSerializer
+        if self.action == 'create':
+            return SaleWriteSerializer
+        return SaleCompactReadSerializer if self.is_compact() else SaleReadSerializer
 
     def get_permissions(self):
-        if self.action == 'create':
+        if self.action in ['create', 'sync']:
             self.permission_classes = [IsAuthenticated, CanCreateSales]
         else:
             self.permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
@@ -250,35 +408,55 @@ class SaleViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        idempotency_key = serializer.validated_data.get('idempotency_key')
+        existing = Sale.objects.filter(idempotency_key=idempotency_key).first() if idempotency_key else None
+        if existing:
+            # Reintento de una venta ya registrada: se devuelve la original sin volver a descontar stock.
+            read_serializer = SaleReadSerializer(sale_read_queryset().get(pk=existing.pk), context={'request': request})
+            return Response(read_serializer.data, status=status.HTTP_200_OK)
         try:
             with transaction.atomic():
                 details_data = serializer.validated_data.pop('details')
                 payment_method_id = serializer.validated_data.pop('payment_method_id')
                 payment_method = PaymentMethod.objects.get(id=payment_method_id)
-                sale = serializer.save(user=request.user, payment_method=payment_method)
-                for detail in details_data:
-                    product = Product.objects.get(id=detail['product_id'])
-                    if product.estado != 'activo':
-                        raise serializers.ValidationError(f"El producto '{product.name}' no está activo y no se puede vender.")
-                    if product.stock < detail['quantity']:
-                        raise serializers.ValidationError(f"No hay stock para {product.name}")
-                    product.stock -= detail['quantity']
-                    product.save()
-                    SaleDetail.objects.create(sale=sale, product=product, quantity=detail['quantity'], unit_price=detail['unit_price'])
-        except (serializers.ValidationError, Product.DoesNotExist, PaymentMethod.DoesNotExist) as e:
+                serializer.validated_data.pop('user', None)
+                sale = checkout_sale(
+                    user=request.user,
+                    payment_method=payment_method,
+                    details=details_data,
+                    **serializer.validated_data
+                )
+        except (serializers.ValidationError, PaymentMethod.DoesNotExist) as e:
             return Response(str(e), status=status.HTTP_400_BAD_REQUEST)
-
-        sale.refresh_from_db()
+        except IntegrityError:
+            if not idempotency_key:
+                raise
+            # Otra petición con la misma clave se registró en paralelo.
+            sale = Sale.objects.get(idempotency_key=idempotency_key)
+            read_serializer = SaleReadSerializer(sale_read_queryset().get(pk=sale.pk), context={'request': request})
+            return Response(read_serializer.data, status=status.HTTP_200_OK)
+
+        sale = sale_read_queryset().get(pk=sale.pk)
         read_serializer = SaleReadSerializer(sale, context={'request': request})
         return Response(read_serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['post'], url_path='sync')
+    def sync(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = sync_sales(user=request.user, sales=serializer.validated_data['sales'])
+        summary = {
+            result_status: sum(1 for r in results if r['status'] == result_status)
+            for result_status in ['created', 'duplicate', 'rejected']
+        }
+        return Response({'summary': summary, 'results': results}, status=status.HTTP_200_OK)
+
     def destroy(self, request, *args, **kwargs):
         sale = self.get_object()
         with transaction.atomic():
-            for detail in sale.details.all():
-                product = detail.product
-                product.stock += detail.quantity
-                product.save()
+            # Una venta cancelada ya devolvió su stock al cancelarse.
+            if sale.status == 'Completada':
+                revert_sales([sale.id], user=request.user, note=f'Venta #{sale.id} eliminada')
             sale.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -287,22 +465,36 @@ class SaleViewSet(viewsets.ModelViewSet):
 @transaction.atomic
 def cancel_sale_view(request, pk):
     try:
-        sale = Sale.objects.get(pk=pk)
-    except Sale.DoesNotExist:
-        return Response({'detail': 'Venta no encontrada.'}, status=status.HTTP_404_NOT_FOUND)
+        cancelled, already_cancelled, not_found = cancel_sales([pk], user=request.user)
+    except serializers.ValidationError as e:
+        return Response({'detail': ' '.join(map(str, e.detail))}, status=status.HTTP_409_CONFLICT)
 
-    if sale.status == 'Cancelada':
+    if not_found:
+        return Response({'detail': 'Venta no encontrada.'}, status=status.HTTP_404_NOT_FOUND)
+    if already_cancelled:
         return Response({'detail': 'Esta venta ya ha sido cancelada.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    sale.status = 'Cancelada'
-    sale.save()
+    return Response({'detail': 'Venta cancelada y stock restaurado con éxito.'}, status=status.HTTP_200_OK)
 
-    for detail in sale.details.all():
-        product = detail.product
-        product.stock += detail.quantity
-        product.save()
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsSuperAdminOrAdmin])
+def bulk_cancel_sales_view(request):
+    serializer = SaleBulkCancelSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        with transaction.atomic():
+            cancelled, already_cancelled, not_found = cancel_sales(
+                serializer.validated_data['sale_ids'], user=request.user
+            )
+    except serializers.ValidationError as e:
+        return Response({'detail': ' '.join(map(str, e.detail))}, status=status.HTTP_409_CONFLICT)
 
-    return Response({'detail': 'Venta cancelada y stock restaurado con éxito.'}, status=status.HTTP_200_OK)
+    return Response({
+        'detail': f'{len(cancelled)} ventas canceladas y stock restaurado.',
+        'cancelled': cancelled,
+        'already_cancelled': already_cancelled,
+        'not_found': not_found,
+    }, status=status.HTTP_200_OK)
 
 
 class PaymentMethodViewSet(viewsets.ReadOnlyModelViewSet):
@@ -329,113 +521,51 @@ class AdminPaymentMethodViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 class DashboardReportsView(APIView):
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated, CanViewPanel]
 
     def get(self, request, *args, **kwargs):
-        today = timezone.localdate()
-        last_30_days_start = today - timedelta(days=29)
-
-        today_sales_qs = Sale.objects.filter(date_time__date=today, status='Completada')
-        total_sales_today = today_sales_qs.aggregate(total=Sum('final_amount'))['total'] or 0
-        
-        gross_profit_today = SaleDetail.objects.filter(
-            sale__in=today_sales_qs
-        ).annotate(
-            profit_per_item=F('unit_price') - F('product__cost_price')
-        ).aggregate(total_profit=Sum(F('quantity') * F('profit_per_item')))['total_profit'] or 0
-
-        kpis = {
-            'ventas_del_dia': total_sales_today,
-            'ganancia_bruta_del_dia': gross_profit_today,
-            'ticket_promedio': total_sales_today / today_sales_qs.count() if today_sales_qs.count() > 0 else 0,
-            'productos_vendidos': SaleDetail.objects.filter(sale__in=today_sales_qs).aggregate(total_quantity=Sum('quantity'))['total_quantity'] or 0
-        }
-        
-        low_stock_limit = 5
-        low_stock_products_query = Product.objects.filter(stock__lte=low_stock_limit, estado='activo').order_by('stock').values('id', 'name', 'stock')[:10]
-
-        sales_by_payment_method = Sale.objects.filter(date_time__date__gte=last_30_days_start, status='Completada').values('payment_method__name').annotate(total=Sum('final_amount')).order_by('-total')
-        
-        last_12_weeks_start = today - timedelta(weeks=12)
-        daily_sales = Sale.objects.filter(date_time__date__gte=last_30_days_start, status='Completada').annotate(day=TruncDay('date_time')).values('day').annotate(total_sales=Sum('final_amount')).order_by('day')
-        weekly_sales = Sale.objects.filter(date_time__date__gte=last_12_weeks_start, status='Completada').annotate(week=TruncWeek('date_time')).values('week').annotate(total_sales=Sum('final_amount')).order_by('week')
-        monthly_sales = Sale.objects.filter(date_time__date__gte=today - timedelta(days=365), status='Completada').annotate(month=TruncMonth('date_time')).values('month').annotate(total_sales=Sum('final_amount')).order_by('month')
-
-        peak_hours_query = Sale.objects.filter(date_time__date__gte=last_30_days_start, status='Completada').annotate(hour=ExtractHour('date_time')).values('hour').annotate(total=Sum('final_amount')).order_by('hour')
-        sales_by_hour_dict = {item['hour']: item['total'] for item in peak_hours_query}
-        peak_hours_data = [{'name': f"{h:02d}h", 'Ventas': sales_by_hour_dict.get(h, 0)} for h in range(24)]
-        
-        sales_by_category_query = SaleDetail.objects.filter(
-            sale__status='Completada', 
-            sale__date_time__date__gte=last_30_days_start
-        ).values('product__category__name').annotate(value=Sum(F('quantity') * F('unit_price'))).order_by('-value')
-
-        most_sold_products_query = SaleDetail.objects.filter(
-            sale__status='Completada', 
-            sale__date_time__date__gte=last_30_days_start
-        ).values('product__name').annotate(value=Sum('quantity')).order_by('-value')[:10]
-        
-        most_profitable_products_query = SaleDetail.objects.filter(
-            sale__status='Completada', 
-            sale__date_time__date__gte=last_30_days_start
-        ).annotate(
-            profit_per_sale=F('quantity') * (F('product__sale_price') - F('product__cost_price'))
-        ).values('product__name').annotate(value=Sum('profit_per_sale')).order_by('-value')[:10]
-        
-        dormant_period_days = 60
-        dormant_since = today - timedelta(days=dormant_period_days)
-        sold_product_ids = SaleDetail.objects.filter(sale__status='Completada', sale__date_time__date__gte=dormant_since).values_list('product_id', flat=True).distinct()
-        
-        dormant_products_query = Product.objects.filter(stock__gt=0, estado='activo').exclude(id__in=sold_product_ids).values('name', 'sku', 'stock')[:10]
-        
-        chart_data = {
-            'ventas_por_metodo_pago': [{'name': item['payment_method__name'] or 'No especificado', 'value': item['total']} for item in sales_by_payment_method],
-            'ventas_diarias': [{'name': item['day'].strftime('%d/%m'), 'Ventas': item['total_sales']} for item in daily_sales],
-            'ventas_semanales': [{'name': item['week'].strftime('%d/%m'), 'Ventas': item['total_sales']} for item in weekly_sales],
-            'ventas_mensuales': [{'name': item['month'].strftime('%b %Y'), 'Ventas': item['total_sales']} for item in monthly_sales],
-            'ventas_por_hora': peak_hours_data,
-            'ventas_por_categoria': [{'name': item['product__category__name'], 'Ventas': item['value']} for item in sales_by_category_query]
-        }
-
-        rankings_data = {
-            'mas_vendidos': list(most_sold_products_query),
-            'mas_rentables': list(most_profitable_products_query)
-        }
-        
-        other_reports = {
-            'productos_dormidos': list(dormant_products_query)
-        }
-
-        return Response({
-            'kpis': kpis,
-            'low_stock_products': list(low_stock_products_query),
-            'charts': chart_data,
-            'rankings': rankings_data,
-            'other_reports': other_reports
-        })
+        """
+        Sin parámetros devuelve el dashboard completo. Con `?sections=kpis,charts.daily`
+        calcula sólo esas secciones, en paralelo, e informa el tiempo de cada una
+        en `timings` y en el header Server-Timing.
+        """
+        if 'sections' in request.query_params:
+            try:
+                names = parse_sections(request.query_params['sections'])
+            except ValueError as e:
+                return Response(
+                    {'error': f"Secciones desconocidas: {', '.join(e.args[0])}.", 'available': list(SECTIONS)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not names:
+                return Response({'error': 'Indicá al menos una sección.', 'available': list(SECTIONS)}, status=status.HTTP_400_BAD_REQUEST)
+            data, timings = dashboard_sections(names)
+            server_timing = ', '.join(f"{name};dur={timing['ms']}" for name, timing in timings.items())
+            return Response({**data, 'timings': timings}, headers={'Server-Timing': server_timing})
+
+        data, hit = cached_report('dashboard', self.build_report)
+        return Response(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+    def build_report(self):
+        return DashboardAnalytics().report()
 
 class ReportsView(APIView):
     permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
 
     def get(self,request,*args,**kwargs):
-        most_sold=SaleDetail.objects.values('product__name').annotate(c=Sum('quantity')).order_by('-c').first()
-        most_profitable=Product.objects.filter(saledetail__isnull=False).annotate(p=F('sale_price')-F('cost_price')).order_by('-p').first()
-        peak_hour=Sale.objects.annotate(h=TruncHour('date_time')).values('h').annotate(c=Count('id')).order_by('-c').first()
+        data, hit = cached_report('reports', self.build_report)
+        return Response(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
 
-        return Response({
-            'most_sold_product': {
-                'name': most_sold['product__name'] if most_sold else 'N/A',
-                'total_sold': most_sold['c'] if most_sold else 0
-            },
-            'most_profitable_product': {
-                'name': most_profitable.name if most_profitable else 'N/A',
-                'profit_margin': float(most_profitable.p) if most_profitable else 0
-            },
-            'peak_hour': {
-                'hour': peak_hour['h'].hour if peak_hour else 'N/A',
-                'count': peak_hour['c'] if peak_hour else 0
-            }
-        })
+    def build_report(self):
+        return summary_report()
+
+class ReportCacheStatsView(APIView):
+    """ Aciertos y fallos de la caché de reportes del proceso (o de la caché compartida). """
+    permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
+
+    def get(self, request, *args, **kwargs):
+        return Response({**report_cache_stats(), 'data_version': report_data_version()})
 
 class DailyCashCountView(APIView):
     permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
@@ -476,34 +606,45 @@ class DailyCashCountView(APIView):
                 return Response({'error': 'Los montos deben ser números válidos.'}, status=status.HTTP_400_BAD_REQUEST)
 
 class BulkPriceUpdateView(APIView):
+    """
+    Ajusta precios en bloque. La selección puede ser una lista de ids, los
+    filtros del listado de productos (category, provider, estado, search),
+    una combinación de ambos o `all` para todo el catálogo.
+    """
     permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
 
     def post(self, request, *args, **kwargs):
-        product_ids = request.data.get('product_ids', [])
-        percentage_str = request.data.get('percentage')
-        update_target = request.data.get('update_target')
-        if not all([product_ids, percentage_str, update_target]):
-            return Response({'error': 'Faltan datos requeridos.'}, status=status.HTTP_400_BAD_REQUEST)
-        try:
-            percentage = Decimal(percentage_str)
-            percentage_multiplier = Decimal(1 + (percentage / 100))
-        except (ValueError, TypeError):
-            return Response({'error': 'El porcentaje debe ser un número válido.'}, status=status.HTTP_400_BAD_REQUEST)
-        products_to_update = Product.objects.filter(id__in=product_ids)
-        if not products_to_update.exists():
+        serializer = BulkPriceUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        product_ids = select_products(**{key: data[key] for key in BulkPriceUpdateSerializer.SELECTORS if key in data})
+        if not product_ids:
             return Response({'error': 'No se encontraron productos.'}, status=status.HTTP_404_NOT_FOUND)
         try:
-            with transaction.atomic():
-                for product in products_to_update:
-                    if update_target == 'cost' or update_target == 'both': product.cost_price *= percentage_multiplier
-                    if update_target == 'sale' or update_target == 'both': product.sale_price *= percentage_multiplier
-                    product.save()
+            updated = bulk_update_prices(product_ids, data['percentage'], data['update_target'], user=request.user)
         except Exception as e:
             return Response({'error': f'Error en la actualización: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        return Response({'message': f'{len(product_ids)} productos actualizados.'}, status=status.HTTP_200_OK)
+        response = {'message': f'{updated} productos actualizados.', 'updated': updated}
+        if 'product_ids' in data:
+            # Ids pedidos que no existen o que no cumplen los filtros.
+            response['not_matched'] = sorted(set(data['product_ids']) - set(product_ids))
+        return Response(response, status=status.HTTP_200_OK)
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """ En las exportaciones `?format=` elige el archivo, no el renderer de DRF: los errores salen en JSON. """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
 
 class ExportSalesView(APIView):
+    """
+    Exporta las ventas del rango. `format` puede ser xlsx (por defecto), csv
+    o ndjson; los formatos planos aceptan además `level=lines` para exportar
+    una fila por línea de venta, con producto, categoría y costo.
+    """
     permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
+    content_negotiation_class = ExportContentNegotiation
 
     def get(self, request, *args, **kwargs):
         start_date_str = request.query_params.get('start_date')
@@ -516,65 +657,75 @@ class ExportSalesView(APIView):
         except ValueError:
             return Response({"error": "Formato de fecha inválido. Usar YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
 
-        sales = Sale.objects.filter(date_time__date__gte=start_date, date_time__date__lte=end_date).order_by('date_time')
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Ventas"
-
-        headers = ['Fecha', 'ID Venta', 'Estado', 'Monto Total', 'Neto Gravado (21%)', 'IVA (21%)']
-        ws.append(headers)
-
-        header_font = Font(bold=True, color="FFFFFF")
-        for cell in ws[1]:
-            cell.font = header_font
-            cell.fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-            cell.alignment = Alignment(horizontal='center')
-
-        iva_rate = Decimal('1.21')
-
-        for sale in sales:
-            total = sale.final_amount or Decimal('0.00')
-            neto = Decimal('0.00')
-            iva = Decimal('0.00')
-            if total > 0:
-                neto = total / iva_rate
-                iva = total - neto
-
-            naive_datetime = sale.date_time.replace(tzinfo=None)
-
-            ws.append([
-                naive_datetime,
-                sale.id,
-                sale.status,
-                total,
-                neto,
-                iva,
-            ])
-
-        for col_num, header_title in enumerate(headers, 1):
-            col_letter = get_column_letter(col_num)
-            if header_title in ['Monto Total', 'Neto Gravado (21%)', 'IVA (21%)']:
-                ws.column_dimensions[col_letter].width = 18
-                for cell in ws[col_letter]:
-                    if cell.row > 1: cell.number_format = '"$"#,##0.00'
-            elif header_title == 'Fecha':
-                ws.column_dimensions[col_letter].width = 20
-                for cell in ws[col_letter]:
-                    if cell.row > 1: cell.number_format = 'DD/MM/YYYY HH:MM'
-            else:
-                ws.column_dimensions[col_letter].width = 15
-                for cell in ws[col_letter]:
-                    if cell.row > 1: cell.alignment = Alignment(horizontal='center')
-
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = f'attachment; filename="reporte_ventas_{start_date_str}_a_{end_date_str}.xlsx"'
+        export_format = request.query_params.get('format', 'xlsx')
+        level = request.query_params.get('level', 'sales')
+        if level not in EXPORT_LEVELS:
+            return Response({"error": "Nivel inválido. Usar sales o lines."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if export_format == 'xlsx':
+            if level != 'sales':
+                return Response(
+                    {"error": "El detalle por línea sólo está disponible en CSV y NDJSON."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            # El libro se arma en disco con el modo write-only de openpyxl y se
+            # envía por bloques: la memoria no depende de la cantidad de ventas.
+            return FileResponse(
+                sales_xlsx_file(start_date, end_date),
+                as_attachment=True,
+                filename=export_filename(export_format, level, start_date, end_date),
+                content_type=XLSX_CONTENT_TYPE,
+            )
 
-        wb.save(response)
+        if export_format not in FLAT_FORMATS:
+            return Response({"error": "Formato inválido. Usar xlsx, csv o ndjson."}, status=status.HTTP_400_BAD_REQUEST)
+        chunks, content_type = FLAT_FORMATS[export_format]
+        _, fields, rows = EXPORT_LEVELS[level]
+        # Las filas se leen de la base de a bloques mientras se envían.
+        response = StreamingHttpResponse(chunks(fields, rows(start_date, end_date)), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{export_filename(export_format, level, start_date, end_date)}"'
+        )
         return response
 
+class ExportJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Exportaciones en segundo plano. POST crea (o reutiliza) el trabajo y
+    responde enseguida con su id; GET informa el estado y las filas
+    procesadas, y `download/` entrega el archivo cuando termina.
+    """
+    queryset = ExportJob.objects.order_by('-id')
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        job, reused = request_export(
+            request.user, data['export_format'], data.get('level', 'sales'), data['start_date'], data['end_date']
+        )
+        return Response(
+            {**self.get_serializer(job).data, 'reused': reused},
+            status=status.HTTP_200_OK if job.status == 'terminado' else status.HTTP_202_ACCEPTED,
+        )
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'terminado':
+            return Response({'error': 'La exportación todavía no terminó.', 'status': job.status}, status=status.HTTP_409_CONFLICT)
+        path = job_path(job)
+        if not path.exists():
+            return Response({'error': 'El archivo ya no está disponible. Pedí la exportación de nuevo.'}, status=status.HTTP_410_GONE)
+        content_type = XLSX_CONTENT_TYPE if job.export_format == 'xlsx' else FLAT_FORMATS[job.export_format][1]
+        return FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=export_filename(job.export_format, job.level, job.start_date, job.end_date),
+            content_type=content_type,
+        )
+
 class ChangePasswordView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -602,6 +753,7 @@ class CashCountHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = CashCount.objects.all().order_by('-date')
     serializer_class = CashCountSerializer
     permission_classes = [IsAuthenticated, IsSuperAdminOrAdmin]
+    pagination_class = CashCountKeysetPagination
     
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = {
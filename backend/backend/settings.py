@@ -126,6 +126,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Archivos generados por las exportaciones en segundo plano (ver api/export_jobs.py).
+EXPORT_JOBS_ROOT = BASE_DIR / 'exports'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 